@@ -0,0 +1,91 @@
+"""
+Load time and size of the binary format against JSON, for definitions and for
+an exported projection.
+
+Usage:
+    python benchmarks/binary.py [--copies N] [--days N]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from cashflow import Cashflow, sum_cashflows
+from cashflow.binary import (
+    open_projection,
+    read_definitions,
+    read_projection,
+    write_definitions,
+    write_projection,
+)
+
+CASHFLOWS_JSON = Path(__file__).resolve().parents[1] / "cashflows.json"
+
+
+def _time(function, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+
+def _report(label, path, seconds):
+    size = path.stat().st_size
+    print(f"{label:>24}: {size / 2**20:8.2f} MiB  {seconds * 1000:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=500)
+    parser.add_argument("--days", type=int, default=3650)
+    args = parser.parse_args()
+
+    base = json.loads(CASHFLOWS_JSON.read_text())
+    definitions = [
+        dict(d, name=f"{d['name']} ({i})") for i in range(args.copies) for d in base
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        json_path = tmp / "definitions.json"
+        json_path.write_text(json.dumps(definitions, indent=1))
+        binary_path = tmp / "definitions.cfb"
+        write_definitions(binary_path, definitions)
+        assert read_definitions(binary_path) == definitions
+
+        print(f"{len(definitions)} top-level definitions")
+        _report("JSON", json_path, _time(lambda: json.loads(json_path.read_bytes())))
+        _report("binary", binary_path, _time(lambda: read_definitions(binary_path)))
+
+        cashflows = [Cashflow.from_dict(d) for d in base]
+        df = sum_cashflows(cashflows, date(2022, 1, 1), args.days, 0)
+        json_path = tmp / "projection.json"
+        df.to_json(json_path, orient="split", date_format="iso")
+        binary_path = tmp / "projection.cfb"
+        write_projection(binary_path, df)
+
+        print(f"projection of {len(cashflows)} cashflows over {args.days} days")
+        _report(
+            "JSON",
+            json_path,
+            _time(lambda: json.loads(json_path.read_bytes())),
+        )
+        _report(
+            "binary frame", binary_path, _time(lambda: read_projection(binary_path))
+        )
+        _report(
+            "binary memmap balance",
+            binary_path,
+            _time(lambda: np.min(open_projection(binary_path)[1]["balance"])),
+        )
+
+
+if __name__ == "__main__":
+    main()
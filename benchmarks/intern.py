@@ -0,0 +1,56 @@
+"""
+Time and memory of projecting a file with many repeated subtrees, with and
+without interning in Cashflow.from_dict.
+
+Usage:
+    python benchmarks/intern.py [--copies N] [--days N]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+from cashflow import Cashflow, sum_cashflows
+
+CASHFLOWS_JSON = Path(__file__).resolve().parents[1] / "cashflows.json"
+
+
+def _definitions(copies):
+    """``copies`` renamed copies of cashflows.json, as in a set of duplicates."""
+    base = json.loads(CASHFLOWS_JSON.read_text())
+    definitions = []
+    for i in range(copies):
+        for d in base:
+            definitions.append(dict(d, name=f"{d['name']} ({i})"))
+    return definitions
+
+
+def _run(definitions, days, interned):
+    tracemalloc.start()
+    begin = time.perf_counter()
+    cashflows = [Cashflow.from_dict(d, interned) for d in definitions]
+    sum_cashflows(cashflows, date(2022, 1, 1), days, 0)
+    elapsed = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--days", type=int, default=3650)
+    args = parser.parse_args()
+
+    definitions = _definitions(args.copies)
+    print(f"{len(definitions)} top-level cashflows over {args.days} days")
+    for label, interned in (("plain", None), ("interned", {})):
+        elapsed, peak = _run(definitions, args.days, interned)
+        print(f"{label:>9}: {elapsed:7.3f} s  peak {peak / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
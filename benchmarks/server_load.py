@@ -0,0 +1,141 @@
+"""
+Latency of GET /api/files on the editor server, idle and while large PUTs are
+in flight.
+
+The server runs under uvicorn in a separate process, so the client's own work
+does not compete with it.
+
+Usage:
+    python benchmarks/server_load.py [--requests N] [--writers N] [--copies N]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import uvicorn
+
+from cashflow.ui.server import create_app
+
+CASHFLOWS_JSON = Path(__file__).resolve().parents[1] / "cashflows.json"
+
+# Pause between the listing requests, as an editor polling the server would.
+_INTERVAL = 0.005
+
+
+def _serve(data_dir, port):
+    uvicorn.run(create_app(data_dir=data_dir), port=port, log_level="warning")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_for(client):
+    for _ in range(200):
+        try:
+            await client.get("/api/files")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("The server did not start.")
+
+
+async def _latencies(client, n):
+    latencies = []
+    for _ in range(n):
+        begin = time.perf_counter()
+        resp = await client.get("/api/files")
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - begin)
+        await asyncio.sleep(_INTERVAL)
+    return np.array(latencies) * 1000
+
+
+async def _writer(client, name, body, stop):
+    writes = 0
+    while not stop.is_set():
+        resp = await client.put(
+            f"/api/files/{name}",
+            content=body,
+            headers={"Content-Type": "application/json"},
+        )
+        resp.raise_for_status()
+        writes += 1
+    return writes
+
+
+def _report(label, latencies):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{label:<28} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+async def _run(args, data_dir):
+    definitions = json.loads(CASHFLOWS_JSON.read_text()) * args.copies
+    body = json.dumps(definitions).encode()
+    for i in range(args.writers):
+        (data_dir / f"large-{i}.json").write_bytes(body)
+    for i in range(20):
+        (data_dir / f"small-{i}.json").write_text("[]")
+    print(f"PUT body: {len(body) / 1024:.0f} KiB, {args.writers} writers")
+
+    port = _free_port()
+    server = multiprocessing.Process(target=_serve, args=(str(data_dir), port))
+    server.start()
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", timeout=None
+        ) as client:
+            await _wait_for(client)
+            await _measure(client, args, body)
+    finally:
+        server.terminate()
+        server.join()
+
+
+async def _measure(client, args, body):
+    await _latencies(client, 10)
+    _report("GET /api/files, idle", await _latencies(client, args.requests))
+
+    stop = asyncio.Event()
+    writers = [
+        asyncio.create_task(_writer(client, f"large-{i}.json", body, stop))
+        for i in range(args.writers)
+    ]
+    # Let the first PUTs reach the server.
+    await asyncio.sleep(0.1)
+    begin = time.perf_counter()
+    loaded = await _latencies(client, args.requests)
+    elapsed = time.perf_counter() - begin
+    stop.set()
+    writes = sum(await asyncio.gather(*writers))
+    _report("GET /api/files, under PUTs", loaded)
+    print(f"{writes} PUTs completed in {elapsed:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=500,
+        help="copies of cashflows.json in each PUT body",
+    )
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(_run(args, Path(tmp)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,40 @@
-from datetime import timedelta, datetime as dt
+import gzip
+import io
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from datetime import datetime as dt
+from json import JSONEncoder, dumps, loads
+from sqlite3 import Connection
+
 import numpy as np
 import pandas as pd
-from sqlite3 import Connection, OperationalError
-from json import loads, JSONEncoder
-from datetime import datetime, date
-import os
-from functools import lru_cache
 
 __version__ = "1.2"
 
 
 def _to_date(date_string):
+    """Parse a ``YYYY-MM-DD`` date.
+
+    Zero-padded dates are split by position rather than through strptime;
+    anything else falls back to strptime for its parsing and error messages.
+    """
+    if (
+        len(date_string) == 10
+        and date_string[4] == "-"
+        and date_string[7] == "-"
+        and date_string.isascii()
+    ):
+        year, month, day = date_string[:4], date_string[5:7], date_string[8:]
+        if year.isdigit() and month.isdigit() and day.isdigit():
+            try:
+                return date(int(year), int(month), int(day))
+            except ValueError:
+                pass
     return dt.strptime(date_string, "%Y-%m-%d").date()
 
 
@@ -18,6 +42,332 @@ def _to_string(date):
     return dt.strftime(date, "%Y-%m-%d")
 
 
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Day ordinals are held as int32 internally; every representable date fits.
+_DAY = np.int32
+
+
+def _to_day(d):
+    """Days since 1970-01-01, matching the ``datetime64[D]`` epoch."""
+    return d.toordinal() - _EPOCH_ORDINAL
+
+
+_LAST_DAY = _to_day(date.max)
+
+# Open ends of an active window, in day ordinals.
+_NO_START = np.iinfo(_DAY).min
+_NO_END = np.iinfo(_DAY).max
+
+# Upper bound on the cells of a two-dimensional block, such as days x flows or
+# scenarios x days, broadcast at once.
+_BLOCK_CELLS = 1 << 22
+
+
+def _as_dates(dates):
+    return np.asarray(dates, dtype="datetime64[D]")
+
+
+def _as_days(dates):
+    return _as_dates(dates).astype(_DAY)
+
+
+def _month_day(dates):
+    """Return the (month, day) arrays for a ``datetime64[D]`` array."""
+    months = dates.astype("datetime64[M]")
+    return (
+        months.astype(np.int64) % 12 + 1,
+        (dates - months).astype(np.int64) + 1,
+    )
+
+
+def _years(dates):
+    return dates.astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+def _no_events():
+    return np.empty(0, dtype=_DAY), np.empty(0)
+
+
+def _between(days, amounts, first, last):
+    """The events of sorted ``days`` from ``first`` to ``last`` inclusive."""
+    lo = np.searchsorted(days, first)
+    hi = np.searchsorted(days, last, side="right")
+    return days[lo:hi], amounts[lo:hi]
+
+
+def _lookup(keys, values, days):
+    """Values for ``days`` found in the sorted ``keys`` array, 0.0 elsewhere."""
+    if len(keys) == 0:
+        return np.zeros(len(days))
+    idx = np.minimum(np.searchsorted(keys, days), len(keys) - 1)
+    return np.where(keys[idx] == days, values[idx], 0.0)
+
+
+def _paydays(anchor, first_year, last_year):
+    """Ordinals of the biweekly paydays counted from ``anchor`` in the years."""
+    anchor_day = _to_day(anchor)
+    first = max(_to_day(date(first_year, 1, 1)), anchor_day)
+    first = anchor_day - (anchor_day - first) // 14 * 14
+    return np.arange(first, _to_day(date(last_year, 12, 31)) + 1, 14, dtype=_DAY)
+
+
+def _capped(raw, caps, years):
+    """Deductions left of ``raw`` once each year's running total reaches its cap.
+
+    Paydays run along the last axis; ``years`` gives the year of each payday and
+    ``caps`` must broadcast against ``raw``. Each year's cap is drawn down one
+    payday at a time, so what is left rounds as it did in the payday loop the
+    salaries were first written with.
+    """
+    raw = np.asarray(raw, dtype=float)
+    if len(years) == 0:
+        return raw.copy()
+    # One row per year, with the paydays of that year from column 1 on and the
+    # year's cap, negated, in column 0.
+    starts = np.flatnonzero(np.diff(years, prepend=years[0] - 1))
+    row = np.cumsum(np.diff(years, prepend=years[0]) != 0)
+    column = np.arange(len(years)) - starts[row] + 1
+    grid = np.zeros(raw.shape[:-1] + (len(starts), column.max() + 1))
+    grid[..., row, column] = raw
+    grid[..., 0] = -np.broadcast_to(caps, raw.shape)[..., starts]
+    # Negated, the cumulative sum is cap - raw[0] - raw[1] - ... with the
+    # same rounding at every step.
+    left = -np.cumsum(grid, axis=-1)[..., row, column - 1]
+    # The first deduction over what is left takes the rest, later ones none.
+    over = np.zeros(grid.shape, dtype=bool)
+    over[..., row, column] = raw > left
+    over = np.logical_or.accumulate(over, axis=-1)
+    first = over[..., row, column] & ~over[..., row, column - 1]
+    return np.where(over[..., row, column], np.where(first, left, 0.0), raw)
+
+
+def _salary_amounts(
+    days,
+    starting_date,
+    gross_salary,
+    raise_month,
+    raise_rate,
+    constant_deductions,
+    variable_deductions,
+):
+    """Net pay on each payday of a SalaryCashflow.
+
+    The numeric parameters may be arrays, in which case paydays run along the
+    last axis of the result.
+    """
+    dates = days.astype("datetime64[D]")
+    years = _years(dates)
+    months, _ = _month_day(dates)
+
+    # The first raise lands in raise_month of the starting year if the salary
+    # starts before that month, otherwise in raise_month of the following year.
+    first_raise_year = starting_date.year + (
+        0 if starting_date.month < raise_month else 1
+    )
+    raises = np.where(
+        days < _to_day(date(first_raise_year, raise_month, 1)),
+        0,
+        years - first_raise_year + (months >= raise_month),
+    )
+    gross = gross_salary * (1 + raise_rate) ** raises
+
+    # Deductions with the same name draw on one annual cap, the last given, in
+    # turn on each payday.
+    raw, caps = {}, {}
+    for v in variable_deductions:
+        raw.setdefault(v["name"], []).append(gross * v["amount"])
+        caps[v["name"]] = v["cap"]
+    deductions = {}
+    for name, deduction in raw.items():
+        turns = np.stack(np.broadcast_arrays(*deduction), axis=-1)
+        capped = _capped(
+            turns.reshape(turns.shape[:-2] + (-1,)),
+            caps[name],
+            np.repeat(years, len(deduction)),
+        )
+        deductions[name] = iter(np.moveaxis(capped.reshape(turns.shape), -1, 0))
+
+    net = gross - constant_deductions
+    for v in variable_deductions:
+        net = net - next(deductions[v["name"]])
+    return net
+
+
+def _qc_amounts(
+    days,
+    first_year,
+    starting_salary,
+    annual_raise,
+    raise_month,
+    constant_deductions,
+    ei_rate,
+    ei_cap,
+    qpip_rate,
+    qpip_cap,
+    qpp_rate,
+    qpp_cap,
+    annual_ei_cap_increase=0.0,
+    annual_qpip_cap_increase=0.0,
+    annual_qpp_cap_increase=0.0,
+    annual_constant_deductions_increase=0.0,
+):
+    """Net pay on each payday of a Quebec salary that starts in first_year.
+
+    Each later year's salary, constant deductions and caps grow by their annual
+    increases. The numeric parameters may be arrays, in which case paydays run
+    along the last axis of the result.
+    """
+    dates = days.astype("datetime64[D]")
+    years = _years(dates)
+    months, _ = _month_day(dates)
+    n = years - first_year
+
+    base = starting_salary * (1 + annual_raise) ** n
+    gross = np.where(months >= raise_month, base * (1 + annual_raise), base)
+
+    net = gross - constant_deductions * (1 + annual_constant_deductions_increase) ** n
+    net = net - _capped(
+        gross * ei_rate, ei_cap * (1 + annual_ei_cap_increase) ** n, years
+    )
+    net = net - _capped(
+        gross * qpip_rate, qpip_cap * (1 + annual_qpip_cap_increase) ** n, years
+    )
+    net = net - _capped(
+        gross * qpp_rate, qpp_cap * (1 + annual_qpp_cap_increase) ** n, years
+    )
+    return net
+
+
+class _YearlySchedules:
+    """Payday ordinals and amounts per year, computed in batches and LRU cached.
+
+    ``compute(first_year, last_year)`` returns the sorted payday ordinals and
+    amounts for a whole range of years. At most ``cache_years`` years are kept,
+    or every year when it is ``None``. Loads from several threads take turns.
+    """
+
+    def __init__(self, compute, cache_years):
+        self._compute = compute
+        self.cache_years = cache_years
+        self._years = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self._years)
+
+    def __len__(self):
+        return len(self._years)
+
+    def load(self, first_year, last_year):
+        with self._lock:
+            return self._load(first_year, last_year)
+
+    def _load(self, first_year, last_year):
+        years = range(first_year, last_year + 1)
+        missing = [y for y in years if y not in self._years]
+        if missing:
+            days, amounts = self._compute(missing[0], missing[-1])
+            bounds = np.searchsorted(
+                days,
+                [_to_day(date(y, 1, 1)) for y in range(missing[0], missing[-1] + 2)],
+            )
+            for i, y in enumerate(range(missing[0], missing[-1] + 1)):
+                if y not in self._years:
+                    lo, hi = bounds[i], bounds[i + 1]
+                    self._years[y] = (days[lo:hi], amounts[lo:hi])
+
+        schedules = {}
+        for y in years:
+            schedules[y] = self._years[y]
+            self._years.move_to_end(y)
+        while self.cache_years is not None and len(self._years) > self.cache_years:
+            self._years.popitem(last=False)
+        return schedules
+
+    def get(self, year):
+        return self.load(year, year)[year]
+
+    def range(self, first_year, last_year):
+        schedules = self.load(first_year, last_year).values()
+        return (
+            np.concatenate([days for days, _ in schedules]),
+            np.concatenate([amounts for _, amounts in schedules]),
+        )
+
+    def events(self, first, last):
+        """Paydays and amounts from day ``first`` to day ``last`` inclusive."""
+        if first > last:
+            return _no_events()
+        years = _years(np.array([first, last], dtype="datetime64[D]"))
+        return _between(*self.range(int(years[0]), int(years[1])), first, last)
+
+
+class _YearSalaries(Mapping):
+    """Per-year salary objects, built on first lookup and LRU cached."""
+
+    def __init__(self, build, first_year, last_year, cache_years):
+        self._build = build
+        self._range = range(first_year, last_year + 1)
+        self.cache_years = cache_years
+        self._built = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, year):
+        if year not in self._range:
+            raise KeyError(year)
+        with self._lock:
+            salary = self._built.get(year)
+            if salary is None:
+                salary = self._built[year] = self._build(year)
+            self._built.move_to_end(year)
+            while self.cache_years is not None and len(self._built) > self.cache_years:
+                self._built.popitem(last=False)
+            return salary
+
+    def __contains__(self, year):
+        return year in self._range
+
+    def __iter__(self):
+        return iter(self._range)
+
+    def __len__(self):
+        return len(self._range)
+
+
+def _apply_cap(amounts, maximum):
+    """Amounts paid once a Limited cap of ``maximum`` is applied.
+
+    Flows run along the last axis; each row is capped independently.
+    """
+    amounts = np.where(np.abs(amounts) > 0.01, amounts, 0.0)
+    running = np.cumsum(amounts, axis=-1)
+    over = np.abs(running) >= maximum
+    first = np.where(over.any(axis=-1), over.argmax(axis=-1), amounts.shape[-1])
+    columns = np.arange(amounts.shape[-1])
+    final = np.sign(running) * maximum - (running - amounts)
+    return np.where(
+        columns < first[..., None],
+        amounts,
+        np.where(columns == first[..., None], final, 0.0),
+    )
+
+
+def _amount_float_days(cashflow, dates):
+    """_float_days of a schedule paying ``cashflow.amount`` on some days."""
+    if isinstance(cashflow.amount, (int, np.integer)):
+        return np.zeros(len(dates), dtype=bool)
+    return cashflow.flows(dates) != 0
+
+
+def _masked_flows(cashflow, dates, mask):
+    """Evaluate ``cashflow`` only on the dates selected by ``mask``."""
+    amounts = np.zeros(len(dates))
+    if mask.any():
+        amounts[mask] = cashflow.flows(dates[mask])
+    return amounts
+
+
 class CashflowEncoder(JSONEncoder):
     def default(self, o):
         if isinstance(o, Cashflow):
@@ -27,119 +377,259 @@ class CashflowEncoder(JSONEncoder):
 
 
 class Cashflow:
+    """A named schedule of payments.
+
+    Subclasses override flows(), and may override _events() to find their
+    payments without evaluating every day. A subclass that only overrides
+    flow(), as before flows() existed, is evaluated one day at a time.
+    """
+
     def __init__(self, name):
         self.name = name
 
     def to_dict(self):
         return {"name": self.name}
 
+    def flows(self, dates):
+        """Amounts for an array of ``datetime64[D]`` dates, as a float array."""
+        return np.array(
+            [self.flow(d) for d in self._flow_dates(dates)], dtype=float
+        ).reshape(-1)
+
+    def flow(self, date):
+        """The amount paid on ``date``: an int on days when an integer
+        schedule pays, or nothing does, and a float otherwise."""
+        dates = np.array([date], dtype="datetime64[D]")
+        amount = self.flows(dates)[0].item()
+        return amount if self._float_days(dates)[0] else int(amount)
+
+    def _float_days(self, dates):
+        """Mask of the days on which this cashflow pays a float rather than
+        an int, as flow() returns them."""
+        if type(self).flows is not Cashflow.flows:
+            return np.ones(len(dates), dtype=bool)
+        return np.array(
+            [isinstance(self.flow(d), float) for d in self._flow_dates(dates)],
+            dtype=bool,
+        ).reshape(-1)
+
+    def _flow_dates(self, dates):
+        """``dates`` as date objects to pass to an overridden flow()."""
+        if type(self).flow is Cashflow.flow:
+            raise NotImplementedError(
+                f"{type(self).__name__} must override flows() or flow()"
+            )
+        return _as_dates(dates).tolist()
+
+    def compile(self):
+        """Lower this tree into a flat Plan; see cashflow.plan."""
+        return compile_cashflows([self])
+
+    def events(self, start, end):
+        """Yield ``(date, amount)`` for each flow from start to end, inclusive."""
+        days, amounts = self._events(_to_day(start), _to_day(end))
+        yield from zip(days.astype("datetime64[D]").tolist(), amounts.tolist())
+
+    def _events(self, first, last):
+        """The flows from day ``first`` to day ``last`` inclusive, as a sorted
+        array of day ordinals, each at most once, and the float amounts paid
+        on them.
+
+        This fallback evaluates every day in the range; subclasses override it
+        to jump directly from one occurrence to the next.
+        """
+        days = np.arange(first, last + 1, dtype=_DAY)
+        amounts = self.flows(days.astype("datetime64[D]"))
+        paid = np.flatnonzero(amounts)
+        return days[paid], amounts[paid]
+
     def from_json(desc):
         return Cashflow.from_dict(loads(desc))
 
-    def from_dict(data):
-        try:
-            cf_type = data["details"]["type"]
-        except KeyError:
-            raise ValueError("Cashflow type must be specified.")
-
-        if cf_type == "one-time":
-            cf = OneTimeCashflow(
-                data["name"],
-                _to_date(data["details"]["date"]),
-                data["details"]["amount"],
-            )
-        elif cf_type == "interval":
-            cf = IntervalCashflow(
-                data["name"],
-                _to_date(data["details"]["first_date"]),
-                data["details"]["interval"],
-                data["details"]["amount"],
-            )
-        elif cf_type == "monthly":
-            try:
-                months = data["details"]["months"]
-            except KeyError:
-                months = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+    def from_dict(data, interned=None):
+        """Build a cashflow tree from its definition.
 
-            cf = MonthlyCashflow(
-                data["name"], data["details"]["day"], data["details"]["amount"], months
-            )
-        elif cf_type == "composite":
-            cf = CompositeCashflow(data["name"])
-            for flow in data["details"]["cashflows"]:
-                cf.add(Cashflow.from_dict(flow))
-        elif cf_type == "salary":
-            cf = SalaryCashflow(
-                data["name"],
-                _to_date(data["details"]["starting_date"]),
-                data["details"]["gross_salary"],
-                data["details"]["estimated_raise"],
-                data["details"]["constant_deductions"],
-                data["details"]["variable_deductions"],
-            )
-        elif cf_type == "qc-salary":
-            cf = QCSalary(
-                data["name"],
-                data["details"]["year"],
-                data["details"]["starting_salary"],
-                data["details"]["estimated_raise"],
-                data["details"]["raise_month"],
-                _to_date(data["details"]["first_pay_day"]),
-                data["details"]["constant_deductions"],
-                data["details"]["ei_rate"],
-                data["details"]["ei_cap"],
-                data["details"]["qpip_rate"],
-                data["details"]["qpip_cap"],
-                data["details"]["qpp_rate"],
-                data["details"]["qpp_cap"],
-            )
-        elif cf_type == "qc-multi-year-salary":
-            cf = QCMultiYearSalary(
-                data["name"],
-                data["details"]["year"],
-                data["details"]["ending_year"],
-                data["details"]["starting_salary"],
-                data["details"]["annual_raise"],
-                data["details"]["raise_month"],
-                _to_date(data["details"]["first_pay_day"]),
-                data["details"]["constant_deductions"],
-                data["details"]["ei_rate"],
-                data["details"]["ei_cap"],
-                data["details"]["qpip_rate"],
-                data["details"]["qpip_cap"],
-                data["details"]["qpp_rate"],
-                data["details"]["qpp_cap"],
-                data["details"]["annual_ei_cap_increase"],
-                data["details"]["annual_qpip_cap_increase"],
-                data["details"]["annual_qpp_cap_increase"],
-                data["details"]["annual_constant_deductions_increase"],
-            )
-        else:
-            raise ValueError(
-                f"{data['details']['type']} is not a supported cashflow type"
-            )
+        Composite trees are walked with an explicit stack. Evaluating and
+        serialising a tree still recurse through its levels, so composites
+        may be nested at most _MAX_DEPTH deep; deeper definitions raise
+        ValueError rather than a RecursionError later on. Passing the same dict as
+        ``interned`` for every definition of a file shares one cashflow
+        between all subtrees that are identical apart from their own name;
+        see Interned.
+        """
+        return _from_dict(data, interned)
+
+
+def _intern_key(data):
+    """Canonical form of a definition, ignoring its own name."""
+    return dumps(
+        {k: v for k, v in data.items() if k != "name"}, sort_keys=True, default=str
+    )
+
+
+def _one_time(name, details):
+    return OneTimeCashflow(name, _to_date(details["date"]), details["amount"])
+
+
+def _interval(name, details):
+    return IntervalCashflow(
+        name, _to_date(details["first_date"]), details["interval"], details["amount"]
+    )
+
+
+def _monthly(name, details):
+    return MonthlyCashflow(
+        name, details["day"], details["amount"], details.get("months")
+    )
+
+
+def _salary(name, details):
+    return SalaryCashflow(
+        name,
+        _to_date(details["starting_date"]),
+        details["gross_salary"],
+        details["estimated_raise"],
+        details["constant_deductions"],
+        details["variable_deductions"],
+    )
+
+
+def _qc_salary(name, details):
+    return QCSalary(
+        name,
+        details["year"],
+        details["starting_salary"],
+        details["estimated_raise"],
+        details["raise_month"],
+        _to_date(details["first_pay_day"]),
+        details["constant_deductions"],
+        details["ei_rate"],
+        details["ei_cap"],
+        details["qpip_rate"],
+        details["qpip_cap"],
+        details["qpp_rate"],
+        details["qpp_cap"],
+    )
+
+
+def _qc_multi_year_salary(name, details):
+    return QCMultiYearSalary(
+        name,
+        details["year"],
+        details["ending_year"],
+        details["starting_salary"],
+        details["annual_raise"],
+        details["raise_month"],
+        _to_date(details["first_pay_day"]),
+        details["constant_deductions"],
+        details["ei_rate"],
+        details["ei_cap"],
+        details["qpip_rate"],
+        details["qpip_cap"],
+        details["qpp_rate"],
+        details["qpp_cap"],
+        details["annual_ei_cap_increase"],
+        details["annual_qpip_cap_increase"],
+        details["annual_qpp_cap_increase"],
+        details["annual_constant_deductions_increase"],
+    )
 
-        try:
-            cf = Limited(_to_date(data["start"]), data["limit"], cf)
-        except KeyError:
-            pass
 
-        try:
-            cf = StartOn(_to_date(data["start"]), cf)
-        except KeyError:
-            pass
+# Builders of the leaf cashflow types, keyed by "details.type". Composites are
+# assembled by _from_dict itself.
+CASHFLOW_TYPES = {
+    "one-time": _one_time,
+    "interval": _interval,
+    "monthly": _monthly,
+    "salary": _salary,
+    "qc-salary": _qc_salary,
+    "qc-multi-year-salary": _qc_multi_year_salary,
+}
 
-        try:
-            cf = EndOn(_to_date(data["end"]), cf)
-        except KeyError:
-            pass
 
-        return cf
+def register_cashflow_type(type_name, build):
+    """Make ``from_dict`` build ``details.type == type_name`` with
+    ``build(name, details)``."""
+    if type_name == "composite":
+        raise ValueError("The composite type cannot be replaced.")
+    CASHFLOW_TYPES[type_name] = build
+
+
+def _cashflow_type(data):
+    try:
+        return data["details"]["type"]
+    except KeyError:
+        raise ValueError("Cashflow type must be specified.")
+
+
+def _wrap(cf, data):
+    """Apply the start, end and limit of a definition to its cashflow."""
+    if "start" in data:
+        if "limit" in data:
+            cf = Limited(_to_date(data["start"]), data["limit"], cf)
+        cf = StartOn(_to_date(data["start"]), cf)
+    if "end" in data:
+        cf = EndOn(_to_date(data["end"]), cf)
+    return cf
+
+
+# Deepest nesting of composites that from_dict accepts. Each level costs
+# several frames when the tree is evaluated, so this leaves room below the
+# default recursion limit for the caller's own frames.
+_MAX_DEPTH = 64
+
+
+def _from_dict(data, interned):
+    # Each frame is [definition, intern key, composite being filled, children].
+    stack = [[data, None, None, None]]
+    built = None
+    while stack:
+        frame = stack[-1]
+        node, key, composite, children = frame
+        cf = None
+        if composite is None:
+            cf_type = _cashflow_type(node)
+            if interned is not None:
+                key = frame[1] = _intern_key(node)
+            if interned is not None and key in interned:
+                cf = Interned(node.get("name"), *interned[key])
+            elif cf_type == "composite":
+                if len(stack) > _MAX_DEPTH:
+                    raise ValueError(
+                        f"Composites cannot be nested more than {_MAX_DEPTH} deep."
+                    )
+                frame[2] = CompositeCashflow(node["name"])
+                frame[3] = iter(node["details"]["cashflows"])
+                continue
+            elif cf_type in CASHFLOW_TYPES:
+                cf = CASHFLOW_TYPES[cf_type](node["name"], node["details"])
+            else:
+                raise ValueError(f"{cf_type} is not a supported cashflow type")
+        else:
+            child = next(children, None)
+            if child is not None:
+                stack.append([child, None, None, None])
+                continue
+            cf = composite
+
+        if not isinstance(cf, Interned):
+            cf = _wrap(cf, node)
+            if interned is not None:
+                interned[key] = (cf, OrderedDict())
+                cf = Interned(node.get("name"), *interned[key])
+        stack.pop()
+        if stack:
+            stack[-1][2].add(cf)
+        else:
+            built = cf
+    return built
 
 
 class IntervalCashflow(Cashflow):
     def __init__(self, name, start_date, interval_days, amount):
         super().__init__(name)
+        if interval_days == 0:
+            raise ValueError("The interval of an interval cashflow cannot be 0.")
         self.start_date = start_date
         self.interval_days = interval_days
         self.amount = amount
@@ -156,37 +646,85 @@ class IntervalCashflow(Cashflow):
 
         return d
 
-    def flow(self, date):
-        delta = date - self.start_date
+    def flows(self, dates):
+        delta = _as_days(dates) - _to_day(self.start_date)
+        return np.where(
+            (delta >= 0) & (delta % self.interval_days == 0), self.amount, 0.0
+        )
 
-        if delta.days >= 0 and (delta.days % self.interval_days) == 0:
-            return self.amount
-        else:
-            return 0
+    def _float_days(self, dates):
+        return _amount_float_days(self, dates)
+
+    def _events(self, first, last):
+        # A negative interval pays on the same days as its absolute value,
+        # as in flows(). Jump straight to the first occurrence on or after
+        # first.
+        interval = abs(self.interval_days)
+        anchor = _to_day(self.start_date)
+        begin = anchor + -(-max(first - anchor, 0) // interval) * interval
+        days = np.arange(begin, last + 1, interval, dtype=_DAY)
+        return days, np.full(len(days), float(self.amount))
 
 
 class Limited(Cashflow):
-    def __init__(self, startDate, maximum, cashflow):
+    """Caps the cumulative amount paid by a cashflow from startDate onwards.
+
+    The capped schedule is built lazily from the wrapped cashflow's events,
+    ``horizon_days`` at a time, and never past the latest date asked for or
+    the occurrence that reaches the cap. Threads may share a Limited: one
+    extends the schedule at a time and publishes it whole.
+    """
+
+    def __init__(self, startDate, maximum, cashflow, horizon_days=366):
         super().__init__(cashflow.name)
         self.startDate = startDate
         self.maximum = maximum
         self.cashflow = cashflow
+        self.horizon_days = horizon_days
+
+        self._lock = threading.Lock()
+        # (last day searched, running sum, paid days, amounts), replaced as
+        # one tuple so readers never see the parts of different extensions.
+        self._schedule = (
+            _to_day(startDate) - 1,
+            0,
+            np.empty(0, dtype=_DAY),
+            np.empty(0),
+        )
 
-        self.flows = {}
-        sum = 0
-        d = startDate
-        maximum = abs(maximum)
-        done = False
-        while not done:
-            f = cashflow.flow(d)
-            if abs(f) > 0.01:
-                if abs(sum + f) < maximum:
-                    self.flows[d] = f
-                else:
-                    self.flows[d] = np.sign(sum + f) * maximum - sum
-                    done = True
-                sum += f
-            d = d + timedelta(days=1)
+    def _search(self, until):
+        """The capped schedule's days and amounts, extended to cover every
+        day up to ``until``."""
+        searched_to, _, days, amounts = self._schedule
+        if until <= searched_to:
+            return days, amounts
+        with self._lock:
+            if until > self._schedule[0]:
+                self._schedule = self._extend(until)
+            return self._schedule[2:]
+
+    def _extend(self, until):
+        searched_to, total, days, amounts = self._schedule
+        horizons = -(-(until - searched_to) // self.horizon_days)
+        end = min(searched_to + horizons * self.horizon_days, _LAST_DAY - 1)
+        new_days, flows = self.cashflow._events(searched_to + 1, end)
+        paid = np.abs(flows) > 0.01
+        new_days, flows = new_days[paid], flows[paid]
+        # Running sums accumulate one flow at a time, as a loop over them would.
+        running = np.cumsum(np.concatenate([[total], flows]))
+        reached = np.flatnonzero(np.abs(running[1:]) >= abs(self.maximum))
+        if len(reached):
+            # Nothing is paid once the cap is reached.
+            n = reached[0] + 1
+            new_days, flows = new_days[:n], flows[:n].copy()
+            flows[-1] = float(np.sign(running[n]) * abs(self.maximum) - running[n - 1])
+            end = _LAST_DAY
+        return (
+            end,
+            running[len(flows)],
+            np.concatenate([days, new_days]),
+            np.concatenate([amounts, flows]),
+        )
 
     def to_dict(self, d=None):
         if d is None:
@@ -196,11 +734,25 @@ class Limited(Cashflow):
 
         return self.cashflow.to_dict(d)
 
-    def flow(self, date):
-        if date in self.flows:
-            return self.flows[date]
-        else:
-            return 0
+    def flows(self, dates):
+        days = _as_days(dates)
+        if len(days) == 0:
+            return np.zeros(0)
+        return _lookup(*self._search(int(days.max())), days)
+
+    def _events(self, first, last):
+        return _between(*self._search(last), first, last)
+
+    def _float_days(self, dates):
+        mask = self.cashflow._float_days(dates) & (self.flows(dates) != 0)
+        searched_to, _, days, _ = self._schedule
+        if searched_to == _LAST_DAY and len(days) > 0:
+            # The payment that reaches the cap is maximum less the running
+            # sum, which is a float if either of them is.
+            mask[_as_days(dates) == days[-1]] = isinstance(self.maximum, float) or bool(
+                self.cashflow._float_days(days.astype("datetime64[D]")).any()
+            )
+        return mask
 
 
 class StartOn(Cashflow):
@@ -216,11 +768,19 @@ class StartOn(Cashflow):
 
         return self.cashflow.to_dict(d)
 
-    def flow(self, date):
-        if date >= self.start_date:
-            return self.cashflow.flow(date)
-        else:
-            return 0
+    def flows(self, dates):
+        dates = _as_dates(dates)
+        return _masked_flows(
+            self.cashflow, dates, dates >= np.datetime64(self.start_date, "D")
+        )
+
+    def _float_days(self, dates):
+        return self.cashflow._float_days(dates) & (
+            dates >= np.datetime64(self.start_date, "D")
+        )
+
+    def _events(self, first, last):
+        return self.cashflow._events(max(first, _to_day(self.start_date)), last)
 
 
 class EndOn(Cashflow):
@@ -236,21 +796,27 @@ class EndOn(Cashflow):
 
         return self.cashflow.to_dict(d)
 
-    def flow(self, date):
-        if date <= self.end_date:
-            return self.cashflow.flow(date)
-        else:
-            return 0
+    def flows(self, dates):
+        dates = _as_dates(dates)
+        return _masked_flows(
+            self.cashflow, dates, dates <= np.datetime64(self.end_date, "D")
+        )
+
+    def _float_days(self, dates):
+        return self.cashflow._float_days(dates) & (
+            dates <= np.datetime64(self.end_date, "D")
+        )
+
+    def _events(self, first, last):
+        return self.cashflow._events(first, min(last, _to_day(self.end_date)))
 
 
 class MonthlyCashflow(Cashflow):
-    def __init__(
-        self, name, day_of_month, amount, months=[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
-    ):
+    def __init__(self, name, day_of_month, amount, months=None):
         super().__init__(name)
         self.day_of_month = day_of_month
         self.amount = amount
-        self.months = months
+        self.months = list(range(1, 13)) if months is None else months
 
     def to_dict(self, d=None):
         if d is None:
@@ -264,11 +830,32 @@ class MonthlyCashflow(Cashflow):
 
         return d
 
-    def flow(self, date):
-        if (date.day == self.day_of_month) & (date.month in self.months):
-            return self.amount
-        else:
-            return 0
+    def flows(self, dates):
+        month, day = _month_day(_as_dates(dates))
+        return np.where(
+            (day == self.day_of_month) & np.isin(month, self.months),
+            self.amount,
+            0.0,
+        )
+
+    def _float_days(self, dates):
+        return _amount_float_days(self, dates)
+
+    def _events(self, first, last):
+        if first > last:
+            return _no_events()
+        months = np.arange(
+            np.datetime64(first, "D").astype("datetime64[M]"),
+            np.datetime64(last, "D").astype("datetime64[M]") + np.timedelta64(1, "M"),
+        )
+        months = months[np.isin(months.astype(np.int64) % 12 + 1, self.months)]
+        dates = months.astype("datetime64[D]") + np.timedelta64(
+            self.day_of_month - 1, "D"
+        )
+        # A day past the end of a short month rolls into the next one.
+        days = dates[dates.astype("datetime64[M]") == months].astype(_DAY)
+        days = days[(days >= first) & (days <= last)]
+        return days, np.full(len(days), float(self.amount))
 
 
 class OneTimeCashflow(Cashflow):
@@ -289,10 +876,17 @@ class OneTimeCashflow(Cashflow):
 
         return d
 
-    def flow(self, date):
-        if self.date == date:
-            return self.amount
-        return 0
+    def flows(self, dates):
+        return np.where(_as_days(dates) == _to_day(self.date), self.amount, 0.0)
+
+    def _float_days(self, dates):
+        return _amount_float_days(self, dates)
+
+    def _events(self, first, last):
+        day = _to_day(self.date)
+        if not first <= day <= last:
+            return _no_events()
+        return np.array([day], dtype=_DAY), np.array([float(self.amount)])
 
 
 class CompositeCashflow(Cashflow):
@@ -314,12 +908,35 @@ class CompositeCashflow(Cashflow):
     def add(self, cashflow):
         self.cashflows.append(cashflow)
 
-    def flow(self, date):
-        sum = 0
+    def flows(self, dates):
+        dates = _as_dates(dates)
+        total = np.zeros(len(dates))
         for cf in self.cashflows:
-            sum = sum + cf.flow(date)
+            total += cf.flows(dates)
 
-        return sum
+        return total
+
+    def _float_days(self, dates):
+        # A sum is a float when any of its terms is.
+        mask = np.zeros(len(dates), dtype=bool)
+        for cf in self.cashflows:
+            mask |= cf._float_days(dates)
+        return mask
+
+    def _events(self, first, last):
+        if not self.cashflows:
+            return _no_events()
+        events = [cf._events(first, last) for cf in self.cashflows]
+        # Combine flows that share a day, adding them in the children's order.
+        days, slots = np.unique(
+            np.concatenate([days for days, _ in events]), return_inverse=True
+        )
+        amounts = np.bincount(
+            slots,
+            weights=np.concatenate([amounts for _, amounts in events]),
+            minlength=len(days),
+        )
+        return days.astype(_DAY), amounts
 
 
 class SalaryCashflow(Cashflow):
@@ -331,6 +948,7 @@ class SalaryCashflow(Cashflow):
         estimated_raise,
         constant_deductions,
         variable_deductions,
+        cache_years=12,
     ):
         super().__init__(name)
         self.starting_date = starting_date
@@ -338,75 +956,43 @@ class SalaryCashflow(Cashflow):
         self.estimated_raise = estimated_raise
         self.constant_deductions = constant_deductions
         self.variable_deductions = variable_deductions
+        self.cache_years = cache_years
 
-    def _num_raises(self, d):
-        rm = self.estimated_raise["Month"]
-        # First raise occurs in RM of starting_date's year if starting_date.month < RM
-        # otherwise in RM of (starting_date's year + 1).
-        first_raise_year = self.starting_date.year + (
-            0 if self.starting_date.month < rm else 1
-        )
-        first_raise_date = date(first_raise_year, rm, 1)
-
-        if d < first_raise_date:
-            return 0
+        self._schedules = _YearlySchedules(self._compute_years, cache_years)
 
-        # Total full years since the first raise date plus current year raise if applicable
-        years_passed = d.year - first_raise_year
-        return years_passed + (1 if d.month >= rm else 0)
-
-    @lru_cache(maxsize=12)
     def _get_cashflows(self, year):
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
-
-        # 1. Establish paydays for the year
-        paydays = []
-        days_diff = (start_of_year - self.starting_date).days
-        if days_diff <= 0:
-            current_payday = self.starting_date
-        else:
-            num_intervals = (days_diff + 13) // 14
-            current_payday = self.starting_date + timedelta(days=num_intervals * 14)
-
-        while current_payday <= end_of_year:
-            if current_payday >= self.starting_date:
-                paydays.append(current_payday)
-            current_payday += timedelta(days=14)
-
-        # 2. Build the result dataframe
-        df = pd.DataFrame(
-            index=pd.date_range(start_of_year, end_of_year), columns=["total"]
+        """Payday ordinals and net amounts for ``year``."""
+        return self._schedules.get(year)
+
+    def _compute_years(self, first_year, last_year):
+        days = _paydays(self.starting_date, first_year, last_year)
+        return days, _salary_amounts(
+            days,
+            self.starting_date,
+            self.gross_salary,
+            self.estimated_raise["Month"],
+            self.estimated_raise["raise"],
+            self.constant_deductions,
+            self.variable_deductions,
         )
-        df["total"] = 0.0
-
-        # Track annual caps for variable deductions
-        cap_remaining = {v["name"]: v["cap"] for v in self.variable_deductions}
-
-        for p in paydays:
-            num_raises = self._num_raises(p)
-            gross = self.gross_salary * (
-                (1 + self.estimated_raise["raise"]) ** num_raises
-            )
-
-            payday_net = gross - self.constant_deductions
-            for v in self.variable_deductions:
-                raw_deduction = gross * v["amount"]
-                actual_deduction = min(raw_deduction, cap_remaining[v["name"]])
-                payday_net -= actual_deduction
-                cap_remaining[v["name"]] -= actual_deduction
-
-            df.at[pd.Timestamp(p), "total"] = payday_net
 
-        return df
+    def flows(self, dates):
+        days = _as_days(dates)
+        if len(days) == 0:
+            return np.zeros(0)
+        years = _years(days.astype("datetime64[D]"))
+        return _lookup(*self._schedules.range(int(years.min()), int(years.max())), days)
 
     def flow(self, date):
-        df = self._get_cashflows(date.year)
-        # pandas index uses Timestamp
-        ts = pd.Timestamp(date)
-        if ts in df.index:
-            return df.at[ts, "total"]
-        return 0.0
+        # Paydays fall on whole days; a datetime with a time of day never matches.
+        if isinstance(date, datetime) and date != datetime.combine(
+            date.date(), datetime.min.time()
+        ):
+            return 0.0
+        return super().flow(date)
+
+    def _events(self, first, last):
+        return self._schedules.events(first, last)
 
     def to_dict(self, d=None):
         if d is None:
@@ -458,63 +1044,31 @@ class QCSalary(Cashflow):
         self._flows = self._build_flows()
 
     def _build_flows(self):
-        start_of_year = date(self.year, 1, 1)
-        end_of_year = date(self.year, 12, 31)
-
-        # Find first payday on or after Jan 1 of the year
-        days_diff = (start_of_year - self.first_pay_day).days
-        if days_diff <= 0:
-            current_payday = self.first_pay_day
-        else:
-            num_intervals = (days_diff + 13) // 14
-            current_payday = self.first_pay_day + timedelta(days=num_intervals * 14)
-
-        # Collect all paydays in the year
-        paydays = []
-        while current_payday <= end_of_year:
-            if current_payday >= start_of_year:
-                paydays.append(current_payday)
-            current_payday += timedelta(days=14)
-
-        # Pre-compute net pay for each payday
-        flows = {}
-        ei_remaining = self.ei_cap
-        qpip_remaining = self.qpip_cap
-        qpp_remaining = self.qpp_cap
-
-        for p in paydays:
-            # Apply raise if payday is in or after raise_month
-            if p.month >= self.raise_month:
-                gross = self.starting_salary * (1 + self.estimated_raise)
-            else:
-                gross = self.starting_salary
-
-            net = gross - self.constant_deductions
-
-            # EI deduction
-            ei_raw = gross * self.ei_rate
-            ei_actual = min(ei_raw, ei_remaining)
-            net -= ei_actual
-            ei_remaining -= ei_actual
-
-            # QPIP deduction
-            qpip_raw = gross * self.qpip_rate
-            qpip_actual = min(qpip_raw, qpip_remaining)
-            net -= qpip_actual
-            qpip_remaining -= qpip_actual
-
-            # QPP deduction
-            qpp_raw = gross * self.qpp_rate
-            qpp_actual = min(qpp_raw, qpp_remaining)
-            net -= qpp_actual
-            qpp_remaining -= qpp_actual
-
-            flows[p] = net
+        self._days = _paydays(self.first_pay_day, self.year, self.year)
+        self._amounts = _qc_amounts(
+            self._days,
+            self.year,
+            self.starting_salary,
+            self.estimated_raise,
+            self.raise_month,
+            self.constant_deductions,
+            self.ei_rate,
+            self.ei_cap,
+            self.qpip_rate,
+            self.qpip_cap,
+            self.qpp_rate,
+            self.qpp_cap,
+        )
+        return {
+            date.fromordinal(d + _EPOCH_ORDINAL): amount
+            for d, amount in zip(self._days.tolist(), self._amounts.tolist())
+        }
 
-        return flows
+    def flows(self, dates):
+        return _lookup(self._days, self._amounts, _as_days(dates))
 
-    def flow(self, date):
-        return self._flows.get(date, 0.0)
+    def _events(self, first, last):
+        return _between(self._days, self._amounts, first, last)
 
     def to_dict(self, d=None):
         if d is None:
@@ -560,6 +1114,7 @@ class QCMultiYearSalary(Cashflow):
         annual_qpip_cap_increase,
         annual_qpp_cap_increase,
         annual_constant_deductions_increase,
+        cache_years=12,
     ):
         super().__init__(name)
         self.year = year
@@ -580,32 +1135,67 @@ class QCMultiYearSalary(Cashflow):
         self.annual_qpp_cap_increase = annual_qpp_cap_increase
         self.annual_constant_deductions_increase = annual_constant_deductions_increase
 
-        self._salaries = {}
-        for y in range(year, ending_year + 1):
-            n = y - year
-            self._salaries[y] = QCSalary(
-                name=name,
-                year=y,
-                starting_salary=starting_salary * (1 + annual_raise) ** n,
-                estimated_raise=annual_raise,
-                raise_month=raise_month,
-                first_pay_day=first_pay_day,
-                constant_deductions=constant_deductions
-                * (1 + annual_constant_deductions_increase) ** n,
-                ei_rate=ei_rate,
-                ei_cap=ei_cap * (1 + annual_ei_cap_increase) ** n,
-                qpip_rate=qpip_rate,
-                qpip_cap=qpip_cap * (1 + annual_qpip_cap_increase) ** n,
-                qpp_rate=qpp_rate,
-                qpp_cap=qpp_cap * (1 + annual_qpp_cap_increase) ** n,
-            )
+        self.cache_years = cache_years
 
-    def flow(self, date):
-        if hasattr(date, 'year'):
-            salary = self._salaries.get(date.year)
-            if salary is not None:
-                return salary.flow(date)
-        return 0.0
+        # Year objects and payday arrays are both built on first use.
+        self._salaries = _YearSalaries(
+            self._year_salary, year, ending_year, cache_years
+        )
+        self._schedules = _YearlySchedules(self._compute_years, cache_years)
+
+    def _year_salary(self, y):
+        n = y - self.year
+        return QCSalary(
+            name=self.name,
+            year=y,
+            starting_salary=self.starting_salary * (1 + self.annual_raise) ** n,
+            estimated_raise=self.annual_raise,
+            raise_month=self.raise_month,
+            first_pay_day=self.first_pay_day,
+            constant_deductions=self.constant_deductions
+            * (1 + self.annual_constant_deductions_increase) ** n,
+            ei_rate=self.ei_rate,
+            ei_cap=self.ei_cap * (1 + self.annual_ei_cap_increase) ** n,
+            qpip_rate=self.qpip_rate,
+            qpip_cap=self.qpip_cap * (1 + self.annual_qpip_cap_increase) ** n,
+            qpp_rate=self.qpp_rate,
+            qpp_cap=self.qpp_cap * (1 + self.annual_qpp_cap_increase) ** n,
+        )
+
+    def _compute_years(self, first_year, last_year):
+        days = _paydays(
+            self.first_pay_day,
+            max(first_year, self.year),
+            min(last_year, self.ending_year),
+        )
+        return days, _qc_amounts(
+            days,
+            self.year,
+            self.starting_salary,
+            self.annual_raise,
+            self.raise_month,
+            self.constant_deductions,
+            self.ei_rate,
+            self.ei_cap,
+            self.qpip_rate,
+            self.qpip_cap,
+            self.qpp_rate,
+            self.qpp_cap,
+            self.annual_ei_cap_increase,
+            self.annual_qpip_cap_increase,
+            self.annual_qpp_cap_increase,
+            self.annual_constant_deductions_increase,
+        )
+
+    def flows(self, dates):
+        days = _as_days(dates)
+        if len(days) == 0:
+            return np.zeros(0)
+        years = _years(days.astype("datetime64[D]"))
+        return _lookup(*self._schedules.range(int(years.min()), int(years.max())), days)
+
+    def _events(self, first, last):
+        return self._schedules.events(first, last)
 
     def to_dict(self, d=None):
         if d is None:
@@ -635,22 +1225,253 @@ class QCMultiYearSalary(Cashflow):
         return d
 
 
-def run_cashflows(cashflows, startDate, duration, stream):
-    stream.write("Date")
-    for c in cashflows:
-        stream.write("," + c.name)
-    stream.write("\n")
+class Interned(Cashflow):
+    """A named reference to a cashflow shared by identical subtrees.
+
+    Every reference made from the same definition shares ``memo``, which keeps
+    the results of the last few evaluations, so a schedule that appears many
+    times under different names is evaluated once per projection. The results
+    are shared too, and must not be modified.
+    """
+
+    memo_size = 8
+    # Guards every memo; evaluations run outside it.
+    _memo_lock = threading.Lock()
+
+    def __init__(self, name, cashflow, memo):
+        super().__init__(name)
+        self.cashflow = cashflow
+        self._memo = memo
 
-    date_list = [startDate + timedelta(days=x) for x in range(0, duration)]
+    def to_dict(self, d=None):
+        d = self.cashflow.to_dict(d)
+        d["name"] = self.name
+        return d
 
-    for d in date_list:
-        stream.write(str(d))
-        for c in cashflows:
-            stream.write(",")
-            amount = c.flow(d)
-            if amount != 0:
-                stream.write(str(amount))
-        stream.write("\n")
+    def _remember(self, key, compute):
+        with self._memo_lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        value = compute()
+        with self._memo_lock:
+            self._memo[key] = value
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return value
+
+    def flows(self, dates):
+        dates = _as_dates(dates)
+        amounts = self._remember(
+            ("flows", dates.tobytes()), lambda: self.cashflow.flows(dates)
+        )
+        return amounts.copy()
+
+    def _float_days(self, dates):
+        return self.cashflow._float_days(dates)
+
+    def _events(self, first, last):
+        return self._remember(
+            ("events", first, last), lambda: self.cashflow._events(first, last)
+        )
+
+
+def _column(cashflow, start_date, duration):
+    """Daily amounts of a cashflow over the horizon, scattered from its events."""
+    amounts = np.zeros(duration)
+    if duration > 0:
+        first = _to_day(start_date)
+        days, paid = cashflow._events(first, first + duration - 1)
+        amounts[days - first] = paid
+    return amounts
+
+
+def _evaluate_definitions(definitions, start_date, duration):
+    """Process pool entry point: rebuild cashflows from dicts and evaluate them."""
+    return [_column(Cashflow.from_dict(d), start_date, duration) for d in definitions]
+
+
+def _shape(cashflow):
+    """Types of the nodes of a tree, with any Limited's horizon, skipping the
+    Interned references that from_dict only adds when interning."""
+    shape = []
+    stack = [cashflow]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, Interned):
+            shape.append((type(node), getattr(node, "horizon_days", None)))
+            stack.extend(reversed(getattr(node, "cashflows", ())))
+        inner = getattr(node, "cashflow", None)
+        if inner is not None:
+            stack.append(inner)
+    return shape
+
+
+def _definition(cashflow):
+    """to_dict() of ``cashflow`` if from_dict rebuilds the same tree from it,
+    else None."""
+    try:
+        definition = cashflow.to_dict()
+        rebuilt = Cashflow.from_dict(definition)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    return definition if _shape(rebuilt) == _shape(cashflow) else None
+
+
+class _WorkerPool:
+    """Process pool evaluating columns, kept for a whole projection.
+
+    Cashflows are shipped to the workers as to_dict() definitions, each
+    serialised once however many chunks of the horizon are evaluated. Those
+    that do not rebuild the same tree from their definition, such as a
+    subclass only implementing flow() or a Limited with its own
+    horizon_days, are evaluated here while the workers run.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pool = None
+        # id -> (cashflow, definition); holding the cashflow keeps its id.
+        self._definitions = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def _definition(self, cashflow):
+        entry = self._definitions.get(id(cashflow))
+        if entry is None:
+            entry = self._definitions[id(cashflow)] = (
+                cashflow,
+                _definition(cashflow),
+            )
+        return entry[1]
+
+    def columns(self, cashflows, start_date, duration):
+        definitions = [self._definition(c) for c in cashflows]
+        shipped = [i for i, d in enumerate(definitions) if d is not None]
+        columns = [None] * len(cashflows)
+        results = []
+        if shipped:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            size = -(-len(shipped) // self.workers)
+            batches = [shipped[i : i + size] for i in range(0, len(shipped), size)]
+            results = [
+                (
+                    batch,
+                    self._pool.submit(
+                        _evaluate_definitions,
+                        [definitions[i] for i in batch],
+                        start_date,
+                        duration,
+                    ),
+                )
+                for batch in batches
+            ]
+        for i, definition in enumerate(definitions):
+            if definition is None:
+                columns[i] = _column(cashflows[i], start_date, duration)
+        for batch, future in results:
+            for i, column in zip(batch, future.result()):
+                columns[i] = column
+        return columns
+
+
+def _worker_pool(cashflows, workers):
+    """A _WorkerPool for ``workers`` processes, or a context giving None
+    when the cashflows are evaluated serially."""
+    if workers is None or workers <= 1 or len(cashflows) < 2:
+        return nullcontext()
+    return _WorkerPool(workers)
+
+
+def _columns(cashflows, start_date, duration, workers=None, cache=None):
+    """Daily column of each cashflow, in order, optionally over a process pool.
+
+    ``workers`` is a number of processes or a _WorkerPool shared by several
+    calls. With more than one worker the cashflows are split into contiguous
+    batches and shipped as to_dict() definitions rather than pickled objects.
+    With a ColumnCache only the cashflows it does not hold yet are evaluated.
+    """
+    if cache is not None:
+        return cache.columns(
+            cashflows,
+            start_date,
+            duration,
+            lambda missing: _columns(missing, start_date, duration, workers),
+        )
+    if isinstance(workers, _WorkerPool):
+        return workers.columns(cashflows, start_date, duration)
+    with _worker_pool(cashflows, workers) as pool:
+        if pool is None:
+            return [_column(c, start_date, duration) for c in cashflows]
+        return pool.columns(cashflows, start_date, duration)
+
+
+# Days evaluated and formatted at a time by run_cashflows.
+_CSV_CHUNK_DAYS = 4096
+
+
+def _csv_column(amounts, floats):
+    """CSV cells of one column: blank for no flow, else the amount."""
+    cells = [""] * len(amounts)
+    values = amounts.tolist()
+    for i in np.flatnonzero(amounts).tolist():
+        cells[i] = str(values[i]) if floats[i] else str(int(values[i]))
+    return cells
+
+
+def run_cashflows(
+    cashflows,
+    startDate,
+    duration,
+    stream,
+    workers=None,
+    cache=None,
+    compress=False,
+    chunk_days=_CSV_CHUNK_DAYS,
+):
+    """Write the daily flows of each cashflow to ``stream`` as CSV.
+
+    The horizon is evaluated and formatted ``chunk_days`` at a time, so memory
+    does not grow with ``duration``. With ``compress`` the output is gzipped
+    and ``stream`` must be a binary stream.
+    """
+    if compress:
+        with (
+            gzip.GzipFile(fileobj=stream, mode="wb") as raw,
+            io.TextIOWrapper(raw, encoding="utf-8", newline="") as text,
+        ):
+            run_cashflows(
+                cashflows,
+                startDate,
+                duration,
+                text,
+                workers,
+                cache,
+                chunk_days=chunk_days,
+            )
+        return
+
+    stream.write("".join(["Date"] + ["," + c.name for c in cashflows]) + "\n")
+    with _worker_pool(cashflows, workers) as pool:
+        for offset in range(0, duration, chunk_days):
+            n = min(chunk_days, duration - offset)
+            start = startDate + timedelta(days=offset)
+            first = np.datetime64(start, "D")
+            dates = np.arange(first, first + np.timedelta64(n, "D"))
+            columns = _columns(cashflows, start, n, pool or workers, cache)
+            cells = [
+                _csv_column(column, c._float_days(dates))
+                for c, column in zip(cashflows, columns)
+            ]
+            rows = [",".join(row) for row in zip(dates.astype(str).tolist(), *cells)]
+            stream.write("\n".join(rows) + "\n")
 
 
 def flow(cashflows, date):
@@ -660,81 +1481,217 @@ def flow(cashflows, date):
     return total
 
 
-def sum_cashflows(cashflows, start_date, duration, starting_balance):
+def _labels(columns, duration):
+    """Per-day "name: amount" descriptions of the non-zero flows.
+
+    As when read from a DataFrame row, every amount is written as a float if
+    any of the columns holds floats.
+    """
+    floats = any(column.dtype.kind == "f" for column in columns.values())
+    labels = [[] for _ in range(duration)]
+    for name, column in columns.items():
+        for i in np.flatnonzero(column):
+            amount = column[i].item()
+            labels[i].append(f"{name}: {float(amount) if floats else amount}")
+    return [", ".join(label) for label in labels]
+
+
+def _min_forward(balance):
+    """Lowest balance from each day to the end of the horizon."""
+    return np.minimum.accumulate(balance[..., ::-1], axis=-1)[..., ::-1]
+
+
+def _named_columns(cashflows, columns, duration):
+    """Columns keyed by name, and the total of every cashflow.
+
+    Later cashflows replace earlier columns with the same name, but every
+    cashflow still counts towards the total.
+    """
+    named = {}
+    total = np.zeros(duration, dtype=np.int64)
+    for c, column in zip(cashflows, columns):
+        named[c.name] = column
+        total = total + column
+    return named, total
+
+
+def _float_columns(cashflows, start_date, duration):
+    """Whether each cashflow pays a float on any day of the horizon, which
+    made its column float64 when projections were built from flow()."""
+    floats = np.zeros(len(cashflows), dtype=bool)
+    first = _to_day(start_date)
+    for offset in range(0, duration, _PROJECTION_CHUNK_DAYS):
+        n = min(_PROJECTION_CHUNK_DAYS, duration - offset)
+        dates = np.arange(first + offset, first + offset + n).astype("datetime64[D]")
+        for i, c in enumerate(cashflows):
+            floats[i] = floats[i] or c._float_days(dates).any()
+    return floats.tolist()
+
+
+def _typed_columns(columns, floats):
+    """``columns``, as int64 where ``floats`` is false."""
+    return [
+        column if is_float else column.astype(np.int64)
+        for column, is_float in zip(columns, floats)
+    ]
+
+
+def _frame(columns, start_date, duration):
     df = pd.DataFrame(
-        index=[
-            t.to_pydatetime().date()
-            for t in pd.date_range(start_date, periods=duration)
-        ]
+        columns, index=[start_date + timedelta(days=x) for x in range(duration)]
     )
-    for c in cashflows:
-        df[c.name] = [flow([c], i) for i in df.index]
-
-    labels = []
-    for index, row in df.iterrows():
-        label = []
-        for i, v in row.items():
-            if v != 0.0:
-                label.append("{}: {}".format(i, v))
-        if len(label) == 0:
-            labels.append("")
-        else:
-            labels.append(", ".join(label))
+    df["labels"] = _labels(columns, duration)
+    return df
 
-    df["labels"] = labels
 
-    df["total"] = [flow(cashflows, i) for i in df.index]
-    df["balance"] = df["total"].cumsum().add(starting_balance)
-    df["min_forward"] = [df["balance"][i:].min() for i in df.index]
-    return df
+def _running(total, carry):
+    """np.cumsum(total) continued from the running sum ``carry``."""
+    return np.cumsum(np.concatenate([[carry], total]))[1:]
+
+
+def sum_cashflows(
+    cashflows, start_date, duration, starting_balance, workers=None, cache=None
+):
+    """The projection of ``cashflows`` as a DataFrame. See Projection for the
+    same projection held in NumPy arrays.
+
+    The columns of cashflows that only pay ints are int64, as are the total
+    and balance when every cashflow and the starting balance are ints.
+    """
+    return Projection.from_cashflows(
+        cashflows, start_date, duration, starting_balance, workers, cache
+    ).to_frame()
+
+
+# Days per frame yielded by iter_projection.
+_PROJECTION_CHUNK_DAYS = 366
+
+
+def iter_projection(
+    cashflows,
+    start_date,
+    duration,
+    starting_balance,
+    chunk_days=_PROJECTION_CHUNK_DAYS,
+    min_forward=True,
+    workers=None,
+    cache=None,
+):
+    """Yield the projection of sum_cashflows as frames of ``chunk_days`` rows.
+
+    Only one chunk is held at a time. min_forward depends on every later day,
+    so with ``min_forward`` the horizon is evaluated twice: a first pass keeps
+    the running sum and lowest balance of each chunk, and the second yields
+    the frames. Without it the frames leave the column out and the horizon is
+    evaluated once.
+    """
+    floats = _float_columns(cashflows, start_date, duration)
+    chunks = [
+        (offset, min(chunk_days, duration - offset))
+        for offset in range(0, duration, chunk_days)
+    ]
+
+    def evaluate(offset, n, pool):
+        start = start_date + timedelta(days=offset)
+        columns = _columns(cashflows, start, n, pool or workers, cache)
+        return start, *_named_columns(cashflows, _typed_columns(columns, floats), n)
+
+    with _worker_pool(cashflows, workers) as pool:
+        carries = []
+        if min_forward:
+            lows = []
+            carry = 0
+            for offset, n in chunks:
+                _, _, total = evaluate(offset, n, pool)
+                carries.append(carry)
+                running = _running(total, carry)
+                lows.append((running + starting_balance).min())
+                carry = running[-1]
+            # Lowest balance after the end of each chunk but the last.
+            later = np.minimum.accumulate(np.array(lows)[::-1])[::-1][1:]
+
+        carry = 0
+        for k, (offset, n) in enumerate(chunks):
+            start, columns, total = evaluate(offset, n, pool)
+            running = _running(total, carries[k] if min_forward else carry)
+            df = _frame(columns, start, n)
+            df["total"] = total
+            df["balance"] = running + starting_balance
+            if min_forward:
+                low = _min_forward(df["balance"].to_numpy())
+                df["min_forward"] = np.minimum(low, later[k]) if k < len(later) else low
+            carry = running[-1]
+            yield df
 
 
 def store_projection(
     projection: pd.DataFrame, conn: Connection, projection_name: str = "working"
 ):
-    curr = conn.cursor()
-    curr.execute(
-        "CREATE TABLE IF NOT EXISTS projections (timestamp TEXT, name TEXT PRIMARY KEY)"
-    )
-    if projection_name != "working":
-        # check if the projection already exists.
-        try:
-            existing_name = curr.execute(
-                "SELECT name FROM projections WHERE name = ? LIMIT 1",
-                (projection_name,),
-            ).fetchone()
-        except OperationalError:
-            raise
-        if existing_name is not None:
-            raise ValueError(
-                f"The project {projection_name} already exists. Please choose a different name."
-            )
-    else:
-        # if we are working with teh
-        curr.execute('''DELETE FROM projections WHERE name = "working"''')
-    # add projection info to the tables
-    curr.execute(
-        "INSERT INTO projections VALUES (?,?)",
-        (datetime.now().isoformat(), projection_name),
-    )
-    conn.commit()
+    """Store a sum_cashflows frame, or an iterable of iter_projection frames,
+    under ``projection_name``. See ProjectionStore.save."""
+    ProjectionStore(conn).save(projection, projection_name)
 
-    projection["name"] = projection_name
-    projection[["name", "total", "balance", "min_forward", "labels"]].to_sql(
-        "projection_data", conn, if_exists="append", index=True, index_label="Date"
-    )
 
-    conn.commit()
-    conn.close()
+def get_projection(
+    conn: Connection, projection_name: str = "working", start=None, end=None
+):
+    return ProjectionStore(conn).get(projection_name, start, end)
 
 
-def get_projection(conn: Connection, projection_name: str = "working"):
-    return pd.read_sql(
-        "SELECT * from projection_data where name = ?",
-        con=conn,
-        index_col="Date",
-        params=[projection_name],
-    )
+def diff_projections(
+    conn: Connection, a: str, b: str, start=None, end=None, monthly=False
+):
+    """Days, or with ``monthly`` months, on which the stored projections
+    ``a`` and ``b`` differ. See ProjectionStore.diff."""
+    return ProjectionStore(conn).diff(a, b, start, end, monthly)
+
+
+# These modules build on the classes above, so they are imported last.
+from cashflow.cache import ColumnCache
+from cashflow.incremental import IncrementalProjection
+from cashflow.loader import load_cashflows
+from cashflow.plan import Plan, compile_cashflows
+from cashflow.portfolio import Portfolio
+from cashflow.projection import Projection
+from cashflow.scenarios import Simulation, simulate
+from cashflow.store import ProjectionStore
+from cashflow.sweep import sweep
+
+__all__ = [
+    "CASHFLOW_TYPES",
+    "Cashflow",
+    "CashflowEncoder",
+    "ColumnCache",
+    "CompositeCashflow",
+    "EndOn",
+    "IncrementalProjection",
+    "Interned",
+    "IntervalCashflow",
+    "Limited",
+    "MonthlyCashflow",
+    "OneTimeCashflow",
+    "Plan",
+    "Portfolio",
+    "Projection",
+    "ProjectionStore",
+    "QCMultiYearSalary",
+    "QCSalary",
+    "SalaryCashflow",
+    "Simulation",
+    "StartOn",
+    "compile_cashflows",
+    "diff_projections",
+    "flow",
+    "get_projection",
+    "iter_projection",
+    "load_cashflows",
+    "register_cashflow_type",
+    "run_cashflows",
+    "simulate",
+    "store_projection",
+    "sum_cashflows",
+    "sweep",
+]
 
 
 def main():
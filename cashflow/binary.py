@@ -0,0 +1,439 @@
+"""
+Versioned binary files for cashflow definitions and projections.
+
+A file is a fixed header (magic, format version, table of contents length),
+a JSON table of contents, and a run of arrays, each starting on a 64-byte
+boundary. The table of contents records the kind of file, its metadata and
+the dtype, shape and offset of every array, so arrays can be opened with
+numpy.memmap without reading the rest of the file.
+
+Definitions are stored one row per node in a node table (parent, kind, name,
+start, end, limit), with the details of interval, monthly and one-time
+cashflows in typed columns of their own. Anything those columns cannot hold
+exactly, such as salaries or nodes with extra keys, is kept as JSON in a side
+table, so reading a file back gives definitions equal to the ones written.
+
+Projections are stored as contiguous ``dates``, ``total``, ``balance`` and
+``min_forward`` arrays, plus a (cashflows, days) matrix of the columns. They
+are float64 on disk; the metadata lists the series that were int64.
+"""
+
+import json
+import struct
+from itertools import pairwise
+
+import numpy as np
+import pandas as pd
+
+from cashflow import _DAY, _labels, _to_date, _to_day, _to_string
+
+MAGIC = b"CFLOWBIN"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sII")
+_ALIGN = 64
+
+# Node kinds.
+_COMPOSITE, _ONE_TIME, _INTERVAL, _MONTHLY, _JSON = range(5)
+
+# Node flags.
+_HAS_NAME = 1
+_HAS_START = 2
+_HAS_END = 4
+_HAS_LIMIT = 8
+_INT_LIMIT = 16
+_INT_AMOUNT = 32
+_HAS_MONTHS = 64
+# A JSON node whose composite children are stored as nodes of their own.
+_SPLIT = 128
+
+_NODE_KEYS = {"name", "start", "end", "limit", "details"}
+_DETAIL_KEYS = {
+    _ONE_TIME: {"type", "date", "amount"},
+    _INTERVAL: {"type", "first_date", "interval", "amount"},
+    _MONTHLY: {"type", "day", "amount", "months"},
+}
+_KINDS = {"one-time": _ONE_TIME, "interval": _INTERVAL, "monthly": _MONTHLY}
+_INT32 = np.iinfo(np.int32)
+
+
+def _aligned(n):
+    return -(-n // _ALIGN) * _ALIGN
+
+
+def write_container(path, kind, arrays, meta=None):
+    """Write named arrays to ``path`` under a table of contents."""
+    toc = {"kind": kind, "meta": meta or {}, "arrays": {}}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        toc["arrays"][name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset = _aligned(offset + array.nbytes)
+    encoded = json.dumps(toc).encode()
+
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        start = _aligned(_HEADER.size + len(encoded))
+        for name, array in arrays.items():
+            f.write(b"\0" * (start + toc["arrays"][name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+
+
+def is_container(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_container(path):
+    """Return ``(kind, meta, arrays)``, with each array memory-mapped."""
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a cashflow binary file.")
+        _, version, length = _HEADER.unpack(header)
+        if version > VERSION:
+            raise ValueError(
+                f"{path} uses format version {version}; "
+                f"this version of cashflow reads up to {VERSION}."
+            )
+        toc = json.loads(f.read(length))
+
+    start = _aligned(_HEADER.size + length)
+    arrays = {}
+    for name, entry in toc["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        if 0 in shape:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(
+                path, dtype=dtype, mode="r", offset=start + entry["offset"], shape=shape
+            )
+    return toc["kind"], toc["meta"], arrays
+
+
+def _pack_strings(strings):
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob, offsets):
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[a:b].decode() for a, b in pairwise(bounds)]
+
+
+def _is_number(value):
+    return type(value) in (int, float) and (type(value) is float or abs(value) < 2**53)
+
+
+def _is_date(value):
+    try:
+        return isinstance(value, str) and _to_string(_to_date(value)) == value
+    except ValueError:
+        return False
+
+
+def _is_int32(value):
+    return type(value) is int and _INT32.min <= value <= _INT32.max
+
+
+def _typed(node):
+    """Kind of a node that fits the typed columns, or _JSON."""
+    if not set(node) <= _NODE_KEYS or not isinstance(node.get("details"), dict):
+        return _JSON
+    if "name" in node and not isinstance(node["name"], str):
+        return _JSON
+    if any(k in node and not _is_date(node[k]) for k in ("start", "end")):
+        return _JSON
+    if "limit" in node and not _is_number(node["limit"]):
+        return _JSON
+
+    details = node["details"]
+    if details.get("type") == "composite":
+        if set(details) == {"type", "cashflows"} and isinstance(
+            details["cashflows"], list
+        ):
+            return _COMPOSITE
+        return _JSON
+    kind = _KINDS.get(details.get("type"), _JSON)
+    if kind == _JSON or not set(details) <= _DETAIL_KEYS[kind]:
+        return _JSON
+    if not _is_number(details.get("amount")):
+        return _JSON
+    if kind == _ONE_TIME:
+        ok = _is_date(details.get("date"))
+    elif kind == _INTERVAL:
+        ok = _is_date(details.get("first_date")) and _is_int32(details.get("interval"))
+    else:
+        months = details.get("months", [])
+        ok = (
+            _is_int32(details.get("day"))
+            and isinstance(months, list)
+            and all(type(m) is int and 1 <= m <= 12 for m in months)
+            and months == sorted(set(months))
+        )
+    return kind if ok else _JSON
+
+
+def _day(value):
+    return _to_day(_to_date(value))
+
+
+def write_definitions(path, definitions):
+    """Write a list of cashflow definitions, in their JSON shape, to ``path``."""
+    nodes = {k: [] for k in ("parent", "kind", "flags", "start", "end", "limit", "row")}
+    names = []
+    sides = []
+    tables = {
+        _ONE_TIME: {"date": [], "amount": []},
+        _INTERVAL: {"first_date": [], "interval": [], "amount": []},
+        _MONTHLY: {"day": [], "amount": [], "months": []},
+    }
+
+    # Pre-order walk, so children follow their parent in their own order.
+    stack = [(-1, node) for node in reversed(definitions)]
+    while stack:
+        parent, node = stack.pop()
+        index = len(nodes["kind"])
+        kind = _typed(node)
+        flags = 0
+        row = -1
+        start = end = 0
+        limit = 0.0
+        if kind == _JSON:
+            shell = dict(node)
+            details = node.get("details")
+            if isinstance(details, dict) and isinstance(details.get("cashflows"), list):
+                flags |= _SPLIT
+                shell["details"] = {
+                    k: v for k, v in details.items() if k != "cashflows"
+                }
+                children = details["cashflows"]
+            else:
+                children = []
+            row = len(sides)
+            sides.append(json.dumps(shell))
+        else:
+            if "name" in node:
+                flags |= _HAS_NAME
+            if "start" in node:
+                flags |= _HAS_START
+                start = _day(node["start"])
+            if "end" in node:
+                flags |= _HAS_END
+                end = _day(node["end"])
+            if "limit" in node:
+                flags |= _HAS_LIMIT | (_INT_LIMIT if type(node["limit"]) is int else 0)
+                limit = node["limit"]
+            details = node["details"]
+            children = details["cashflows"] if kind == _COMPOSITE else []
+            if kind != _COMPOSITE:
+                if type(details["amount"]) is int:
+                    flags |= _INT_AMOUNT
+                table = tables[kind]
+                row = len(table["amount"])
+                table["amount"].append(details["amount"])
+            if kind == _ONE_TIME:
+                table["date"].append(_day(details["date"]))
+            elif kind == _INTERVAL:
+                table["first_date"].append(_day(details["first_date"]))
+                table["interval"].append(details["interval"])
+            elif kind == _MONTHLY:
+                if "months" in details:
+                    flags |= _HAS_MONTHS
+                table["day"].append(details["day"])
+                table["months"].append(
+                    sum(1 << (m - 1) for m in details.get("months", []))
+                )
+        names.append(node.get("name", ""))
+        for column, value in zip(
+            ("parent", "kind", "flags", "start", "end", "limit", "row"),
+            (parent, kind, flags, start, end, limit, row),
+        ):
+            nodes[column].append(value)
+        stack.extend((index, child) for child in reversed(children))
+
+    arrays = {
+        "node_parent": np.array(nodes["parent"], dtype=np.int32),
+        "node_kind": np.array(nodes["kind"], dtype=np.uint8),
+        "node_flags": np.array(nodes["flags"], dtype=np.uint8),
+        "node_start": np.array(nodes["start"], dtype=_DAY),
+        "node_end": np.array(nodes["end"], dtype=_DAY),
+        "node_limit": np.array(nodes["limit"], dtype=np.float64),
+        "node_row": np.array(nodes["row"], dtype=np.int32),
+    }
+    arrays["name_data"], arrays["name_offsets"] = _pack_strings(names)
+    arrays["json_data"], arrays["json_offsets"] = _pack_strings(sides)
+    for kind, prefix in (
+        (_ONE_TIME, "one_time"),
+        (_INTERVAL, "interval"),
+        (_MONTHLY, "monthly"),
+    ):
+        for column, values in tables[kind].items():
+            dtype = np.float64 if column == "amount" else np.int32
+            arrays[f"{prefix}_{column}"] = np.array(values, dtype=dtype)
+    write_container(path, "definitions", arrays)
+
+
+def _date_strings(days):
+    # Files repeat a few dates many times, so only the distinct ones are
+    # formatted.
+    distinct, inverse = np.unique(days, return_inverse=True)
+    strings = distinct.astype("datetime64[D]").astype(str).tolist()
+    return [strings[i] for i in inverse.tolist()]
+
+
+def _numbers(values, as_int):
+    return [int(v) if i else v for v, i in zip(values, as_int)]
+
+
+def read_definitions(path):
+    """Cashflow definitions written by write_definitions, in their JSON shape."""
+    kind, _, arrays = read_container(path)
+    if kind != "definitions":
+        raise ValueError(f"{path} holds a {kind}, not cashflow definitions.")
+
+    kinds = arrays["node_kind"].tolist()
+    flags = arrays["node_flags"].tolist()
+    parents = arrays["node_parent"].tolist()
+    rows = arrays["node_row"].tolist()
+    names = _unpack_strings(arrays["name_data"], arrays["name_offsets"])
+    sides = _unpack_strings(arrays["json_data"], arrays["json_offsets"])
+    starts = _date_strings(arrays["node_start"])
+    ends = _date_strings(arrays["node_end"])
+    flag_array = arrays["node_flags"]
+    limits = _numbers(
+        arrays["node_limit"].tolist(), ((flag_array & _INT_LIMIT) != 0).tolist()
+    )
+
+    details = {}
+    for code, prefix in (
+        (_ONE_TIME, "one_time"),
+        (_INTERVAL, "interval"),
+        (_MONTHLY, "monthly"),
+    ):
+        nodes = np.flatnonzero(arrays["node_kind"] == code)
+        order = np.argsort(arrays["node_row"][nodes])
+        amounts = _numbers(
+            arrays[f"{prefix}_amount"].tolist(),
+            ((flag_array[nodes[order]] & _INT_AMOUNT) != 0).tolist(),
+        )
+        if code == _ONE_TIME:
+            details[code] = [
+                {"type": "one-time", "date": d, "amount": a}
+                for d, a in zip(_date_strings(arrays["one_time_date"]), amounts)
+            ]
+        elif code == _INTERVAL:
+            details[code] = [
+                {"type": "interval", "first_date": d, "interval": i, "amount": a}
+                for d, i, a in zip(
+                    _date_strings(arrays["interval_first_date"]),
+                    arrays["interval_interval"].tolist(),
+                    amounts,
+                )
+            ]
+        else:
+            has_months = ((flag_array[nodes[order]] & _HAS_MONTHS) != 0).tolist()
+            details[code] = []
+            for day, amount, mask, listed in zip(
+                arrays["monthly_day"].tolist(),
+                amounts,
+                arrays["monthly_months"].tolist(),
+                has_months,
+            ):
+                d = {"type": "monthly", "day": day, "amount": amount}
+                if listed:
+                    d["months"] = [m for m in range(1, 13) if mask >> (m - 1) & 1]
+                details[code].append(d)
+
+    definitions = []
+    built = []
+    for i, kind in enumerate(kinds):
+        if kind == _JSON:
+            node = json.loads(sides[rows[i]])
+            if flags[i] & _SPLIT:
+                node["details"]["cashflows"] = []
+        else:
+            f = flags[i]
+            node = {}
+            if f & _HAS_NAME:
+                node["name"] = names[i]
+            if f & _HAS_START:
+                node["start"] = starts[i]
+            if f & _HAS_END:
+                node["end"] = ends[i]
+            if f & _HAS_LIMIT:
+                node["limit"] = limits[i]
+            if kind == _COMPOSITE:
+                node["details"] = {"type": "composite", "cashflows": []}
+            else:
+                node["details"] = details[kind][rows[i]]
+        built.append(node)
+        if parents[i] < 0:
+            definitions.append(node)
+        else:
+            built[parents[i]]["details"]["cashflows"].append(node)
+    return definitions
+
+
+# The daily series of a projection besides the cashflow columns.
+_SERIES = ("total", "balance", "min_forward")
+
+
+def write_projection(path, projection):
+    """Write a sum_cashflows frame to ``path``."""
+    names = [c for c in projection.columns if c not in ("labels", *_SERIES)]
+    arrays = {
+        "dates": np.array(list(projection.index), dtype="datetime64[D]"),
+        "total": projection["total"].to_numpy(dtype=np.float64),
+        "balance": projection["balance"].to_numpy(dtype=np.float64),
+        "min_forward": projection["min_forward"].to_numpy(dtype=np.float64),
+        "columns": np.empty((len(names), len(projection))),
+    }
+    for i, name in enumerate(names):
+        arrays["columns"][i] = projection[name].to_numpy(dtype=np.float64)
+    integers = [
+        c for c in [*names, *_SERIES] if projection[c].dtype == np.dtype(np.int64)
+    ]
+    write_container(path, "projection", arrays, {"names": names, "integers": integers})
+
+
+def _open_projection(path):
+    kind, meta, arrays = read_container(path)
+    if kind != "projection":
+        raise ValueError(f"{path} holds {kind}, not a projection.")
+    return meta, arrays
+
+
+def open_projection(path):
+    """Memory-mapped arrays of a projection file, and its cashflow names."""
+    meta, arrays = _open_projection(path)
+    return meta["names"], arrays
+
+
+def read_projection(path):
+    """A projection file as the frame sum_cashflows returned."""
+    meta, arrays = _open_projection(path)
+    integers = set(meta.get("integers", []))
+
+    def series(name, values):
+        return values.astype(np.int64 if name in integers else np.float64)
+
+    columns = {
+        name: series(name, values)
+        for name, values in zip(meta["names"], arrays["columns"])
+    }
+    df = pd.DataFrame(columns, index=np.array(arrays["dates"]).tolist())
+    df["labels"] = _labels(columns, len(df))
+    for name in _SERIES:
+        df[name] = series(name, arrays[name])
+    return df
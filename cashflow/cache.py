@@ -0,0 +1,157 @@
+"""
+Persistent cache of evaluated cashflow columns.
+
+A column is stored under the SHA-256 of the cashflow's canonical definition
+(its to_dict() output without the names of the cashflows in it, serialised
+with sorted keys)
+and the projection window, so the same schedule is reused across files,
+processes and restarts whatever it is called. Only the days with a non-zero
+amount are kept, as packed int32 offsets and float64 amounts. The cache is a
+single SQLite file and is trimmed back to ``max_bytes`` by evicting the least
+recently used columns.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS columns (
+    key TEXT PRIMARY KEY,
+    offsets BLOB NOT NULL,
+    amounts BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS columns_used ON columns (used);
+"""
+
+
+def _strip_names(definition):
+    """``definition`` without the names of its cashflows.
+
+    Only the names of cashflow nodes are dropped. Other names, such as those
+    of a salary's deductions, decide the schedule and are kept.
+    """
+    stripped = {k: v for k, v in definition.items() if k != "name"}
+    details = stripped.get("details", {})
+    if details.get("type") == "composite":
+        stripped["details"] = {
+            **details,
+            "cashflows": [_strip_names(c) for c in details["cashflows"]],
+        }
+    return stripped
+
+
+def column_key(cashflow, start_date, duration):
+    """Cache key of a cashflow's column over a projection window."""
+    canonical = json.dumps(
+        [_strip_names(cashflow.to_dict()), start_date.isoformat(), duration],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ColumnCache:
+    """Size-bounded SQLite store of evaluated columns.
+
+    Parameters
+    ----------
+    path : str or Path
+        SQLite file to use; ``":memory:"`` keeps the cache in this process.
+    max_bytes : int
+        Upper bound on the stored column data.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM columns").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM columns")
+
+    def size(self):
+        """Bytes of column data currently stored."""
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM columns")
+            return row.fetchone()[0]
+
+    def get(self, key, duration):
+        """The stored column for ``key``, or None."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT offsets, amounts FROM columns WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE columns SET used = ? WHERE key = ?", (time.time(), key)
+            )
+        column = np.zeros(duration)
+        column[np.frombuffer(row[0], dtype=np.int32)] = np.frombuffer(
+            row[1], dtype=np.float64
+        )
+        return column
+
+    def put(self, key, column):
+        offsets = np.flatnonzero(column).astype(np.int32)
+        amounts = np.ascontiguousarray(column[offsets], dtype=np.float64)
+        size = offsets.nbytes + amounts.nbytes
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO columns VALUES (?, ?, ?, ?, ?)",
+                (key, offsets.tobytes(), amounts.tobytes(), size, time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM columns")
+        excess = total.fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        stale = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM columns ORDER BY used, rowid"
+        ):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM columns WHERE key = ?", stale)
+
+    def columns(self, cashflows, start_date, duration, evaluate):
+        """Columns of ``cashflows``, calling ``evaluate(missing)`` for the
+        cashflows that are not cached and storing the result."""
+        keys = [column_key(c, start_date, duration) for c in cashflows]
+        columns = [self.get(key, duration) for key in keys]
+        # Cashflows with the same schedule under different names share a key.
+        missing = {}
+        for i, column in enumerate(columns):
+            if column is None:
+                missing.setdefault(keys[i], i)
+        if missing:
+            evaluated = evaluate([cashflows[i] for i in missing.values()])
+            results = dict(zip(missing, evaluated))
+            for key, column in results.items():
+                self.put(key, column)
+            columns = [
+                results[key] if column is None else column
+                for key, column in zip(keys, columns)
+            ]
+        return columns
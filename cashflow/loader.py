@@ -0,0 +1,74 @@
+"""
+Loading cashflow files.
+
+load_cashflows() reads a file of top-level cashflow definitions, either JSON
+or the binary format of cashflow.binary, and builds them with
+Cashflow.from_dict, interning identical subtrees. Built files are kept in a
+small cache keyed on the resolved path, modification time and size, so loading
+an unchanged file again returns the same cashflows without reading or parsing
+it. Cashflows build their schedules lazily and safely under concurrent use,
+so one loaded file can be projected from several threads at once.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from cashflow import Cashflow
+from cashflow.binary import is_container, read_definitions
+
+_CACHE_SIZE = 32
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _signature(path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_cashflows(path, content=None):
+    """Top-level cashflows defined in the file at ``path``, as a tuple.
+
+    ``content`` may give the JSON already read from ``path``. The file is then
+    not read again, and the cache is keyed on those bytes rather than on the
+    file's modification time and size.
+
+    The cashflows are shared with every other caller that loads the same
+    unchanged file, so they must not be modified.
+    """
+    path = Path(path).resolve()
+    if content is None:
+        signature = _signature(path)
+    else:
+        signature = hashlib.sha256(content).digest()
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == signature:
+            _cache.move_to_end(path)
+            return cached[1]
+
+    if content is not None:
+        definitions = json.loads(content)
+    elif is_container(path):
+        definitions = read_definitions(path)
+    else:
+        definitions = json.loads(path.read_bytes())
+    if not isinstance(definitions, list):
+        raise TypeError(f"{path.name} does not hold a list of cashflows.")
+    interned = {}
+    cashflows = tuple(Cashflow.from_dict(d, interned) for d in definitions)
+    with _lock:
+        _cache[path] = (signature, cashflows)
+        _cache.move_to_end(path)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return cashflows
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,106 @@
+"""
+Addressing fields of cashflow definitions by slash-separated path.
+
+A path starts with the name of a top-level cashflow, continues through the
+names of composite children, and ends with the keys of the field inside that
+node's definition, e.g. ``Pay/Arup Pay 2023/details/amount``. List items, such
+as variable deductions, are addressed by index.
+"""
+
+from datetime import timedelta
+
+from cashflow import _to_date
+
+
+def _child(cashflows, name):
+    for cf in cashflows:
+        if cf.get("name") == name:
+            return cf
+    return None
+
+
+def resolve(definitions, path):
+    """Locate the field named by ``path`` in a list of cashflow definitions.
+
+    Returns ``(chain, keys)``: the definitions from the top-level cashflow down
+    to the node holding the field, and the keys of the field within that node.
+    """
+    parts = path.split("/")
+    node = _child(definitions, parts[0])
+    if node is None:
+        raise ValueError(f"No top-level cashflow named '{parts[0]}' in path '{path}'.")
+
+    chain = [node]
+    i = 1
+    while i < len(parts):
+        details = node.get("details", {})
+        if details.get("type") != "composite":
+            break
+        child = _child(details.get("cashflows", []), parts[i])
+        if child is None:
+            break
+        chain.append(child)
+        node = child
+        i += 1
+
+    keys = parts[i:]
+    if not keys:
+        raise ValueError(f"Path '{path}' names a cashflow, not one of its fields.")
+    get_value(node, keys)
+    return chain, keys
+
+
+def _key(container, key):
+    return int(key) if isinstance(container, list) else key
+
+
+def get_value(node, keys):
+    value = node
+    try:
+        for key in keys:
+            value = value[_key(value, key)]
+    except (KeyError, IndexError, ValueError, TypeError):
+        raise ValueError(f"'{'/'.join(keys)}' is not a field of '{node.get('name')}'.")
+    return value
+
+
+def set_value(node, keys, value):
+    """Set a field in place; the containing keys must already exist."""
+    container = get_value(node, keys[:-1]) if len(keys) > 1 else node
+    container[_key(container, keys[-1])] = value
+
+
+def window(chain):
+    """Intersected StartOn/EndOn window of the ancestors of the last node.
+
+    Returns ``(start, end)`` dates, either of which may be None.
+    """
+    start = end = None
+    for node in chain[:-1]:
+        if "start" in node:
+            s = _to_date(node["start"])
+            start = s if start is None else max(start, s)
+        if "end" in node:
+            e = _to_date(node["end"])
+            end = e if end is None else min(end, e)
+    return start, end
+
+
+def limited_ancestor(chain):
+    """Index of the outermost ancestor in ``chain`` that has a limit, or None."""
+    for i, node in enumerate(chain[:-1]):
+        if "limit" in node:
+            return i
+    return None
+
+
+def day_range(chain, start_date, duration):
+    """Inclusive date range where the last node of ``chain`` can be active."""
+    first = start_date
+    last = start_date + timedelta(days=duration - 1)
+    start, end = window(chain)
+    if start is not None:
+        first = max(first, start)
+    if end is not None:
+        last = min(last, end)
+    return first, last
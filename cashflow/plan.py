@@ -0,0 +1,156 @@
+"""
+Flat evaluation plans for cashflow trees.
+
+compile_cashflows() lowers a list of top-level cashflows into a table of leaf
+schedules. Each leaf carries the StartOn/EndOn window of every wrapper above it
+folded into one active window, the cap of a Limited wrapping it directly, and
+the index of the top-level cashflow it adds into. A projection then runs once
+over the leaves instead of walking every wrapper and composite per evaluation,
+with the plain interval and monthly leaves evaluated together in a Portfolio.
+"""
+
+import numpy as np
+
+from cashflow import (
+    _DAY,
+    _NO_END,
+    _NO_START,
+    CompositeCashflow,
+    EndOn,
+    IntervalCashflow,
+    Limited,
+    MonthlyCashflow,
+    StartOn,
+    _apply_cap,
+    _to_day,
+)
+from cashflow.portfolio import Portfolio
+
+_WRAPPERS = (StartOn, EndOn, Limited, CompositeCashflow)
+_BATCHED = (IntervalCashflow, MonthlyCashflow)
+
+
+class Plan:
+    """Leaf table for a list of top-level cashflows.
+
+    Attributes
+    ----------
+    names : list of str
+        Names of the top-level cashflows, one output row each.
+    schedules : list of Cashflow
+        Leaf schedules, with no StartOn, EndOn or composite left above them.
+    paths : list of tuple
+        Names from the top-level cashflow down to each leaf.
+    groups : ndarray of int
+        Index into ``names`` of the top-level cashflow each leaf adds into.
+    starts, ends : ndarray of int32
+        Inclusive active window of each leaf as days since 1970-01-01.
+    caps : ndarray of float
+        Absolute cap of each leaf, NaN when it is not limited.
+    cap_starts : ndarray of int32
+        Day from which each capped leaf counts towards its cap.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.schedules = []
+        self.paths = []
+        self._rows = []
+
+    def _add(self, schedule, path, group, start, end, cap=np.nan, cap_start=_NO_START):
+        self.schedules.append(schedule)
+        self.paths.append(path)
+        self._rows.append((group, start, end, cap, cap_start))
+
+    def _freeze(self):
+        columns = list(zip(*self._rows)) or [()] * 5
+        self.groups = np.array(columns[0], dtype=np.int64)
+        self.starts = np.array(columns[1], dtype=_DAY)
+        self.ends = np.array(columns[2], dtype=_DAY)
+        self.caps = np.array(columns[3], dtype=float)
+        self.cap_starts = np.array(columns[4], dtype=_DAY)
+        del self._rows
+
+        # Uncapped interval and monthly leaves are evaluated together as arrays.
+        self._portfolio = Portfolio()
+        self._batched = np.zeros(len(self.schedules), dtype=bool)
+        for i, schedule in enumerate(self.schedules):
+            if np.isnan(self.caps[i]) and type(schedule) in _BATCHED:
+                self._portfolio._add_leaf(schedule, self.starts[i], self.ends[i])
+                self._batched[i] = True
+
+    def __len__(self):
+        return len(self.schedules)
+
+    def evaluate(self, start_date, duration):
+        """Daily amounts of each top-level cashflow, shaped (names, days)."""
+        first = _to_day(start_date)
+        out = np.zeros((len(self.names), duration))
+        dates = np.arange(first, first + duration).astype("datetime64[D]")
+
+        if len(self._portfolio) > 0:
+            out += self._portfolio.grouped(
+                start_date, duration, self.groups[self._batched], len(self.names)
+            )
+
+        lo = np.clip(self.starts, first, first + duration) - first
+        hi = np.clip(self.ends, first - 1, first + duration - 1) - first + 1
+        for i in np.flatnonzero((hi > lo) & ~self._batched):
+            if np.isnan(self.caps[i]):
+                amounts = self.schedules[i].flows(dates[lo[i] : hi[i]])
+            else:
+                amounts = self._capped(i, first + lo[i], first + hi[i] - 1)
+            out[self.groups[i], lo[i] : hi[i]] += amounts
+        return out
+
+    def columns(self, start_date, duration):
+        """Daily amounts keyed by top-level name, like sum_cashflows' columns."""
+        return dict(zip(self.names, self.evaluate(start_date, duration)))
+
+    def total(self, start_date, duration):
+        return self.evaluate(start_date, duration).sum(axis=0)
+
+    def _capped(self, i, first, last):
+        # The cap counts every flow since cap_start, not just those in view.
+        cap_start = self.cap_starts[i]
+        dates = np.arange(cap_start, last + 1).astype("datetime64[D]")
+        amounts = _apply_cap(self.schedules[i].flows(dates), self.caps[i])
+        return amounts[first - cap_start :]
+
+
+def compile_cashflows(cashflows):
+    """Lower a list of cashflow trees into a reusable flat Plan."""
+    plan = Plan(c.name for c in cashflows)
+    for group, cf in enumerate(cashflows):
+        stack = [(cf, (), _NO_START, _NO_END)]
+        while stack:
+            cf, path, start, end = stack.pop()
+            while isinstance(cf, (StartOn, EndOn)):
+                if isinstance(cf, StartOn):
+                    start = max(start, _to_day(cf.start_date))
+                else:
+                    end = min(end, _to_day(cf.end_date))
+                cf = cf.cashflow
+
+            if isinstance(cf, CompositeCashflow):
+                path = path + (cf.name,)
+                # Reversed so children come off the stack in their own order.
+                for child in reversed(cf.cashflows):
+                    stack.append((child, path, start, end))
+            elif isinstance(cf, Limited) and not isinstance(cf.cashflow, _WRAPPERS):
+                cap_start = _to_day(cf.startDate)
+                plan._add(
+                    cf.cashflow,
+                    path + (cf.name,),
+                    group,
+                    max(start, cap_start),
+                    end,
+                    abs(cf.maximum),
+                    cap_start,
+                )
+            else:
+                # Anything else, including a Limited over a composite, is
+                # evaluated as an opaque schedule.
+                plan._add(cf, path + (cf.name,), group, start, end)
+    plan._freeze()
+    return plan
@@ -0,0 +1,172 @@
+"""
+Struct-of-arrays storage for large numbers of recurring cashflows.
+
+A Portfolio keeps every IntervalCashflow and every MonthlyCashflow leaf as rows
+of parallel NumPy columns, one table per type, and evaluates a whole table with
+broadcasting against the days of the horizon instead of calling flow() per
+leaf per day.
+"""
+
+import numpy as np
+
+from cashflow import (
+    _BLOCK_CELLS,
+    _DAY,
+    _NO_END,
+    _NO_START,
+    EndOn,
+    IntervalCashflow,
+    MonthlyCashflow,
+    StartOn,
+    _month_day,
+    _to_day,
+)
+
+_INTERVAL_COLUMNS = (
+    "position",
+    "start",
+    "interval",
+    "amount",
+    "window_start",
+    "window_end",
+)
+_MONTHLY_COLUMNS = ("position", "day", "months", "amount", "window_start", "window_end")
+# Day ordinals, intervals, days of the month and month masks are all int32.
+_COLUMN_TYPES = {"position": np.int64, "amount": float}
+
+
+class Portfolio:
+    """Interval and monthly cashflows evaluated together as arrays.
+
+    Leaves may be wrapped in StartOn and EndOn, which become each row's active
+    window. ``names`` lists the leaves in the order they were added, which is
+    also the column order of matrix().
+    """
+
+    def __init__(self):
+        self.names = []
+        self._rows = {IntervalCashflow: [], MonthlyCashflow: []}
+        self._tables = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_cashflows(cls, cashflows):
+        portfolio = cls()
+        for cf in cashflows:
+            portfolio.add(cf)
+        return portfolio
+
+    def add(self, cashflow):
+        start, end = _NO_START, _NO_END
+        leaf = cashflow
+        while isinstance(leaf, (StartOn, EndOn)):
+            if isinstance(leaf, StartOn):
+                start = max(start, _to_day(leaf.start_date))
+            else:
+                end = min(end, _to_day(leaf.end_date))
+            leaf = leaf.cashflow
+        self._add_leaf(leaf, start, end, cashflow.name)
+
+    def _add_leaf(self, leaf, window_start, window_end, name=None):
+        position = len(self.names)
+        window_start = max(window_start, _NO_START)
+        window_end = min(window_end, _NO_END)
+        if type(leaf) is IntervalCashflow:
+            row = (
+                position,
+                _to_day(leaf.start_date),
+                leaf.interval_days,
+                leaf.amount,
+                window_start,
+                window_end,
+            )
+        elif type(leaf) is MonthlyCashflow:
+            months = sum(1 << (m - 1) for m in set(leaf.months))
+            row = (
+                position,
+                leaf.day_of_month,
+                months,
+                leaf.amount,
+                window_start,
+                window_end,
+            )
+        else:
+            raise ValueError(
+                f"{type(leaf).__name__} cannot be stored in a Portfolio; "
+                "only interval and monthly cashflows are supported."
+            )
+        self._rows[type(leaf)].append(row)
+        self.names.append(leaf.name if name is None else name)
+        self._tables = None
+
+    def _columns(self):
+        if self._tables is None:
+            self._tables = {}
+            for kind, names in (
+                (IntervalCashflow, _INTERVAL_COLUMNS),
+                (MonthlyCashflow, _MONTHLY_COLUMNS),
+            ):
+                columns = list(zip(*self._rows[kind])) or [()] * len(names)
+                self._tables[kind] = {
+                    name: np.array(column, dtype=_COLUMN_TYPES.get(name, _DAY))
+                    for name, column in zip(names, columns)
+                }
+        return self._tables
+
+    def _blocks(self, start_date, duration):
+        """Yield (positions, amounts) blocks shaped (days, flows)."""
+        first = _to_day(start_date)
+        days = np.arange(first, first + duration, dtype=_DAY)[:, None]
+        month, day = _month_day(days.astype("datetime64[D]"))
+        step = max(1, _BLOCK_CELLS // max(duration, 1))
+        tables = self._columns()
+
+        table = tables[IntervalCashflow]
+        for lo in range(0, len(table["position"]), step):
+            t = {name: column[lo : lo + step] for name, column in table.items()}
+            delta = days - t["start"]
+            active = (
+                (delta >= 0)
+                & (delta % t["interval"] == 0)
+                & (days >= t["window_start"])
+                & (days <= t["window_end"])
+            )
+            yield t["position"], active * t["amount"]
+
+        table = tables[MonthlyCashflow]
+        for lo in range(0, len(table["position"]), step):
+            t = {name: column[lo : lo + step] for name, column in table.items()}
+            active = (
+                (day == t["day"])
+                & ((t["months"] >> (month - 1)) & 1 == 1)
+                & (days >= t["window_start"])
+                & (days <= t["window_end"])
+            )
+            yield t["position"], active * t["amount"]
+
+    def matrix(self, start_date, duration):
+        """Daily amounts of every leaf, shaped (days, flows)."""
+        out = np.zeros((duration, len(self.names)))
+        for positions, amounts in self._blocks(start_date, duration):
+            out[:, positions] = amounts
+        return out
+
+    def total(self, start_date, duration):
+        """Daily sum over every leaf."""
+        total = np.zeros(duration)
+        for _, amounts in self._blocks(start_date, duration):
+            total += amounts.sum(axis=1)
+        return total
+
+    def grouped(self, start_date, duration, groups, count):
+        """Daily sums per group, shaped (count, days).
+
+        ``groups`` gives the group index of each leaf in ``names`` order.
+        """
+        groups = np.asarray(groups, dtype=np.int64)
+        out = np.zeros((count, duration))
+        for positions, amounts in self._blocks(start_date, duration):
+            np.add.at(out, groups[positions], amounts.T)
+        return out
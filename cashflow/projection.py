@@ -0,0 +1,218 @@
+"""
+Projections held in NumPy arrays.
+
+A Projection keeps its dates as one contiguous datetime64[D] array and every
+daily series, the column of each named cashflow and the total, balance and
+min_forward, as contiguous float64 arrays. Slicing by date is an offset into
+those arrays and returns views, to_pandas() wraps them without copying, and
+save() writes the projection file of cashflow.binary, which load() maps back
+into memory so processes reading the same file share its pages.
+
+The series that sum_cashflows returns as int64, because every amount in them
+is an int, are listed in ``integers``; to_frame() and labels() restore them.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from cashflow import (
+    _columns,
+    _float_columns,
+    _frame,
+    _labels,
+    _min_forward,
+    _named_columns,
+    _typed_columns,
+)
+from cashflow.binary import _open_projection, write_container
+
+
+def _day(value):
+    return np.datetime64(value, "D")
+
+
+class Projection:
+    """Daily projection of a set of cashflows.
+
+    Attributes
+    ----------
+    dates : ndarray of datetime64[D]
+    names : list of str
+        Names of the cashflow columns. As in sum_cashflows, a later cashflow
+        replaces an earlier column with the same name.
+    columns : ndarray
+        Daily amounts, one row per name.
+    total, balance, min_forward : ndarray
+        Daily values, as in sum_cashflows.
+    integers : frozenset of str
+        Names of the columns, and of total, balance and min_forward, that
+        only hold ints.
+    """
+
+    def __init__(self, dates, names, columns, total, balance, min_forward, integers=()):
+        self.dates = dates
+        self.names = list(names)
+        self.columns = columns
+        self.total = total
+        self.balance = balance
+        self.min_forward = min_forward
+        self.integers = frozenset(integers)
+
+    @classmethod
+    def from_cashflows(
+        cls,
+        cashflows,
+        start_date,
+        duration,
+        starting_balance,
+        workers=None,
+        cache=None,
+    ):
+        """Project ``cashflows`` over ``duration`` days from ``start_date``."""
+        named, total = _named_columns(
+            cashflows,
+            _typed_columns(
+                _columns(cashflows, start_date, duration, workers, cache),
+                _float_columns(cashflows, start_date, duration),
+            ),
+            duration,
+        )
+        integers = [name for name, column in named.items() if column.dtype.kind == "i"]
+        columns = np.empty((len(named), duration))
+        for row, column in zip(columns, named.values()):
+            row[:] = column
+        balance = np.cumsum(total) + starting_balance
+        if total.dtype.kind == "i":
+            integers.append("total")
+        if balance.dtype.kind == "i":
+            integers += ["balance", "min_forward"]
+        return cls(
+            _day(start_date) + np.arange(duration),
+            named,
+            columns,
+            total.astype(float),
+            balance.astype(float),
+            _min_forward(balance).astype(float),
+            integers,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """The projection saved at ``path``, memory-mapped read-only."""
+        meta, arrays = _open_projection(path)
+        return cls(
+            arrays["dates"],
+            meta["names"],
+            arrays["columns"],
+            arrays["total"],
+            arrays["balance"],
+            arrays["min_forward"],
+            meta.get("integers", ()),
+        )
+
+    def save(self, path):
+        write_container(
+            path,
+            "projection",
+            {
+                "dates": self.dates,
+                "total": self.total,
+                "balance": self.balance,
+                "min_forward": self.min_forward,
+                "columns": self.columns,
+            },
+            {"names": self.names, "integers": sorted(self.integers)},
+        )
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        if len(self) == 0:
+            return f"<Projection of {len(self.names)} cashflows, no days>"
+        return (
+            f"<Projection of {len(self.names)} cashflows, "
+            f"{self.dates[0]} to {self.dates[-1]}>"
+        )
+
+    def __getitem__(self, key):
+        """A daily series by name, or with a slice of dates the projection
+        between them, inclusive, as in DataFrame.loc."""
+        if isinstance(key, slice):
+            if key.step is not None:
+                raise ValueError("Projections can't be sliced with a step")
+            return self.window(key.start, key.stop)
+        if key in ("total", "balance", "min_forward"):
+            return getattr(self, key)
+        try:
+            return self.columns[self.names.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    @property
+    def start_date(self):
+        return self.dates[0].item() if len(self) else None
+
+    def offset(self, day):
+        """Index of ``day`` in the arrays, clipped to the projection."""
+        if len(self) == 0:
+            return 0
+        index = (_day(day) - self.dates[0]).astype(np.int64)
+        return int(np.clip(index, 0, len(self)))
+
+    def window(self, start=None, end=None):
+        """The days from ``start`` to ``end`` inclusive, as a Projection of
+        views into this one's arrays."""
+        first = 0 if start is None else self.offset(start)
+        if end is None:
+            last = len(self)
+        else:
+            last = self.offset(_day(end) + np.timedelta64(1, "D"))
+        part = slice(first, max(first, last))
+        return Projection(
+            self.dates[part],
+            self.names,
+            self.columns[:, part],
+            self.total[part],
+            self.balance[part],
+            self.min_forward[part],
+            self.integers,
+        )
+
+    def _typed(self, name, values):
+        return values.astype(np.int64) if name in self.integers else values
+
+    def _named(self):
+        return {
+            name: self._typed(name, column)
+            for name, column in zip(self.names, self.columns)
+        }
+
+    def labels(self):
+        return _labels(self._named(), len(self))
+
+    def to_pandas(self, labels=False):
+        """The projection as a DataFrame indexed by a DatetimeIndex, sharing
+        this projection's float arrays rather than copying them. Unlike
+        to_frame(), every column stays float."""
+        data = dict(zip(self.names, self.columns))
+        if labels:
+            data["labels"] = self.labels()
+        data["total"] = self.total
+        data["balance"] = self.balance
+        data["min_forward"] = self.min_forward
+        return pd.DataFrame(
+            data, index=pd.DatetimeIndex(self.dates, name="Date"), copy=False
+        )
+
+    def to_frame(self):
+        """The projection in the shape returned by sum_cashflows, indexed by
+        date objects and with a labels column. The columns listed in
+        ``integers`` are int64 again."""
+        start = self.start_date or date.min
+        df = _frame(self._named(), start, len(self))
+        for name in ("total", "balance", "min_forward"):
+            df[name] = self._typed(name, getattr(self, name))
+        return df
@@ -0,0 +1,356 @@
+"""
+Monte Carlo projections over cashflow definitions.
+
+simulate() takes a list of cashflow definitions (the JSON shape) and a
+distribution for selected numeric fields, addressed by path as in
+cashflow.paths. Each uncertain leaf is evaluated once for all scenarios at the
+same time, as a scenarios x paydays array, and added as a difference from the
+deterministic projection of the whole file. Balances are then accumulated in
+blocks of days, so memory stays bounded by the block size rather than by
+scenarios x horizon.
+"""
+
+from copy import deepcopy
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from cashflow import (
+    _BLOCK_CELLS,
+    _DAY,
+    Cashflow,
+    IntervalCashflow,
+    MonthlyCashflow,
+    _apply_cap,
+    _columns,
+    _paydays,
+    _qc_amounts,
+    _salary_amounts,
+    _to_date,
+    _to_day,
+)
+from cashflow.paths import day_range, limited_ancestor, resolve, set_value
+
+# Fields that shape a schedule rather than scale it; these cannot be sampled.
+_STRUCTURAL = {
+    "type",
+    "date",
+    "first_date",
+    "interval",
+    "day",
+    "months",
+    "starting_date",
+    "Month",
+    "name",
+    "year",
+    "ending_year",
+    "raise_month",
+    "first_pay_day",
+    "cashflows",
+}
+
+
+def _within(days, amounts, first, last):
+    keep = (days >= _to_day(first)) & (days <= _to_day(last))
+    return days[keep], amounts[..., keep]
+
+
+def _one_time_events(details, first, last):
+    d = _to_date(details["date"])
+    days = np.array([_to_day(d)] if first <= d <= last else [], dtype=_DAY)
+    return days, details["amount"] * np.ones(len(days))
+
+
+def _interval_events(details, first, last):
+    schedule = IntervalCashflow(
+        None, _to_date(details["first_date"]), details["interval"], 1
+    )
+    days, _ = schedule._events(_to_day(first), _to_day(last))
+    return days, details["amount"] * np.ones(len(days))
+
+
+def _monthly_events(details, first, last):
+    schedule = MonthlyCashflow(None, details["day"], 1, details.get("months"))
+    days, _ = schedule._events(_to_day(first), _to_day(last))
+    return days, details["amount"] * np.ones(len(days))
+
+
+def _salary_events(details, first, last):
+    starting_date = _to_date(details["starting_date"])
+    days = _paydays(starting_date, first.year, last.year)
+    amounts = _salary_amounts(
+        days,
+        starting_date,
+        details["gross_salary"],
+        details["estimated_raise"]["Month"],
+        details["estimated_raise"]["raise"],
+        details["constant_deductions"],
+        details["variable_deductions"],
+    )
+    return _within(days, amounts, first, last)
+
+
+def _qc_salary_events(details, first, last):
+    year = details["year"]
+    days = _paydays(_to_date(details["first_pay_day"]), year, year)
+    amounts = _qc_amounts(
+        days,
+        year,
+        details["starting_salary"],
+        details["estimated_raise"],
+        details["raise_month"],
+        details["constant_deductions"],
+        details["ei_rate"],
+        details["ei_cap"],
+        details["qpip_rate"],
+        details["qpip_cap"],
+        details["qpp_rate"],
+        details["qpp_cap"],
+    )
+    return _within(days, amounts, first, last)
+
+
+def _qc_multi_year_salary_events(details, first, last):
+    days = _paydays(
+        _to_date(details["first_pay_day"]),
+        max(first.year, details["year"]),
+        min(last.year, details["ending_year"]),
+    )
+    amounts = _qc_amounts(
+        days,
+        details["year"],
+        details["starting_salary"],
+        details["annual_raise"],
+        details["raise_month"],
+        details["constant_deductions"],
+        details["ei_rate"],
+        details["ei_cap"],
+        details["qpip_rate"],
+        details["qpip_cap"],
+        details["qpp_rate"],
+        details["qpp_cap"],
+        details["annual_ei_cap_increase"],
+        details["annual_qpip_cap_increase"],
+        details["annual_qpp_cap_increase"],
+        details["annual_constant_deductions_increase"],
+    )
+    return _within(days, amounts, first, last)
+
+
+_EVENTS = {
+    "one-time": _one_time_events,
+    "interval": _interval_events,
+    "monthly": _monthly_events,
+    "salary": _salary_events,
+    "qc-salary": _qc_salary_events,
+    "qc-multi-year-salary": _qc_multi_year_salary_events,
+}
+
+
+def _node_events(node, details, first, last):
+    """Payment days and (scenarios, days) amounts of a leaf between two dates."""
+    if "start" in node:
+        first = max(first, _to_date(node["start"]))
+    if "end" in node:
+        last = min(last, _to_date(node["end"]))
+    events = _EVENTS[node["details"]["type"]]
+
+    if "limit" in node and "start" in node:
+        # The cap counts every payment since the limit's start date.
+        days, amounts = events(details, _to_date(node["start"]), last)
+        amounts = _apply_cap(np.atleast_2d(amounts), abs(node["limit"]))
+        return _within(days, amounts, first, last)
+
+    days, amounts = events(details, first, last)
+    return days, np.atleast_2d(amounts)
+
+
+def _check_field(path, chain, keys):
+    node = chain[-1]
+    cf_type = node.get("details", {}).get("type")
+    if cf_type not in _EVENTS:
+        raise ValueError(f"'{path}': {cf_type} cashflows cannot be simulated.")
+    if keys[0] != "details" or any(k in _STRUCTURAL for k in keys):
+        raise ValueError(f"'{path}' is not a numeric parameter that can be sampled.")
+    if limited_ancestor(chain) is not None:
+        raise ValueError(f"'{path}' is inside a limited composite cashflow.")
+
+
+def _percentiles(values, q):
+    """np.percentile(values, q, axis=1) with linear interpolation.
+
+    A full sort is markedly faster than numpy's partition-based selection for
+    rows of many thousands of scenarios.
+    """
+    ordered = np.sort(values, axis=1)
+    position = np.asarray(q, dtype=float) / 100 * (values.shape[1] - 1)
+    lo = np.floor(position).astype(int)
+    hi = np.minimum(lo + 1, values.shape[1] - 1)
+    fraction = position - lo
+    return (ordered[:, lo] + fraction * (ordered[:, hi] - ordered[:, lo])).T
+
+
+def _accumulate(ufunc, rows):
+    """In-place ``ufunc.accumulate(rows, axis=0)``.
+
+    Applying the ufunc one contiguous row at a time is much faster than
+    numpy's strided accumulation down the first axis of a wide array.
+    """
+    for i in range(1, len(rows)):
+        ufunc(rows[i], rows[i - 1], out=rows[i])
+    return rows
+
+
+def _draw(rng, spec, size):
+    spec = dict(spec)
+    name = spec.pop("type", None)
+    sampler = getattr(rng, name, None) if isinstance(name, str) else None
+    if sampler is None or name.startswith("_"):
+        raise ValueError(f"{name} is not a supported distribution.")
+    return np.asarray(sampler(size=size, **spec), dtype=float)
+
+
+class Simulation:
+    """Summary of a Monte Carlo projection.
+
+    Attributes
+    ----------
+    dates : ndarray of datetime64[D]
+    percentiles : tuple of float
+    balance : ndarray
+        Balance percentiles, shaped (percentiles, days).
+    probability_negative : ndarray
+        Share of scenarios with a negative balance on each day.
+    min_forward : ndarray
+        Percentiles of the lowest balance from each day onwards.
+    lowest_balance : ndarray
+        Lowest balance over the horizon in each scenario.
+    """
+
+    def __init__(
+        self,
+        dates,
+        percentiles,
+        balance,
+        probability_negative,
+        min_forward,
+        lowest_balance,
+    ):
+        self.dates = dates
+        self.percentiles = percentiles
+        self.balance = balance
+        self.probability_negative = probability_negative
+        self.min_forward = min_forward
+        self.lowest_balance = lowest_balance
+
+    def to_frame(self):
+        columns = {}
+        for p, row in zip(self.percentiles, self.balance):
+            columns[f"balance_p{p:g}"] = row
+        columns["probability_negative"] = self.probability_negative
+        for p, row in zip(self.percentiles, self.min_forward):
+            columns[f"min_forward_p{p:g}"] = row
+        return pd.DataFrame(columns, index=pd.DatetimeIndex(self.dates, name="Date"))
+
+
+def simulate(
+    definitions,
+    distributions,
+    start_date,
+    duration,
+    starting_balance,
+    scenarios=1000,
+    seed=None,
+    percentiles=(5, 50, 95),
+):
+    """Project ``definitions`` under sampled parameters.
+
+    Parameters
+    ----------
+    definitions : list of dict
+        Top-level cashflow definitions, as loaded from a cashflow JSON file.
+    distributions : dict
+        Maps a parameter path to a distribution such as
+        ``{"type": "normal", "loc": 0.03, "scale": 0.01}``; ``type`` names a
+        ``numpy.random.Generator`` method and the other keys are its arguments.
+    scenarios : int
+        Number of scenarios to draw.
+    seed
+        Seed for ``numpy.random.default_rng``.
+    """
+    rng = np.random.default_rng(seed)
+    last_date = start_date + timedelta(days=duration - 1)
+
+    # Group the sampled fields by the leaf they belong to.
+    leaves = {}
+    for path, spec in distributions.items():
+        chain, keys = resolve(definitions, path)
+        _check_field(path, chain, keys)
+        leaf = leaves.setdefault(id(chain[-1]), (chain, []))
+        leaf[1].append((keys[1:], _draw(rng, spec, scenarios)))
+
+    first_day = _to_day(start_date)
+    deltas = []
+    for chain, fields in leaves.values():
+        first, last = day_range(chain, start_date, duration)
+        if first > last:
+            continue
+        node = chain[-1]
+        details = deepcopy(node["details"])
+        for keys, samples in fields:
+            set_value(details, keys, samples[:, None])
+        days, amounts = _node_events(node, details, first, last)
+        _, base = _node_events(node, node["details"], first, last)
+        # Stored as (days, scenarios) so each day's scenarios are contiguous.
+        delta = np.broadcast_to(amounts - base, (scenarios, len(days)))
+        deltas.append((days - first_day, np.ascontiguousarray(delta.T)))
+
+    cashflows = [Cashflow.from_dict(d) for d in definitions]
+    base_total = sum(_columns(cashflows, start_date, duration), np.zeros(duration))
+
+    block = max(1, _BLOCK_CELLS // scenarios)
+    starts = list(range(0, duration, block))
+
+    def balances(lo, opening):
+        """Balances of every scenario for the block of days starting at lo."""
+        hi = min(lo + block, duration)
+        total = np.repeat(base_total[lo:hi, None], scenarios, axis=1)
+        for offsets, amounts in deltas:
+            sel = slice(*np.searchsorted(offsets, [lo, hi]))
+            total[offsets[sel] - lo] += amounts[sel]
+        total[0] += opening
+        _accumulate(np.add, total)
+        return total
+
+    # Blocks are shaped (days, scenarios). The forward pass records balance
+    # percentiles and the opening balances of each block.
+    balance_pct = np.empty((len(percentiles), duration))
+    negative = np.empty(duration)
+    openings = []
+    opening = np.full(scenarios, float(starting_balance))
+    for lo in starts:
+        openings.append(opening)
+        balance = balances(lo, opening)
+        balance_pct[:, lo : lo + block] = _percentiles(balance, percentiles)
+        negative[lo : lo + block] = (balance < 0).mean(axis=1)
+        opening = balance[-1].copy()
+
+    # The backward pass carries the lowest balance still to come.
+    min_forward_pct = np.empty((len(percentiles), duration))
+    lowest = np.full(scenarios, np.inf)
+    for lo, opening in zip(reversed(starts), reversed(openings)):
+        balance = balances(lo, opening)
+        balance[-1] = np.minimum(balance[-1], lowest)
+        min_forward = _accumulate(np.minimum, balance[::-1])[::-1]
+        min_forward_pct[:, lo : lo + block] = _percentiles(min_forward, percentiles)
+        lowest = min_forward[0].copy()
+
+    dates = np.arange(
+        np.datetime64(start_date, "D"),
+        np.datetime64(last_date, "D") + np.timedelta64(1, "D"),
+        dtype="datetime64[D]",
+    )
+    return Simulation(
+        dates, tuple(percentiles), balance_pct, negative, min_forward_pct, lowest
+    )
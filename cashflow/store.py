@@ -0,0 +1,513 @@
+"""
+SQLite storage of named projections.
+
+ProjectionStore keeps projections in the ``projections`` and
+``projection_data`` tables used by store_projection. The daily rows are indexed
+on (name, Date), so a projection or a range of its dates is read through the
+index, and each projection is written with executemany in a single
+transaction. Saving over ``"working"`` replaces its rows atomically. The store
+works on a connection it leaves open, so one connection can serve any number
+of saves and reads.
+
+Named projections other than ``"working"`` are kept as snapshots. Consecutive
+snapshots usually differ on only a few days, so a snapshot is stored as the
+rows that differ from a base snapshot, which is stored in full, and its labels
+as ids into a shared ``labels`` table. A snapshot that differs from the base
+on more than half its days becomes a base itself. retain() deletes snapshots
+outside a retention policy and compact() re-encodes every snapshot against the
+latest base and drops unused labels.
+"""
+
+import argparse
+import sqlite3
+from datetime import datetime
+from itertools import repeat
+
+import pandas as pd
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projections (timestamp TEXT, name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS projection_data (
+    Date DATE,
+    name TEXT,
+    total REAL,
+    balance REAL,
+    min_forward REAL,
+    labels TEXT
+);
+CREATE INDEX IF NOT EXISTS projection_data_name_date
+    ON projection_data (name, Date);
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    base TEXT,
+    first DATE,
+    last DATE
+);
+CREATE INDEX IF NOT EXISTS snapshots_base ON snapshots (base);
+CREATE TABLE IF NOT EXISTS snapshot_data (
+    name TEXT,
+    Date DATE,
+    total REAL,
+    balance REAL,
+    min_forward REAL,
+    label INTEGER,
+    PRIMARY KEY (name, Date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS labels (id INTEGER PRIMARY KEY, text TEXT UNIQUE);
+CREATE TEMP TABLE IF NOT EXISTS snapshot_rows (
+    Date DATE PRIMARY KEY,
+    total REAL,
+    balance REAL,
+    min_forward REAL,
+    label INTEGER
+);
+"""
+
+# Rows of the snapshot named by :{name} dated :start to :end, from its own
+# rows and those of its base it does not override.
+_SNAPSHOT_ROWS = """
+SELECT d.Date, d.total, d.balance, d.min_forward, d.label
+FROM snapshot_data d
+WHERE d.name = :{name} AND d.Date BETWEEN :start AND :end
+UNION ALL
+SELECT b.Date, b.total, b.balance, b.min_forward, b.label
+FROM snapshots s
+JOIN snapshot_data b ON b.name = s.base
+    AND b.Date BETWEEN MAX(s.first, :start) AND MIN(s.last, :end)
+WHERE s.name = :{name} AND NOT EXISTS (
+    SELECT 1 FROM snapshot_data d WHERE d.name = :{name} AND d.Date = b.Date
+)
+"""
+
+# Every day of projections a and b side by side. The rows of both are grouped
+# by date rather than joined, as the projections are subqueries without an
+# index to join through.
+_DAYS = """
+WITH sides AS (
+    SELECT Date,
+        MAX(CASE WHEN side = 0 THEN total END) AS total_a,
+        MAX(CASE WHEN side = 1 THEN total END) AS total_b,
+        MAX(CASE WHEN side = 0 THEN balance END) AS balance_a,
+        MAX(CASE WHEN side = 1 THEN balance END) AS balance_b,
+        MAX(CASE WHEN side = 0 THEN min_forward END) AS min_forward_a,
+        MAX(CASE WHEN side = 1 THEN min_forward END) AS min_forward_b
+    FROM (
+        SELECT 0 AS side, Date, total, balance, min_forward FROM ({a})
+        UNION ALL
+        SELECT 1 AS side, Date, total, balance, min_forward FROM ({b})
+    )
+    GROUP BY Date
+), days AS (
+    SELECT *,
+        total_a IS NOT total_b OR balance_a IS NOT balance_b
+            OR min_forward_a IS NOT min_forward_b AS differs
+    FROM sides
+)
+"""
+
+_DAILY_DIFF = """
+SELECT Date,
+    total_a, total_b, total_b - total_a AS total_diff,
+    balance_a, balance_b, balance_b - balance_a AS balance_diff,
+    min_forward_a, min_forward_b, min_forward_b - min_forward_a AS min_forward_diff
+FROM days WHERE differs ORDER BY Date
+"""
+
+# Per month: the summed total, the balance on the last day and the lowest
+# min_forward of each projection, for the months with any differing day.
+_MONTHLY_DIFF = """
+, months AS (
+    SELECT *, substr(Date, 1, 7) AS month,
+        ROW_NUMBER() OVER (PARTITION BY substr(Date, 1, 7) ORDER BY Date DESC)
+            AS from_end
+    FROM days
+), rollup AS (
+    SELECT month, SUM(differs) AS days,
+        SUM(total_a) AS total_a, SUM(total_b) AS total_b,
+        MAX(CASE WHEN from_end = 1 THEN balance_a END) AS balance_a,
+        MAX(CASE WHEN from_end = 1 THEN balance_b END) AS balance_b,
+        MIN(min_forward_a) AS min_forward_a, MIN(min_forward_b) AS min_forward_b
+    FROM months GROUP BY month
+)
+SELECT month, days,
+    total_a, total_b, total_b - total_a AS total_diff,
+    balance_a, balance_b, balance_b - balance_a AS balance_diff,
+    min_forward_a, min_forward_b, min_forward_b - min_forward_a AS min_forward_diff
+FROM rollup WHERE days > 0 ORDER BY month
+"""
+
+# Rows of snapshot_rows that differ from snapshot :base.
+_DELTA_ROWS = """
+SELECT r.Date, r.total, r.balance, r.min_forward, r.label
+FROM snapshot_rows r
+LEFT JOIN snapshot_data b ON b.name = :base AND b.Date = r.Date
+WHERE b.Date IS NULL OR b.total IS NOT r.total OR b.balance IS NOT r.balance
+    OR b.min_forward IS NOT r.min_forward OR b.label IS NOT r.label
+"""
+
+_COLUMNS = ["total", "balance", "min_forward", "labels"]
+
+
+def _window(name, start=None, end=None):
+    """Parameters of _SNAPSHOT_ROWS."""
+    return {
+        "name": name,
+        "start": "" if start is None else start.isoformat(),
+        "end": "9999-12-31" if end is None else end.isoformat(),
+    }
+
+
+def _dates(chunk):
+    return pd.to_datetime(chunk.index).strftime("%Y-%m-%d")
+
+
+def _rows(chunk, name):
+    return zip(_dates(chunk), repeat(name), *(chunk[c].tolist() for c in _COLUMNS))
+
+
+class ProjectionStore:
+    """Named projections in a SQLite database.
+
+    Parameters
+    ----------
+    db : str, Path or sqlite3.Connection
+        Database file to open, or an open connection to use. A connection
+        passed in is not closed by the store.
+    """
+
+    def __init__(self, db):
+        if isinstance(db, sqlite3.Connection):
+            self._conn = db
+            self._owned = False
+        else:
+            self._conn = sqlite3.connect(str(db), timeout=30)
+            self._owned = True
+        if self._conn.in_transaction:
+            # executescript() would commit the caller's transaction, and
+            # leaving _transaction() would too.
+            self._create_schema()
+        else:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._transaction():
+                self._create_schema()
+
+    def _create_schema(self):
+        for statement in _SCHEMA.split(";"):
+            if statement.strip():
+                self._conn.execute(statement)
+
+    @property
+    def conn(self):
+        return self._conn
+
+    def close(self):
+        """Close the connection if the store opened it."""
+        if self._owned:
+            self._conn.close()
+
+    def names(self):
+        """Names of the stored projections, oldest first."""
+        rows = self._conn.execute("SELECT name FROM projections ORDER BY timestamp")
+        return [name for (name,) in rows]
+
+    def save(self, projection, name="working"):
+        """Store a sum_cashflows frame, or an iterable of iter_projection
+        frames, under ``name``.
+
+        Every name but ``"working"`` can only be saved once, as a snapshot;
+        ``"working"`` is replaced, rows and all, in the same transaction as
+        the new rows.
+        """
+        chunks = [projection] if isinstance(projection, pd.DataFrame) else projection
+        with self._transaction():
+            if name == "working":
+                self._delete(name)
+            elif self._exists(name):
+                raise ValueError(
+                    f"The project {name} already exists. Please choose a different name."
+                )
+            self._conn.execute(
+                "INSERT INTO projections VALUES (?, ?)",
+                (datetime.now().isoformat(), name),
+            )
+            if name == "working":
+                for chunk in chunks:
+                    self._conn.executemany(
+                        "INSERT INTO projection_data VALUES (?, ?, ?, ?, ?, ?)",
+                        _rows(chunk, name),
+                    )
+                return
+
+            self._conn.execute("DELETE FROM snapshot_rows")
+            labels = {}
+            for chunk in chunks:
+                self._conn.executemany(
+                    "INSERT INTO snapshot_rows VALUES (?, ?, ?, ?, ?)",
+                    zip(
+                        _dates(chunk),
+                        *(chunk[c].tolist() for c in _COLUMNS[:-1]),
+                        self._label_ids(chunk["labels"], labels),
+                    ),
+                )
+            self._conn.execute("INSERT INTO snapshots (name) VALUES (?)", (name,))
+            self._encode(name, self._latest_base())
+
+    def get(self, name="working", start=None, end=None):
+        """The stored rows of ``name``, optionally only those dated from
+        ``start`` to ``end`` inclusive, indexed by Date.
+
+        total, balance and min_forward are stored as REAL, so they are read
+        back as floats even when the saved frame held int64 columns.
+        """
+        if self._is_snapshot(name):
+            query = (
+                "SELECT r.Date, :name AS name, r.total, r.balance, r.min_forward,"
+                f" l.text AS labels FROM ({_SNAPSHOT_ROWS.format(name='name')}) r"
+                " LEFT JOIN labels l ON l.id = r.label ORDER BY r.Date"
+            )
+        else:
+            query = (
+                "SELECT * FROM projection_data WHERE name = :name"
+                " AND Date BETWEEN :start AND :end ORDER BY Date"
+            )
+        return pd.read_sql(
+            query,
+            con=self._conn,
+            index_col="Date",
+            params=_window(name, start, end),
+        )
+
+    def diff(self, a, b, start=None, end=None, monthly=False):
+        """Days on which projections ``a`` and ``b`` differ.
+
+        The comparison runs in SQLite, so only the differing rows are read.
+        Days that only one projection covers count as differing.
+
+        Parameters
+        ----------
+        a, b : str
+            Names of the stored projections to compare.
+        start, end : date, optional
+            Only compare the days from ``start`` to ``end`` inclusive.
+        monthly : bool
+            Roll the days up by month instead: the summed total, the balance
+            on the last day and the lowest min_forward of each month, for the
+            months with any differing day, and the number of those days.
+
+        Returns
+        -------
+        DataFrame
+            ``total``, ``balance`` and ``min_forward`` of each projection
+            with the suffixes ``_a`` and ``_b``, and ``_diff`` for b - a,
+            indexed by Date, or by month as ``YYYY-MM``.
+        """
+        for name in (a, b):
+            if not self._exists(name):
+                raise ValueError(f"There is no projection named {name}")
+        days = _DAYS.format(a=self._source(a, "name"), b=self._source(b, "other"))
+        return pd.read_sql(
+            days + (_MONTHLY_DIFF if monthly else _DAILY_DIFF),
+            con=self._conn,
+            index_col="month" if monthly else "Date",
+            params={**_window(a, start, end), "other": b},
+        )
+
+    def _source(self, name, param):
+        """SELECT of the days of ``name`` dated :start to :end, with the name
+        bound to ``:param``."""
+        if self._is_snapshot(name):
+            return _SNAPSHOT_ROWS.format(name=param)
+        return (
+            "SELECT Date, total, balance, min_forward FROM projection_data"
+            f" WHERE name = :{param} AND Date BETWEEN :start AND :end"
+        )
+
+    def delete(self, name):
+        with self._transaction():
+            self._delete(name)
+
+    def retain(self, keep_last=None, keep_monthly=False):
+        """Delete the snapshots outside a retention policy.
+
+        Parameters
+        ----------
+        keep_last : int, optional
+            Keep the ``keep_last`` most recent snapshots.
+        keep_monthly : bool
+            Keep the most recent snapshot of every calendar month.
+
+        At least one of the two must be given, so a bare call can't delete
+        every snapshot.
+
+        Returns
+        -------
+        list of str
+            Names of the deleted snapshots, oldest first.
+        """
+        if keep_last is None and not keep_monthly:
+            raise ValueError("retain needs keep_last or keep_monthly")
+        if keep_last is not None and keep_last < 0:
+            raise ValueError("keep_last can't be negative")
+        with self._transaction():
+            rows = self._conn.execute(
+                "SELECT name, timestamp FROM projections"
+                " WHERE name != 'working' ORDER BY timestamp"
+            ).fetchall()
+            keep = set()
+            if keep_last:
+                keep.update(name for name, _ in rows[-keep_last:])
+            if keep_monthly:
+                latest = {timestamp[:7]: name for name, timestamp in rows}
+                keep.update(latest.values())
+            deleted = [name for name, _ in rows if name not in keep]
+            for name in deleted:
+                self._delete(name)
+        return deleted
+
+    def compact(self):
+        """Re-encode snapshots against the latest base where that stores fewer
+        rows, turning bases nothing depends on into deltas, and drop labels no
+        snapshot uses."""
+        with self._transaction():
+            target = self._latest_base()
+            rows = self._conn.execute(
+                "SELECT s.name, s.base FROM snapshots s"
+                " JOIN projections p ON p.name = s.name ORDER BY p.timestamp"
+            ).fetchall()
+            for name, base in rows:
+                if base is not None and base != target:
+                    self._reencode(name, target, smaller=True)
+            for name, base in rows:
+                if base is None and name != target and not self._dependents(name):
+                    self._reencode(name, target, smaller=True)
+            self._conn.execute(
+                "DELETE FROM labels WHERE id NOT IN"
+                " (SELECT label FROM snapshot_data WHERE label IS NOT NULL)"
+            )
+        self._conn.execute("VACUUM")
+
+    def _transaction(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def _exists(self, name):
+        row = self._conn.execute(
+            "SELECT 1 FROM projections WHERE name = ? LIMIT 1", (name,)
+        ).fetchone()
+        return row is not None
+
+    def _is_snapshot(self, name):
+        row = self._conn.execute(
+            "SELECT 1 FROM snapshots WHERE name = ? LIMIT 1", (name,)
+        ).fetchone()
+        return row is not None
+
+    def _latest_base(self):
+        row = self._conn.execute(
+            "SELECT s.name FROM snapshots s JOIN projections p ON p.name = s.name"
+            " WHERE s.base IS NULL AND s.first IS NOT NULL"
+            " ORDER BY p.timestamp DESC LIMIT 1"
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _label_ids(self, texts, ids):
+        """Ids in the labels table of ``texts``, adding any that are new.
+        ``ids`` caches the ids already looked up."""
+        for text in set(texts).difference(ids):
+            self._conn.execute(
+                "INSERT OR IGNORE INTO labels (text) VALUES (?)", (text,)
+            )
+            ids[text] = self._conn.execute(
+                "SELECT id FROM labels WHERE text = ?", (text,)
+            ).fetchone()[0]
+        return [ids[text] for text in texts]
+
+    def _delta_count(self, base):
+        """Rows of snapshot_rows that differ from snapshot ``base``."""
+        return self._conn.execute(
+            f"SELECT COUNT(*) FROM ({_DELTA_ROWS})", {"base": base}
+        ).fetchone()[0]
+
+    def _encode(self, name, base):
+        """Store the rows in snapshot_rows as snapshot ``name``, relative to
+        ``base`` if that saves more than half of them."""
+        params = {"name": name, "base": base}
+        n, first, last = self._conn.execute(
+            "SELECT COUNT(*), MIN(Date), MAX(Date) FROM snapshot_rows"
+        ).fetchone()
+        if base is not None and 2 * self._delta_count(base) > n:
+            params["base"] = None
+        self._conn.execute(
+            f"INSERT INTO snapshot_data SELECT :name, * FROM ({_DELTA_ROWS})",
+            params,
+        )
+        self._conn.execute(
+            "UPDATE snapshots SET base = :base, first = :first, last = :last"
+            " WHERE name = :name",
+            {**params, "first": first, "last": last},
+        )
+        self._conn.execute("DELETE FROM snapshot_rows")
+
+    def _reencode(self, name, base, smaller=False):
+        """Store snapshot ``name`` again relative to ``base``; with
+        ``smaller``, only if that stores fewer rows than it does now."""
+        self._conn.execute(
+            f"INSERT INTO snapshot_rows {_SNAPSHOT_ROWS.format(name='name')}",
+            _window(name),
+        )
+        if smaller:
+            stored = self._conn.execute(
+                "SELECT COUNT(*) FROM snapshot_data WHERE name = ?", (name,)
+            ).fetchone()[0]
+            if self._delta_count(base) >= stored:
+                self._conn.execute("DELETE FROM snapshot_rows")
+                return
+        self._conn.execute("DELETE FROM snapshot_data WHERE name = ?", (name,))
+        self._encode(name, None if base == name else base)
+
+    def _dependents(self, name):
+        """Snapshots stored relative to ``name``, oldest first."""
+        rows = self._conn.execute(
+            "SELECT s.name FROM snapshots s JOIN projections p ON p.name = s.name"
+            " WHERE s.base = ? ORDER BY p.timestamp",
+            (name,),
+        )
+        return [dependent for (dependent,) in rows]
+
+    def _delete(self, name):
+        dependents = self._dependents(name)
+        # The first snapshot built on this one becomes the base of the rest.
+        for dependent in dependents:
+            self._reencode(dependent, dependents[0])
+        self._conn.execute("DELETE FROM snapshot_data WHERE name = ?", (name,))
+        self._conn.execute("DELETE FROM snapshots WHERE name = ?", (name,))
+        self._conn.execute("DELETE FROM projection_data WHERE name = ?", (name,))
+        self._conn.execute("DELETE FROM projections WHERE name = ?", (name,))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Apply a retention policy to a projection database and compact it."
+    )
+    parser.add_argument("db", help="SQLite file holding the projections")
+    parser.add_argument(
+        "--keep-last", type=int, help="keep this many of the latest snapshots"
+    )
+    parser.add_argument(
+        "--keep-monthly",
+        action="store_true",
+        help="keep the latest snapshot of every month",
+    )
+    args = parser.parse_args(argv)
+
+    store = ProjectionStore(args.db)
+    if args.keep_last is not None or args.keep_monthly:
+        for name in store.retain(args.keep_last, args.keep_monthly):
+            print(f"deleted {name}")
+    store.compact()
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
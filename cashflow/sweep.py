@@ -0,0 +1,116 @@
+"""
+What-if sweeps over variants of one set of cashflow definitions.
+
+Each variant is a set of overrides addressed by path as in cashflow.paths. The
+base definitions are projected once; a variant then only re-evaluates the
+subtrees its overrides touch and adds the difference to the base total. An
+override touches the cashflow that holds the field, or the outermost limited
+cashflow above it, since a cap depends on everything beneath it.
+"""
+
+from collections.abc import Mapping
+from copy import deepcopy
+from datetime import timedelta
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from cashflow import Cashflow, _column, _columns, _min_forward
+from cashflow.paths import day_range, limited_ancestor, resolve, set_value
+
+
+def _expand(variants):
+    """A mapping of path -> candidate values becomes its cartesian product."""
+    if isinstance(variants, Mapping):
+        paths = list(variants)
+        return [dict(zip(paths, values)) for values in product(*variants.values())]
+    return [dict(v) for v in variants]
+
+
+def _touched(definitions, overrides):
+    """Group a variant's overrides by the subtree they touch.
+
+    Returns a dict keyed by the ids of the chain down to each touched subtree,
+    holding that chain and the ``(node, keys, value)`` overrides inside it.
+    """
+    units = {}
+    for path, value in overrides.items():
+        chain, keys = resolve(definitions, path)
+        limited = limited_ancestor(chain)
+        unit = chain if limited is None else chain[: limited + 1]
+        key = tuple(id(node) for node in unit)
+        units.setdefault(key, (unit, []))[1].append((chain[-1], keys, value))
+
+    # An override inside a subtree that is already re-evaluated joins it.
+    merged = {}
+    for key in sorted(units, key=len):
+        outer = next((k for k in merged if key[: len(k)] == k), None)
+        if outer is None:
+            merged[key] = units[key]
+        else:
+            merged[outer][1].extend(units[key][1])
+    return merged
+
+
+def _unit_column(node, chain, start_date, duration):
+    """Daily amounts of ``node`` within the windows of its ancestors in chain."""
+    column = np.zeros(duration)
+    first, last = day_range(chain, start_date, duration)
+    if first <= last:
+        offset = (first - start_date).days
+        n = (last - first).days + 1
+        column[offset : offset + n] = _column(Cashflow.from_dict(node), first, n)
+    return column
+
+
+def sweep(definitions, variants, start_date, duration, starting_balance, workers=None):
+    """Project every variant of ``definitions``.
+
+    Parameters
+    ----------
+    definitions : list of dict
+        Top-level cashflow definitions, as loaded from a cashflow JSON file.
+    variants : list of dict, or dict
+        Each variant maps paths such as ``Pay/Arup Pay 2023/details/amount``
+        to the value to use instead. A single dict of path -> list of values
+        is expanded into every combination.
+
+    Returns
+    -------
+    DataFrame
+        ``total``, ``balance`` and ``min_forward`` indexed by (variant, Date).
+        The overrides of each variant are kept in ``attrs["variants"]``.
+    """
+    variants = _expand(variants)
+    cashflows = [Cashflow.from_dict(d) for d in definitions]
+    base_total = sum(
+        _columns(cashflows, start_date, duration, workers), np.zeros(duration)
+    )
+
+    base_columns = {}
+    totals = np.repeat(base_total[None, :], len(variants), axis=0)
+    for row, overrides in zip(totals, variants):
+        for key, (chain, changes) in _touched(definitions, overrides).items():
+            if key not in base_columns:
+                base_columns[key] = _unit_column(chain[-1], chain, start_date, duration)
+            memo = {}
+            node = deepcopy(chain[-1], memo)
+            for target, keys, value in changes:
+                set_value(memo[id(target)], keys, value)
+            row += _unit_column(node, chain, start_date, duration) - base_columns[key]
+
+    balance = np.cumsum(totals, axis=1) + starting_balance
+    dates = [start_date + timedelta(days=x) for x in range(duration)]
+    df = pd.DataFrame(
+        {
+            "total": totals.ravel(),
+            "balance": balance.ravel(),
+            "min_forward": _min_forward(balance).ravel(),
+        },
+        index=pd.MultiIndex.from_product(
+            [range(len(variants)), dates], names=["variant", "Date"]
+        ),
+    )
+    df.attrs["variants"] = variants
+    return df
@@ -1,26 +1,140 @@
 """
 Cashflow Web Editor — FastAPI server.
 
-Manages cashflow JSON files in a directory and serves the editor UI.
+Manages cashflow JSON files in a directory, projects them and serves the
+editor UI.
 
 Usage:
     uv run python -m cashflow.ui.server [--dir PATH] [--port PORT]
 """
 
 import argparse
+import asyncio
+import functools
+import hashlib
 import json
+import multiprocessing
 import os
-from datetime import datetime, timezone
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import UTC, date, datetime
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
 import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, Response
+
+from cashflow import Projection, load_cashflows
+
+# Upper bound on the encoded projections kept by each app.
+PROJECTION_CACHE_BYTES = 32 * 1024 * 1024
+
+# Longest projection the API computes, in days.
+MAX_PROJECTION_DAYS = 100 * 366
+
+# Workers for each kind of blocking operation, and so how many of that kind
+# can run at once. Small writes parse and format JSON while holding the GIL,
+# so more threads would not write any faster and would only take turns away
+# from the event loop.
+IO_LIMITS = {"list": 2, "stat": 8, "read": 4, "write": 1, "save": 2, "project": 2}
+
+# Kinds of operation run in worker processes rather than threads. Saving a
+# large file spends its time parsing and formatting JSON, which would hold
+# the GIL the event loop needs.
+PROCESS_KINDS = frozenset({"save"})
+
+# PUT bodies larger than this are saved by a worker process.
+LARGE_BODY_BYTES = 64 * 1024
+
+
+class FileIO:
+    """Runs blocking file operations off the event loop.
+
+    Each kind of operation has its own pool, sized by ``limits``, so a large
+    write or a slow projection only ever queues behind operations of the same
+    kind and never holds up the event loop. Kinds in ``processes`` get a pool
+    of spawned processes instead of threads; their functions and arguments
+    must be picklable.
+    """
+
+    def __init__(self, limits=IO_LIMITS, processes=PROCESS_KINDS):
+        self.limits = dict(limits)
+        self.processes = frozenset(processes)
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, kind):
+        with self._lock:
+            pool = self._pools.get(kind)
+            if pool is None:
+                if kind in self.processes:
+                    pool = ProcessPoolExecutor(
+                        self.limits[kind],
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    pool = ThreadPoolExecutor(
+                        self.limits[kind], thread_name_prefix=f"cashflow-{kind}"
+                    )
+                self._pools[kind] = pool
+            return pool
+
+    async def run(self, kind, function, *args):
+        """Call ``function(*args)`` in the pool for ``kind`` and return its
+        result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool(kind), functools.partial(function, *args)
+        )
+
+    def close(self):
+        """Shut the pools down once their queued operations finish."""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+
+class ProjectionCache:
+    """Encoded projections keyed by ETag, evicting the least recently used
+    beyond ``max_bytes``."""
+
+    def __init__(self, max_bytes=PROJECTION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
 
 # ---------------------------------------------------------------------------
 # App factory
 # ---------------------------------------------------------------------------
 
+
 def create_app(data_dir: str | None = None) -> FastAPI:
     """Create the FastAPI application.
 
@@ -37,27 +151,24 @@ def create_app(data_dir: str | None = None) -> FastAPI:
     if not data_path.is_dir():
         raise FileNotFoundError(f"Data directory does not exist: {data_path}")
 
-    app = FastAPI(title="Cashflow Editor")
+    files = FileIO()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        files.close()
+
+    app = FastAPI(title="Cashflow Editor", lifespan=lifespan)
     app.state.data_dir = data_path
+    app.state.projection_cache = ProjectionCache()
+    app.state.files = files
 
     # --- API routes --------------------------------------------------------
 
     @app.get("/api/files")
     async def list_files():
         """List all *.json files in the data directory."""
-        files = []
-        for p in sorted(data_path.glob("*.json")):
-            stat = p.stat()
-            files.append(
-                {
-                    "name": p.name,
-                    "size": stat.st_size,
-                    "modified": datetime.fromtimestamp(
-                        stat.st_mtime, tz=timezone.utc
-                    ).isoformat(),
-                }
-            )
-        return files
+        return await files.run("list", _list_files, data_path)
 
     @app.post("/api/files", status_code=201)
     async def create_file(request: Request):
@@ -74,20 +185,16 @@ def create_app(data_dir: str | None = None) -> FastAPI:
             raise HTTPException(status_code=400, detail="Invalid file name.")
 
         filepath = data_path / name
-        if filepath.exists():
-            raise HTTPException(
-                status_code=409, detail=f"File '{name}' already exists."
-            )
-
-        filepath.write_text(json.dumps([], indent=2) + "\n")
+        empty = json.dumps([], indent=2) + "\n"
+        await files.run("write", _create_file, filepath, empty)
         return {"name": name, "message": f"Created {name}"}
 
     @app.get("/api/files/{name}")
     async def read_file(name: str):
         """Read the contents of a cashflow JSON file."""
-        filepath = _safe_path(data_path, name)
+        filepath = await files.run("stat", _safe_path, data_path, name)
         try:
-            content = json.loads(filepath.read_text())
+            content = await files.run("read", _read_json, filepath)
         except json.JSONDecodeError as e:
             raise HTTPException(
                 status_code=422, detail=f"Invalid JSON in {name}: {e}"
@@ -97,16 +204,19 @@ def create_app(data_dir: str | None = None) -> FastAPI:
     @app.put("/api/files/{name}")
     async def update_file(name: str, request: Request):
         """Overwrite a cashflow JSON file."""
-        filepath = _safe_path(data_path, name)
-        body = await request.json()
-        filepath.write_text(json.dumps(body, indent=1) + "\n")
+        filepath = await files.run("stat", _safe_path, data_path, name)
+        body = await request.body()
+        kind = "save" if len(body) > LARGE_BODY_BYTES else "write"
+        error = await files.run(kind, _save_json, filepath, body)
+        if error is not None:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {error}")
         return {"message": f"Saved {name}"}
 
     @app.delete("/api/files/{name}")
     async def delete_file(name: str):
         """Delete a cashflow JSON file."""
-        filepath = _safe_path(data_path, name)
-        filepath.unlink()
+        filepath = await files.run("stat", _safe_path, data_path, name)
+        await files.run("write", _delete_file, filepath)
         return {"message": f"Deleted {name}"}
 
     @app.post("/api/files/{name}/duplicate", status_code=201)
@@ -114,8 +224,8 @@ def create_app(data_dir: str | None = None) -> FastAPI:
         """Duplicate a file, prepending today's date (replacing existing date prefix)."""
         import re
 
-        filepath = _safe_path(data_path, name)
-        content = filepath.read_text()
+        filepath = await files.run("stat", _safe_path, data_path, name)
+        content = await files.run("read", filepath.read_text)
 
         stem = filepath.stem  # e.g. "2026-04-29-cashflows"
         ext = filepath.suffix  # e.g. ".json"
@@ -127,14 +237,41 @@ def create_app(data_dir: str | None = None) -> FastAPI:
         new_name = f"{today}-{stripped}{ext}"
         new_path = data_path / new_name
 
-        if new_path.exists():
-            raise HTTPException(
-                status_code=409, detail=f"File '{new_name}' already exists."
-            )
-
-        new_path.write_text(content)
+        await files.run("write", _create_file, new_path, content)
         return {"name": new_name, "message": f"Duplicated to {new_name}"}
 
+    @app.get("/api/files/{name}/projection")
+    async def projection(
+        name: str,
+        request: Request,
+        start: date | None = None,
+        days: int = Query(365, gt=0, le=MAX_PROJECTION_DAYS),
+        balance: float = 0,
+    ):
+        """Project a cashflow file from ``start`` (default today) for ``days``
+        days with a starting ``balance``.
+
+        The response carries an ETag derived from the file's contents and the
+        parameters; a request whose If-None-Match matches it gets a 304.
+        """
+        filepath = await files.run("stat", _safe_path, data_path, name)
+        content = await files.run("read", filepath.read_bytes)
+        if start is None:
+            start = date.today()
+        etag = _projection_etag(content, start, days, balance)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        cache = app.state.projection_cache
+        body = cache.get(etag)
+        if body is None:
+            body = await files.run(
+                "project", _project, name, filepath, content, start, days, balance
+            )
+            cache.put(etag, body)
+        return Response(body, media_type="application/json", headers=headers)
+
     # --- Static frontend ---------------------------------------------------
 
     _html_path = Path(__file__).resolve().parent / "pages" / "index.html"
@@ -142,11 +279,140 @@ def create_app(data_dir: str | None = None) -> FastAPI:
     @app.get("/", response_class=HTMLResponse)
     async def index():
         """Serve the single-page editor UI."""
-        return HTMLResponse(_html_path.read_text())
+        return HTMLResponse(await files.run("read", _html_path.read_text))
 
     return app
 
 
+# ---------------------------------------------------------------------------
+# Blocking operations, run through FileIO
+# ---------------------------------------------------------------------------
+
+
+def _list_files(data_dir: Path) -> list[dict]:
+    files = []
+    for p in sorted(data_dir.glob("*.json")):
+        try:
+            stat = p.stat()
+        except FileNotFoundError:
+            # Deleted since the glob.
+            continue
+        files.append(
+            {
+                "name": p.name,
+                "size": stat.st_size,
+                "modified": datetime.fromtimestamp(stat.st_mtime, tz=UTC).isoformat(),
+            }
+        )
+    return files
+
+
+def _read_json(filepath: Path):
+    return json.loads(filepath.read_bytes())
+
+
+def _write_text(filepath: Path, text: str) -> None:
+    """Replace the file at ``filepath`` in one step, so a concurrent reader
+    sees either the old contents or the new."""
+    temp = filepath.with_name(
+        f".{filepath.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        temp.write_text(text)
+        os.replace(temp, filepath)
+    finally:
+        temp.unlink(missing_ok=True)
+
+
+def _create_file(filepath: Path, text: str) -> None:
+    if filepath.exists():
+        raise HTTPException(
+            status_code=409, detail=f"File '{filepath.name}' already exists."
+        )
+    _write_text(filepath, text)
+
+
+def _save_json(filepath: Path, body: bytes) -> str | None:
+    """Write the JSON document ``body`` to ``filepath`` in the editor's
+    indented layout, or return why it is not valid JSON.
+
+    This runs in worker processes too, so it reports errors rather than
+    raising an HTTPException.
+    """
+    try:
+        content = json.loads(body)
+    except json.JSONDecodeError as e:
+        return str(e)
+    _write_text(filepath, json.dumps(content, indent=1) + "\n")
+    return None
+
+
+def _delete_file(filepath: Path) -> None:
+    try:
+        filepath.unlink()
+    except FileNotFoundError:
+        # Deleted since _safe_path found it.
+        raise HTTPException(
+            status_code=404, detail=f"File '{filepath.name}' not found."
+        )
+
+
+def _project(
+    name: str,
+    filepath: Path,
+    content: bytes,
+    start: date,
+    days: int,
+    balance: float,
+) -> bytes:
+    """Encoded projection of the cashflow file ``name`` holding ``content``.
+
+    The cashflows come from load_cashflows, so projecting one file again with
+    other parameters reuses its tree and the schedules it has already built.
+    Schedules are built lazily, so some invalid definitions, such as a
+    non-numeric limit, only fail once they are evaluated.
+    """
+    try:
+        cashflows = load_cashflows(filepath, content)
+        projection = Projection.from_cashflows(list(cashflows), start, days, balance)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON in {name}: {e}")
+    except (ValueError, KeyError, TypeError, AttributeError, ArithmeticError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid cashflow in {name}: {e}")
+    return _encode_projection(projection)
+
+
+def _projection_etag(content: bytes, start: date, days: int, balance: float) -> str:
+    digest = hashlib.sha256(content)
+    digest.update(f"\0{start.isoformat()}\0{days}\0{balance!r}".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag``."""
+    if header is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _encode_projection(projection: Projection) -> bytes:
+    """A projection as JSON, one list per daily series."""
+    return json.dumps(
+        {
+            "dates": projection.dates.astype(str).tolist(),
+            "columns": dict(
+                zip(projection.names, (c.tolist() for c in projection.columns))
+            ),
+            "labels": projection.labels(),
+            "total": projection.total.tolist(),
+            "balance": projection.balance.tolist(),
+            "min_forward": projection.min_forward.tolist(),
+        },
+        separators=(",", ":"),
+    ).encode()
+
+
 def _safe_path(data_dir: Path, name: str) -> Path:
     """Resolve a filename within data_dir, guarding against traversal."""
     if "/" in name or "\\" in name or ".." in name:
@@ -163,6 +429,7 @@ def _safe_path(data_dir: Path, name: str) -> Path:
 # CLI entry point
 # ---------------------------------------------------------------------------
 
+
 def main():
     parser = argparse.ArgumentParser(description="Cashflow Web Editor")
     parser.add_argument(
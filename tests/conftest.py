@@ -0,0 +1,26 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from cashflow import Cashflow
+
+CASHFLOWS_JSON = Path(__file__).resolve().parents[1] / "cashflows.json"
+
+
+@pytest.fixture
+def cashflows_json():
+    """Path of the example cashflows.json at the root of the repo."""
+    return CASHFLOWS_JSON
+
+
+@pytest.fixture
+def definitions(cashflows_json):
+    """A fresh copy of the definitions in cashflows.json."""
+    return json.loads(cashflows_json.read_text())
+
+
+@pytest.fixture
+def cashflows(definitions):
+    """The cashflows defined in cashflows.json."""
+    return [Cashflow.from_dict(d) for d in definitions]
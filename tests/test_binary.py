@@ -0,0 +1,137 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from cashflow import Cashflow, load_cashflows, sum_cashflows
+from cashflow.binary import (
+    VERSION,
+    open_projection,
+    read_container,
+    read_definitions,
+    read_projection,
+    write_container,
+    write_definitions,
+    write_projection,
+)
+from cashflow.loader import clear_cache
+
+
+def test_definitions_round_trip(tmp_path, definitions):
+    path = tmp_path / "cashflows.cfb"
+    write_definitions(path, definitions)
+    assert read_definitions(path) == definitions
+    kind, _, arrays = read_container(path)
+    assert kind == "definitions"
+    assert isinstance(arrays["node_kind"], np.memmap)
+
+
+def test_unusual_definitions_round_trip(tmp_path):
+    definitions = [
+        {"details": {"type": "one-time", "date": "2023-01-01", "amount": 5}},
+        {
+            "name": "Loose date",
+            "start": "2023-1-5",
+            "details": {"type": "one-time", "date": "2023-01-01", "amount": 5.5},
+        },
+        {
+            "name": "Months",
+            "details": {"type": "monthly", "day": 3, "amount": -1, "months": [6, 1]},
+        },
+        {
+            "name": "All months",
+            "details": {"type": "monthly", "day": 3, "amount": -1.25},
+        },
+        {
+            "name": "Some months",
+            "limit": 10,
+            "start": "2023-01-01",
+            "details": {"type": "monthly", "day": 3, "amount": -1, "months": [1, 6]},
+        },
+        {
+            "name": "Note",
+            "note": "kept",
+            "details": {
+                "type": "interval",
+                "first_date": "2023-01-01",
+                "interval": 7,
+                "amount": 1,
+            },
+        },
+        {
+            "name": "Group",
+            "limit": 2.5,
+            "start": "2023-01-01",
+            "details": {
+                "type": "composite",
+                "cashflows": [
+                    {
+                        "name": "Salary",
+                        "details": {
+                            "type": "salary",
+                            "starting_date": "2023-01-06",
+                            "gross_salary": 100,
+                            "estimated_raise": {"Month": 4, "raise": 0.02},
+                            "constant_deductions": 1,
+                            "variable_deductions": [],
+                        },
+                    },
+                    {
+                        "name": "Tagged",
+                        "tag": 1,
+                        "details": {
+                            "type": "composite",
+                            "cashflows": [],
+                            "colour": "red",
+                        },
+                    },
+                    {
+                        "name": "Empty",
+                        "details": {"type": "composite", "cashflows": []},
+                    },
+                ],
+            },
+        },
+    ]
+    path = tmp_path / "unusual.cfb"
+    write_definitions(path, definitions)
+    assert read_definitions(path) == definitions
+    write_definitions(path, [])
+    assert read_definitions(path) == []
+
+
+def test_projection_round_trip(tmp_path, cashflows):
+    df = sum_cashflows(cashflows, date(2022, 1, 1), 400, 100)
+    path = tmp_path / "projection.cfb"
+    write_projection(path, df)
+
+    names, arrays = open_projection(path)
+    assert arrays["dates"].dtype == np.dtype("datetime64[D]")
+    assert arrays["dates"][0] == np.datetime64("2022-01-01")
+    assert np.array_equal(arrays["balance"], df["balance"].to_numpy())
+    assert arrays["columns"].shape == (len(names), 400)
+    assert read_projection(path).equals(df)
+
+
+def test_newer_versions_are_rejected(tmp_path):
+    path = tmp_path / "future.cfb"
+    write_container(path, "definitions", {})
+    data = bytearray(path.read_bytes())
+    data[8] = VERSION + 1
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="format version"):
+        read_container(path)
+    (tmp_path / "plain.json").write_text("[]")
+    with pytest.raises(ValueError, match="not a cashflow binary"):
+        read_container(tmp_path / "plain.json")
+
+
+def test_load_cashflows_reads_binary_files(tmp_path, definitions):
+    clear_cache()
+    path = tmp_path / "cashflows.cfb"
+    write_definitions(path, definitions)
+    loaded = load_cashflows(path)
+    assert [c.to_dict() for c in loaded] == [
+        Cashflow.from_dict(d).to_dict() for d in definitions
+    ]
+    clear_cache()
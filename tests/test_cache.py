@@ -0,0 +1,103 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from cashflow import (
+    ColumnCache,
+    IntervalCashflow,
+    MonthlyCashflow,
+    SalaryCashflow,
+    sum_cashflows,
+)
+from cashflow.cache import column_key
+
+
+def test_key_ignores_names_but_not_window():
+    a = IntervalCashflow("Pay", date(2019, 1, 11), 14, 3317.94)
+    b = IntervalCashflow("Other pay", date(2019, 1, 11), 14, 3317.94)
+    c = IntervalCashflow("Pay", date(2019, 1, 11), 14, 3317.95)
+    start = date(2023, 1, 1)
+    assert column_key(a, start, 100) == column_key(b, start, 100)
+    assert column_key(a, start, 100) != column_key(c, start, 100)
+    assert column_key(a, start, 100) != column_key(a, start, 101)
+    assert column_key(a, start, 100) != column_key(a, date(2023, 1, 2), 100)
+
+
+def test_key_keeps_deduction_names():
+    def salary(names):
+        return SalaryCashflow(
+            name="Job",
+            starting_date=date(2023, 1, 1),
+            gross_salary=1000,
+            estimated_raise={"Month": 7, "raise": 0.0},
+            constant_deductions=0,
+            variable_deductions=[
+                {"name": names[0], "amount": 0.05, "cap": 500},
+                {"name": names[1], "amount": 0.05, "cap": 120},
+            ],
+        )
+
+    shared, separate = salary(["Tax", "Tax"]), salary(["Tax", "Pension"])
+    start = date(2023, 1, 1)
+    assert column_key(shared, start, 29) != column_key(separate, start, 29)
+
+    cache = ColumnCache(":memory:")
+    sum_cashflows([shared], start, 29, 0, cache=cache)
+    df = sum_cashflows([separate], start, 29, 0, cache=cache)
+    paydays = [date(2023, 1, 1), date(2023, 1, 15), date(2023, 1, 29)]
+    assert df.loc[paydays, "Job"].tolist() == pytest.approx([900, 900, 930])
+
+
+def test_cached_projection_matches(tmp_path, cashflows):
+    path = tmp_path / "columns.sqlite"
+    expected = sum_cashflows(cashflows, date(2022, 1, 1), 500, 100)
+
+    cache = ColumnCache(path)
+    first = sum_cashflows(cashflows, date(2022, 1, 1), 500, 100, cache=cache)
+    stored = len(cache)
+    assert 0 < stored <= len(cashflows)
+    cache.close()
+
+    # A new process would open the same file and evaluate nothing.
+    cache = ColumnCache(path)
+    evaluated = []
+
+    def evaluate(missing):
+        evaluated.extend(missing)
+        return []
+
+    cache.columns(cashflows, date(2022, 1, 1), 500, evaluate)
+    assert evaluated == []
+    second = sum_cashflows(cashflows, date(2022, 1, 1), 500, 100, cache=cache)
+    assert len(cache) == stored
+    for df in (first, second):
+        assert df.drop(columns="labels").equals(expected.drop(columns="labels"))
+        assert (df["labels"] == expected["labels"]).all()
+
+
+def test_identical_schedules_are_evaluated_once():
+    cache = ColumnCache(":memory:")
+    cashflows = [MonthlyCashflow(f"Rent {i}", 1, -600) for i in range(3)]
+    calls = []
+
+    def evaluate(missing):
+        calls.append(len(missing))
+        return [np.arange(10.0) for _ in missing]
+
+    columns = cache.columns(cashflows, date(2023, 1, 1), 10, evaluate)
+    assert calls == [1]
+    assert len(columns) == 3
+    assert len(cache) == 1
+
+
+def test_least_recently_used_columns_are_evicted():
+    cache = ColumnCache(":memory:", max_bytes=3 * 12)
+    for i in range(3):
+        cache.put(f"k{i}", np.eye(5)[i])
+    assert cache.get("k0", 5) is not None
+    cache.put("k3", np.eye(5)[3])
+    assert len(cache) == 3
+    assert cache.get("k1", 5) is None
+    assert cache.get("k0", 5) == pytest.approx(np.eye(5)[0])
+    assert cache.size() == 36
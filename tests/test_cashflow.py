@@ -1,28 +1,38 @@
+import gzip
 import io
 import os
 import sqlite3
-from datetime import date
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 from json import dumps, loads
 
+import numpy as np
+import pandas as pd
 import pytest
 from pytest import raises
 
+import cashflow
 from cashflow import (
     Cashflow,
     CashflowEncoder,
     CompositeCashflow,
     EndOn,
+    Interned,
     IntervalCashflow,
     Limited,
     MonthlyCashflow,
     OneTimeCashflow,
     StartOn,
+    _to_date,
     flow,
     get_projection,
+    iter_projection,
     main,
     run_cashflows,
-    sum_cashflows,
     store_projection,
+    sum_cashflows,
 )
 
 
@@ -181,6 +191,211 @@ def test_complex_flow_after_end(complex_cf):
     assert complex_cf.flow(date(2023, 1, 3)) == 0
 
 
+# --- Batch flows Tests ---
+
+
+@pytest.fixture
+def batch_dates():
+    return np.arange("2022-12-01", "2023-03-01", dtype="datetime64[D]")
+
+
+@pytest.mark.parametrize(
+    "cf_fixture",
+    ["interval_cf", "monthly_cf", "onetime_cf", "composite_cf", "complex_cf"],
+)
+def test_flows_matches_flow(cf_fixture, batch_dates, request):
+    cf = request.getfixturevalue(cf_fixture)
+    expected = [cf.flow(d.item()) for d in batch_dates]
+    assert cf.flows(batch_dates).tolist() == expected
+
+
+def test_interval_flows_before_start(interval_cf):
+    dates = np.array(["2022-12-18", "2023-01-15"], dtype="datetime64[D]")
+    assert interval_cf.flows(dates).tolist() == [0.0, 100.0]
+
+
+def test_monthly_flows_respects_months():
+    m = MonthlyCashflow(name="Q", day_of_month=1, amount=10, months=[1, 4])
+    dates = np.array(["2023-01-01", "2023-02-01", "2023-04-01"], dtype="datetime64[D]")
+    assert m.flows(dates).tolist() == [10.0, 0.0, 10.0]
+
+
+def test_flows_accepts_date_list(onetime_cf):
+    assert onetime_cf.flows([date(2023, 1, 1), date(2023, 1, 2)]).tolist() == [5, 0]
+
+
+def test_flow_keeps_integer_amounts():
+    comp = CompositeCashflow(name="C")
+    comp.add(MonthlyCashflow("M", 3, 5))
+    comp.add(OneTimeCashflow("O", date(2023, 2, 3), 2.5))
+    capped = Limited(
+        date(2023, 1, 1), 100, IntervalCashflow("I", date(2023, 1, 1), 7, -40)
+    )
+    assert type(comp.flow(date(2023, 1, 3))) is int
+    assert comp.flow(date(2023, 2, 3)) == 7.5
+    assert type(comp.flow(date(2023, 1, 4))) is int
+    assert [type(capped.flow(date(2023, 1, d))) for d in (1, 2, 15)] == [int] * 3
+
+
+def test_base_cashflow_needs_a_schedule():
+    cf = Cashflow(name="B")
+    dates = np.array(["2023-01-01", "2023-01-02"], dtype="datetime64[D]")
+    with raises(NotImplementedError):
+        cf.flows(dates)
+    with raises(NotImplementedError):
+        sum_cashflows([cf], date(2023, 1, 1), 2, 0)
+
+
+class _InlineExecutor(ThreadPoolExecutor):
+    """Stands in for the process pool so tests can watch it."""
+
+    created = 0
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers)
+        type(self).created += 1
+
+
+class _Weekends(Cashflow):
+    """A third-party cashflow that only implements flow()."""
+
+    def flow(self, date):
+        return 5 if date.weekday() >= 5 else 0
+
+
+def test_flow_only_subclass_is_projected():
+    cf = _Weekends("W")
+    assert list(cf.events(date(2023, 1, 5), date(2023, 1, 9))) == [
+        (date(2023, 1, 7), 5.0),
+        (date(2023, 1, 8), 5.0),
+    ]
+    df = sum_cashflows([cf], date(2023, 1, 5), 5, 0)
+    assert df["W"].tolist() == [0, 0, 5, 5, 0]
+    assert df["W"].dtype == np.int64
+    output = io.StringIO()
+    run_cashflows([cf], date(2023, 1, 7), 1, output)
+    assert output.getvalue() == "Date,W\n2023-01-07,5\n"
+
+
+# --- Events Tests ---
+
+
+@pytest.mark.parametrize(
+    "cf_fixture",
+    ["interval_cf", "monthly_cf", "onetime_cf", "composite_cf", "complex_cf"],
+)
+def test_events_match_flows(cf_fixture, batch_dates, request):
+    cf = request.getfixturevalue(cf_fixture)
+    amounts = cf.flows(batch_dates)
+    expected = [(d.item(), a) for d, a in zip(batch_dates, amounts.tolist()) if a != 0]
+    assert list(cf.events(date(2022, 12, 1), date(2023, 2, 28))) == expected
+
+
+def test_interval_events_jump_to_start(interval_cf):
+    events = list(interval_cf.events(date(2023, 1, 10), date(2023, 2, 1)))
+    assert events == [(date(2023, 1, 15), 100.0), (date(2023, 1, 29), 100.0)]
+
+
+def test_interval_rejects_zero_interval():
+    with raises(ValueError, match="cannot be 0"):
+        IntervalCashflow("Z", date(2023, 1, 1), 0, 100)
+
+
+def test_interval_negative_interval_matches_flows():
+    cf = IntervalCashflow("N", date(2023, 1, 1), -7, 100)
+    dates = np.arange("2022-12-01", "2023-03-01", dtype="datetime64[D]")
+    expected = [
+        (d.item(), a) for d, a in zip(dates, cf.flows(dates).tolist()) if a != 0
+    ]
+    assert expected[0] == (date(2023, 1, 1), 100.0)
+    assert list(cf.events(date(2022, 12, 1), date(2023, 2, 28))) == expected
+
+
+def test_monthly_events_skip_short_months():
+    m = MonthlyCashflow(name="M", day_of_month=31, amount=10)
+    events = list(m.events(date(2023, 1, 1), date(2023, 4, 30)))
+    assert [d for d, _ in events] == [date(2023, 1, 31), date(2023, 3, 31)]
+
+
+def test_wrapper_events_clip_to_window(interval_cf):
+    cf = EndOn(date(2023, 2, 1), StartOn(date(2023, 1, 10), interval_cf))
+    events = list(cf.events(date(2022, 1, 1), date(2024, 1, 1)))
+    assert [d for d, _ in events] == [date(2023, 1, 15), date(2023, 1, 29)]
+
+
+def test_composite_events_combine_same_day():
+    comp = CompositeCashflow(name="C")
+    comp.add(OneTimeCashflow("A", date(2023, 1, 1), 5))
+    comp.add(OneTimeCashflow("B", date(2023, 1, 1), 7))
+    comp.add(OneTimeCashflow("D", date(2023, 1, 2), 1))
+    events = list(comp.events(date(2023, 1, 1), date(2023, 1, 31)))
+    assert events == [(date(2023, 1, 1), 12.0), (date(2023, 1, 2), 1.0)]
+
+
+# --- Limited Tests ---
+
+
+def test_limited_is_lazy():
+    icf = IntervalCashflow("I", date(2023, 1, 1), 1, 10)
+    lcf = Limited(date(2023, 1, 1), 15, icf)
+    assert len(lcf._schedule[2]) == 0
+
+
+def test_limited_partial_final_payment():
+    icf = IntervalCashflow("I", date(2023, 1, 1), 7, -40)
+    lcf = Limited(date(2023, 1, 1), 100, icf)
+    events = list(lcf.events(date(2023, 1, 1), date(2030, 1, 1)))
+    assert events == [
+        (date(2023, 1, 1), -40.0),
+        (date(2023, 1, 8), -40.0),
+        (date(2023, 1, 15), -20.0),
+    ]
+
+
+def test_limited_uncapped_flow_terminates():
+    icf = IntervalCashflow("I", date(2023, 1, 1), 14, -66.05)
+    lcf = Limited(date(2023, 1, 1), 1e9, EndOn(date(2023, 12, 31), icf))
+    assert lcf.flow(date(2023, 1, 15)) == -66.05
+    assert lcf.flow(date(2060, 1, 1)) == 0
+
+
+def test_limited_zero_amount_terminates():
+    icf = IntervalCashflow("I", date(2023, 1, 1), 1, 0)
+    lcf = Limited(date(2023, 1, 1), 10, icf)
+    assert list(lcf.events(date(2023, 1, 1), date(2033, 1, 1))) == []
+
+
+def test_limited_searches_beyond_horizon():
+    icf = IntervalCashflow("I", date(2023, 1, 1), 30, 1)
+    lcf = Limited(date(2023, 1, 1), 100, icf, horizon_days=10)
+    assert lcf.flow(date(2023, 1, 1) + timedelta(days=30 * 50)) == 1
+
+
+def test_limited_shared_between_threads():
+    dates = np.arange("2023-01-01", "2043-01-01", dtype="datetime64[D]")
+    expected = Limited(
+        date(2023, 1, 1), 5000, IntervalCashflow("I", date(2023, 1, 1), 3, 7)
+    ).flows(dates)
+    for _ in range(20):
+        lcf = Limited(
+            date(2023, 1, 1),
+            5000,
+            IntervalCashflow("I", date(2023, 1, 1), 3, 7),
+            horizon_days=30,
+        )
+        barrier = threading.Barrier(8)
+
+        def evaluate(n, lcf=lcf, barrier=barrier):
+            barrier.wait()
+            return lcf.flows(dates[: 200 * n])
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(evaluate, range(1, 9)))
+        for n, flows in enumerate(results, start=1):
+            assert flows.tolist() == expected[: 200 * n].tolist()
+        assert lcf.flows(dates).sum() == 5000
+
+
 # --- Error Handling Tests ---
 
 
@@ -194,6 +409,55 @@ def test_from_dict_unknown_type():
         Cashflow.from_dict({"name": "B", "details": {"type": "X"}})
 
 
+# --- Interning Tests ---
+
+
+def test_from_dict_interns_identical_subtrees():
+    definitions = [
+        {
+            "name": name,
+            "details": {
+                "type": "interval",
+                "first_date": "2023-01-06",
+                "interval": 14,
+                "amount": amount,
+            },
+        }
+        for name, amount in (("EI", -20), ("QPIP", -20), ("QPP", -30))
+    ]
+    interned = {}
+    ei, qpip, qpp = (Cashflow.from_dict(d, interned) for d in definitions)
+    assert isinstance(ei, Interned)
+    assert ei.cashflow is qpip.cashflow
+    assert qpp.cashflow is not ei.cashflow
+    assert [ei.name, qpip.name] == ["EI", "QPIP"]
+    assert [c.to_dict() for c in (ei, qpip, qpp)] == definitions
+
+
+def test_interned_file_projects_the_same(definitions):
+    interned = {}
+    cashflows = [Cashflow.from_dict(d, interned) for d in definitions]
+    plain = [Cashflow.from_dict(d) for d in definitions]
+    assert [c.to_dict() for c in cashflows] == [c.to_dict() for c in plain]
+    assert sum_cashflows(cashflows, date(2022, 1, 1), 400, 0).equals(
+        sum_cashflows(plain, date(2022, 1, 1), 400, 0)
+    )
+
+
+def test_interned_schedule_is_evaluated_once(monkeypatch):
+    calls = []
+    shared = IntervalCashflow("Pay", date(2023, 1, 6), 14, 100)
+    original = shared._events
+    monkeypatch.setattr(
+        shared, "_events", lambda s, e: calls.append((s, e)) or original(s, e)
+    )
+    memo = OrderedDict()
+    refs = [Interned(name, shared, memo) for name in ("A", "B", "C")]
+    df = sum_cashflows(refs, date(2023, 1, 1), 60, 0)
+    assert len(calls) == 1
+    assert df["total"].sum() == 3 * 100 * 4
+
+
 # --- Encoder Tests ---
 
 
@@ -223,11 +487,153 @@ def test_run_cashflows_writes_to_stream(onetime_cf):
     assert "Date,O" in out.getvalue()  # O is the name in onetime_json
 
 
+def test_run_cashflows_formats_like_flow():
+    cashflows = [
+        IntervalCashflow("Int", date(2023, 1, 1), 2, -300),
+        IntervalCashflow("Float", date(2023, 1, 1), 2, 12.5),
+        Limited(date(2023, 1, 1), 5.5, IntervalCashflow("Cap", date(2023, 1, 1), 1, 2)),
+    ]
+    out = io.StringIO()
+    run_cashflows(cashflows, date(2023, 1, 1), 4, out)
+    assert out.getvalue() == (
+        "Date,Int,Float,Cap\n"
+        "2023-01-01,-300,12.5,2\n"
+        "2023-01-02,,,2\n"
+        "2023-01-03,-300,12.5,1.5\n"
+        "2023-01-04,,,\n"
+    )
+
+
+def test_run_cashflows_chunks_and_compression(cashflows):
+    whole, chunked, compressed = io.StringIO(), io.StringIO(), io.BytesIO()
+    run_cashflows(cashflows, date(2021, 12, 20), 400, whole)
+    run_cashflows(cashflows, date(2021, 12, 20), 400, chunked, chunk_days=7)
+    run_cashflows(cashflows, date(2021, 12, 20), 400, compressed, compress=True)
+    assert chunked.getvalue() == whole.getvalue()
+    assert gzip.decompress(compressed.getvalue()).decode() == whole.getvalue()
+
+
 def test_sum_cashflows_labels(onetime_cf):
     df = sum_cashflows([onetime_cf], date(2023, 1, 1), 2, 0)
     assert "O: 5" in df.loc[date(2023, 1, 1), "labels"]
 
 
+def test_sum_cashflows_min_forward():
+    flows = [
+        OneTimeCashflow("A", date(2023, 1, 2), -5),
+        OneTimeCashflow("B", date(2023, 1, 3), 10),
+        OneTimeCashflow("C", date(2023, 1, 4), -8),
+    ]
+    df = sum_cashflows(flows, date(2023, 1, 1), 5, 0)
+    assert df["balance"].tolist() == [0, -5, 5, -3, -3]
+    assert df["min_forward"].tolist() == [-5, -5, -3, -3, -3]
+
+
+def test_sum_cashflows_duplicate_names_count_in_total():
+    flows = [
+        OneTimeCashflow("A", date(2023, 1, 1), 5),
+        OneTimeCashflow("A", date(2023, 1, 2), 7),
+    ]
+    df = sum_cashflows(flows, date(2023, 1, 1), 2, 0)
+    assert list(df.columns) == ["A", "labels", "total", "balance", "min_forward"]
+    assert df["total"].tolist() == [5, 7]
+    assert df["labels"].tolist() == ["", "A: 7"]
+
+
+def test_sum_cashflows_keeps_integer_dtypes():
+    flows = [
+        IntervalCashflow("Payday", date(2016, 10, 21), 14, 1000),
+        MonthlyCashflow("Rent", 1, -600),
+    ]
+    df = sum_cashflows(flows, date(2016, 10, 21), 30, 0)
+    assert df.dtypes.drop("labels").tolist() == [np.dtype(np.int64)] * 5
+    assert df.loc[date(2016, 11, 1), "labels"] == "Rent: -600"
+
+    flows.append(OneTimeCashflow("Bonus", date(2016, 11, 2), 2.5))
+    df = sum_cashflows(flows, date(2016, 10, 21), 30, 0)
+    assert df["Rent"].dtype == np.int64
+    assert df["total"].dtype == np.float64
+    assert df.loc[date(2016, 11, 1), "labels"] == "Rent: -600.0"
+
+
+def test_sum_cashflows_workers_match_serial(cashflows):
+    cashflows = cashflows + [OneTimeCashflow("O", date(2022, 3, 1), 5)]
+    serial = sum_cashflows(cashflows, date(2021, 6, 1), 800, 100)
+    parallel = sum_cashflows(cashflows, date(2021, 6, 1), 800, 100, workers=3)
+    assert parallel.equals(serial)
+
+
+@pytest.mark.parametrize("chunk_days", [5, 31, 366, 1000])
+def test_iter_projection_matches_sum_cashflows(chunk_days, cashflows):
+    expected = sum_cashflows(cashflows, date(2021, 6, 1), 800, 100)
+    chunks = list(
+        iter_projection(cashflows, date(2021, 6, 1), 800, 100, chunk_days=chunk_days)
+    )
+    assert all(len(chunk) <= chunk_days for chunk in chunks)
+    assert pd.concat(chunks).equals(expected)
+
+
+def test_iter_projection_without_min_forward():
+    flows = [
+        OneTimeCashflow("A", date(2023, 1, 2), -5),
+        OneTimeCashflow("B", date(2023, 1, 3), 10),
+        OneTimeCashflow("C", date(2023, 1, 4), -8),
+    ]
+    chunks = list(
+        iter_projection(flows, date(2023, 1, 1), 5, 0, chunk_days=2, min_forward=False)
+    )
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    df = pd.concat(chunks)
+    assert "min_forward" not in df.columns
+    assert df["balance"].tolist() == [0, -5, 5, -3, -3]
+
+
+def test_run_cashflows_workers_match_serial(interval_cf, monthly_cf, onetime_cf):
+    cashflows = [interval_cf, monthly_cf, onetime_cf]
+    serial, parallel = io.StringIO(), io.StringIO()
+    run_cashflows(cashflows, date(2022, 12, 1), 90, serial)
+    run_cashflows(cashflows, date(2022, 12, 1), 90, parallel, workers=2)
+    assert parallel.getvalue() == serial.getvalue()
+
+
+def test_workers_evaluate_unshippable_cashflows_here(monkeypatch, interval_cf):
+    # Neither survives to_dict(): one has no definition at all and the
+    # other would lose its horizon_days.
+    limited = Limited(
+        date(2023, 1, 1), 50, IntervalCashflow("L", date(2023, 1, 1), 3, 7), 5
+    )
+    cashflows = [interval_cf, _Weekends("W"), limited]
+    shipped = []
+
+    def evaluate(definitions, start_date, duration):
+        shipped.extend(d["name"] for d in definitions)
+        return [
+            cashflow._column(Cashflow.from_dict(d), start_date, duration)
+            for d in definitions
+        ]
+
+    monkeypatch.setattr(cashflow, "_evaluate_definitions", evaluate)
+    monkeypatch.setattr(cashflow, "ProcessPoolExecutor", _InlineExecutor)
+    serial = sum_cashflows(cashflows, date(2023, 1, 1), 40, 0)
+    parallel = sum_cashflows(cashflows, date(2023, 1, 1), 40, 0, workers=2)
+    assert parallel.equals(serial)
+    assert shipped == ["I"]
+
+
+def test_run_cashflows_keeps_one_pool(monkeypatch, interval_cf, monthly_cf):
+    _InlineExecutor.created = 0
+    monkeypatch.setattr(cashflow, "ProcessPoolExecutor", _InlineExecutor)
+    cashflows = [interval_cf, monthly_cf]
+    serial, parallel = io.StringIO(), io.StringIO()
+    run_cashflows(cashflows, date(2022, 12, 1), 90, serial, chunk_days=7)
+    run_cashflows(cashflows, date(2022, 12, 1), 90, parallel, 2, chunk_days=7)
+    assert parallel.getvalue() == serial.getvalue()
+    assert _InlineExecutor.created == 1
+    chunks = iter_projection(cashflows, date(2022, 12, 1), 90, 0, 7, workers=2)
+    assert len(list(chunks)) == 13
+    assert _InlineExecutor.created == 2
+
+
 # --- Projection Tests ---
 
 
@@ -235,8 +641,10 @@ def test_sum_cashflows_labels(onetime_cf):
 def temp_db_path():
     path = "test_run.db"
     yield path
-    if os.path.exists(path):
-        os.remove(path)
+    # The store puts the database in WAL mode, which adds -wal and -shm files.
+    for leftover in [path, path + "-wal", path + "-shm"]:
+        if os.path.exists(leftover):
+            os.remove(leftover)
 
 
 def test_store_and_get_projection(temp_db_path, onetime_cf):
@@ -247,13 +655,23 @@ def test_store_and_get_projection(temp_db_path, onetime_cf):
         assert len(get_projection(c2, "working")) == 1
 
 
+def test_store_projection_accepts_chunks(temp_db_path, interval_cf):
+    conn = sqlite3.connect(temp_db_path)
+    chunks = iter_projection([interval_cf], date(2023, 1, 1), 10, 0, chunk_days=3)
+    store_projection(chunks, conn, "working")
+    with sqlite3.connect(temp_db_path) as c2:
+        stored = get_projection(c2, "working")
+    expected = sum_cashflows([interval_cf], date(2023, 1, 1), 10, 0)
+    assert len(stored) == 10
+    assert stored["balance"].tolist() == expected["balance"].tolist()
+
+
 def test_store_projection_raises_on_duplicate(temp_db_path, onetime_cf):
     conn = sqlite3.connect(temp_db_path)
     df = sum_cashflows([onetime_cf], date(2023, 1, 1), 1, 0)
     store_projection(df, conn, "my_proj")
-    with  sqlite3.connect(temp_db_path) as c2:
-        with raises(ValueError, match="exists"):
-            store_projection(df.copy(), c2, "my_proj")
+    with sqlite3.connect(temp_db_path) as c2, raises(ValueError, match="exists"):
+        store_projection(df.copy(), c2, "my_proj")
 
 
 def test_store_projection_raises_on_closed_conn(temp_db_path, onetime_cf):
@@ -311,6 +729,15 @@ def test_composite_to_dict_direct():
 # --- Miscellaneous Tests ---
 
 
+def test_to_date_parses_iso_dates():
+    assert _to_date("2023-02-28") == date(2023, 2, 28)
+    assert _to_date("2023-2-8") == date(2023, 2, 8)
+    with raises(ValueError):
+        _to_date("2023-02-30")
+    with raises(ValueError):
+        _to_date("2023-0a-01")
+
+
 def test_cashflow_base_to_dict():
     assert Cashflow(name="G").to_dict() == {"name": "G"}
 
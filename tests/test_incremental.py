@@ -0,0 +1,95 @@
+from copy import deepcopy
+from datetime import date
+
+import pytest
+
+from cashflow import Cashflow, IncrementalProjection, sum_cashflows
+
+START = date(2022, 6, 1)
+DURATION = 500
+
+
+def _assert_matches(projection, definitions):
+    cashflows = [Cashflow.from_dict(d) for d in definitions]
+    expected = sum_cashflows(cashflows, START, DURATION, 250)
+    got = projection.to_frame()
+    assert list(got.columns) == list(expected.columns)
+    assert got.dtypes.equals(expected.dtypes)
+    for column in expected.columns.drop("labels"):
+        assert got[column].to_numpy() == pytest.approx(expected[column].to_numpy())
+
+
+def test_initial_projection_matches_sum_cashflows(definitions):
+    _assert_matches(
+        IncrementalProjection(definitions, START, DURATION, 250), definitions
+    )
+
+
+def test_edit_recomputes_one_unit(definitions):
+    projection = IncrementalProjection(definitions, START, DURATION, 250)
+    edited = deepcopy(definitions)
+    hydro = [d for d in edited if d["name"] == "Hydro"]
+    hydro[1]["details"]["amount"] = -500
+    edited[0]["details"]["cashflows"][4]["details"]["amount"] = 4100.0
+
+    changed = projection.update(edited)
+    assert changed == [
+        (("Pay", 0), ("Arup Pay 2023", 0)),
+        (("Hydro", 1),),
+    ]
+    _assert_matches(projection, edited)
+
+
+def test_unchanged_update_is_a_no_op(definitions):
+    projection = IncrementalProjection(definitions, START, DURATION, 250)
+    assert projection.update(deepcopy(definitions)) == []
+
+
+def test_composite_window_change_recomputes_children(definitions):
+    projection = IncrementalProjection(definitions, START, DURATION, 250)
+    edited = deepcopy(definitions)
+    giving = next(d for d in edited if d["name"] == "Giving")
+    giving["end"] = "2023-03-31"
+    changed = projection.update(edited)
+    # Children already over by the new end date keep their columns.
+    assert {key[:2] for key in changed} == {
+        (("Giving", 0), ("E tithe", 0)),
+        (("Giving", 0), ("2023 giving", 0)),
+        (("Giving", 0), ("Nico & Molly", 0)),
+    }
+    _assert_matches(projection, edited)
+
+
+def test_added_and_removed_cashflows(definitions):
+    projection = IncrementalProjection(definitions, START, DURATION, 250)
+    edited = [d for d in definitions if d["name"] != "RESP"]
+    edited.append(
+        {
+            "name": "Gift",
+            "details": {"type": "one-time", "date": "2023-01-05", "amount": 99},
+        }
+    )
+    changed = projection.update(edited)
+    assert sorted(changed) == [(("Gift", 0),), (("RESP", 0),)]
+    _assert_matches(projection, edited)
+
+    projection.update(definitions)
+    _assert_matches(projection, definitions)
+
+
+def test_int_cashflows_keep_int_columns():
+    definitions = [
+        {
+            "name": "Rent",
+            "details": {"type": "monthly", "day": 1, "amount": -1200},
+        },
+        {
+            "name": "Gift",
+            "details": {"type": "one-time", "date": "2023-01-05", "amount": 99},
+        },
+    ]
+    projection = IncrementalProjection(definitions, START, DURATION, 250)
+    cashflows = [Cashflow.from_dict(d) for d in definitions]
+    expected = sum_cashflows(cashflows, START, DURATION, 250)
+    assert projection.to_frame().equals(expected)
+    assert expected["balance"].dtype == "int64"
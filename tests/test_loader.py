@@ -0,0 +1,157 @@
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from cashflow import (
+    _MAX_DEPTH,
+    CASHFLOW_TYPES,
+    Cashflow,
+    OneTimeCashflow,
+    load_cashflows,
+    register_cashflow_type,
+    run_cashflows,
+    sum_cashflows,
+)
+from cashflow.loader import clear_cache
+
+
+@pytest.fixture
+def cashflows_file(tmp_path, cashflows_json):
+    clear_cache()
+    path = tmp_path / "cashflows.json"
+    path.write_text(cashflows_json.read_text())
+    yield path
+    clear_cache()
+
+
+def test_load_matches_from_dict(cashflows_file, cashflows):
+    loaded = load_cashflows(cashflows_file)
+    assert [c.to_dict() for c in loaded] == [c.to_dict() for c in cashflows]
+    assert sum_cashflows(list(loaded), date(2022, 1, 1), 300, 0).equals(
+        sum_cashflows(cashflows, date(2022, 1, 1), 300, 0)
+    )
+
+
+def test_unchanged_file_is_served_from_cache(cashflows_file):
+    first = load_cashflows(cashflows_file)
+    assert load_cashflows(str(cashflows_file)) is first
+
+
+def test_changed_file_is_reloaded(cashflows_file):
+    first = load_cashflows(cashflows_file)
+    definitions = json.loads(cashflows_file.read_text())[:3]
+    cashflows_file.write_text(json.dumps(definitions))
+    stat = cashflows_file.stat()
+    os.utime(cashflows_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = load_cashflows(cashflows_file)
+    assert second is not first
+    assert len(second) == 3
+
+
+def test_content_is_used_instead_of_the_file(cashflows_file):
+    content = json.dumps(json.loads(cashflows_file.read_text())[:2]).encode()
+    loaded = load_cashflows(cashflows_file, content)
+    assert len(loaded) == 2
+    assert load_cashflows(cashflows_file, content) is loaded
+    assert len(load_cashflows(cashflows_file)) > 2
+
+
+def test_loaded_cashflows_can_be_projected_from_threads(cashflows_file):
+    horizons = [30 * n for n in range(1, 17)]
+    expected = [
+        sum_cashflows(list(load_cashflows(cashflows_file)), date(2022, 1, 1), n, 0)
+        for n in horizons
+    ]
+    clear_cache()
+    cashflows = list(load_cashflows(cashflows_file))
+    barrier = threading.Barrier(8)
+
+    def project(n):
+        barrier.wait()
+        return sum_cashflows(cashflows, date(2022, 1, 1), n, 0)
+
+    with ThreadPoolExecutor(8) as pool:
+        for df, want in zip(pool.map(project, horizons), expected):
+            assert df.equals(want)
+
+
+def _nested(depth):
+    data = {
+        "name": "L",
+        "details": {"type": "one-time", "date": "2023-01-01", "amount": 1},
+    }
+    for i in range(depth):
+        data = {
+            "name": f"C{i}",
+            "start": "2020-01-01",
+            "end": "2030-01-01",
+            "limit": 10,
+            "details": {"type": "composite", "cashflows": [data]},
+        }
+    return data
+
+
+def test_deepest_supported_tree_projects(tmp_path):
+    data = _nested(_MAX_DEPTH)
+    path = tmp_path / "deep.json"
+    path.write_text(json.dumps([data]))
+    clear_cache()
+    cashflows = list(load_cashflows(path))
+    clear_cache()
+    assert cashflows[0].to_dict() == data
+    df = sum_cashflows(cashflows, date(2022, 12, 31), 3, 0)
+    assert df["total"].tolist() == [0, 1, 0]
+    output = io.StringIO()
+    run_cashflows(cashflows, date(2022, 12, 31), 3, output)
+    assert output.getvalue().splitlines()[2] == "2023-01-01,1"
+
+
+def test_document_must_be_a_list(tmp_path):
+    path = tmp_path / "one.json"
+    path.write_text(json.dumps({"name": "A", "details": {"type": "composite"}}))
+    with pytest.raises(TypeError, match="one.json does not hold a list"):
+        load_cashflows(path)
+
+
+def test_deeper_trees_are_rejected():
+    with pytest.raises(ValueError, match="nested"):
+        Cashflow.from_dict(_nested(_MAX_DEPTH + 1))
+
+
+def test_composite_children_keep_their_order():
+    data = {
+        "name": "C",
+        "start": "2023-01-01",
+        "details": {
+            "type": "composite",
+            "cashflows": [
+                {
+                    "name": n,
+                    "details": {"type": "one-time", "date": "2023-02-01", "amount": 1},
+                }
+                for n in "ABC"
+            ],
+        },
+    }
+    cf = Cashflow.from_dict(data)
+    assert [c.name for c in cf.cashflow.cashflows] == ["A", "B", "C"]
+    assert cf.to_dict() == data
+
+
+def test_register_cashflow_type(monkeypatch):
+    monkeypatch.setitem(CASHFLOW_TYPES, "gift", None)
+    register_cashflow_type(
+        "gift",
+        lambda name, details: OneTimeCashflow(
+            name, date(2023, 12, 25), details["amount"]
+        ),
+    )
+    cf = Cashflow.from_dict({"name": "G", "details": {"type": "gift", "amount": 50}})
+    assert cf.flow(date(2023, 12, 25)) == 50
+    with pytest.raises(ValueError, match="composite"):
+        register_cashflow_type("composite", lambda name, details: None)
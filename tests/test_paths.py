@@ -0,0 +1,63 @@
+import pytest
+
+from cashflow.paths import get_value, resolve, set_value, window
+
+
+@pytest.fixture
+def definitions():
+    return [
+        {
+            "name": "Pay",
+            "start": "2023-01-01",
+            "details": {
+                "type": "composite",
+                "cashflows": [
+                    {
+                        "name": "Job",
+                        "end": "2023-06-30",
+                        "details": {
+                            "type": "salary",
+                            "estimated_raise": {"Month": 4, "raise": 0.03},
+                            "variable_deductions": [
+                                {"name": "EI", "amount": 0.0132, "cap": 834.24}
+                            ],
+                        },
+                    }
+                ],
+            },
+        }
+    ]
+
+
+def test_resolve_walks_composites(definitions):
+    chain, keys = resolve(definitions, "Pay/Job/details/estimated_raise/raise")
+    assert [node["name"] for node in chain] == ["Pay", "Job"]
+    assert keys == ["details", "estimated_raise", "raise"]
+
+
+def test_get_and_set_list_items(definitions):
+    chain, keys = resolve(definitions, "Pay/Job/details/variable_deductions/0/cap")
+    assert get_value(chain[-1], keys) == 834.24
+    set_value(chain[-1], keys, 900)
+    assert (
+        definitions[0]["details"]["cashflows"][0]["details"]["variable_deductions"][0][
+            "cap"
+        ]
+        == 900
+    )
+
+
+def test_resolve_rejects_unknown_paths(definitions):
+    with pytest.raises(ValueError, match="No top-level"):
+        resolve(definitions, "Rent/details/amount")
+    with pytest.raises(ValueError, match="not a field"):
+        resolve(definitions, "Pay/Job/details/amount")
+    with pytest.raises(ValueError, match="names a cashflow"):
+        resolve(definitions, "Pay/Job")
+
+
+def test_window_uses_ancestors_only(definitions):
+    chain, _ = resolve(definitions, "Pay/Job/details/estimated_raise/raise")
+    start, end = window(chain)
+    assert str(start) == "2023-01-01"
+    assert end is None
@@ -0,0 +1,80 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from cashflow import (
+    CompositeCashflow,
+    EndOn,
+    IntervalCashflow,
+    Limited,
+    MonthlyCashflow,
+    OneTimeCashflow,
+    Plan,
+    StartOn,
+    compile_cashflows,
+    sum_cashflows,
+)
+
+
+@pytest.fixture
+def tree():
+    rent = MonthlyCashflow("Rent", 1, -600)
+    pay = IntervalCashflow("Pay", date(2023, 1, 6), 14, 1000)
+    ei = Limited(
+        date(2023, 1, 1), 250, IntervalCashflow("EI", date(2023, 1, 6), 14, -66)
+    )
+    group = CompositeCashflow("Group")
+    group.add(StartOn(date(2023, 2, 1), pay))
+    group.add(EndOn(date(2023, 12, 31), StartOn(date(2023, 1, 1), ei)))
+    return [EndOn(date(2023, 6, 30), group), rent]
+
+
+def test_compile_flattens_to_leaves(tree):
+    plan = compile_cashflows(tree)
+    assert isinstance(plan, Plan)
+    assert plan.names == ["Group", "Rent"]
+    assert plan.paths == [("Group", "Pay"), ("Group", "EI"), ("Rent",)]
+    assert plan.groups.tolist() == [0, 0, 1]
+
+
+def test_compile_fuses_windows(tree):
+    plan = compile_cashflows(tree)
+    assert plan.starts[0] == np.datetime64("2023-02-01").astype(np.int64)
+    assert plan.ends[1] == np.datetime64("2023-06-30").astype(np.int64)
+
+
+def test_compile_records_cap(tree):
+    plan = compile_cashflows(tree)
+    assert isinstance(plan.schedules[1], IntervalCashflow)
+    assert plan.caps[1] == 250
+    assert np.isnan(plan.caps[0])
+
+
+def test_plan_matches_tree(tree):
+    df = sum_cashflows(tree, date(2022, 12, 1), 400, 0)
+    columns = compile_cashflows(tree).columns(date(2022, 12, 1), 400)
+    for name, column in columns.items():
+        assert column == pytest.approx(df[name].to_numpy())
+
+
+def test_plan_is_reusable(tree):
+    plan = compile_cashflows(tree)
+    full = plan.total(date(2023, 1, 1), 365)
+    assert plan.total(date(2023, 3, 1), 30) == pytest.approx(full[59:89])
+
+
+def test_plan_matches_cashflows_file(cashflows):
+    df = sum_cashflows(cashflows, date(2021, 6, 1), 1000, 0)
+    plan = compile_cashflows(cashflows)
+    assert plan.total(date(2021, 6, 1), 1000) == pytest.approx(df["total"].to_numpy())
+
+
+def test_limited_composite_is_opaque():
+    group = CompositeCashflow("G")
+    group.add(OneTimeCashflow("A", date(2023, 1, 1), 10))
+    group.add(OneTimeCashflow("B", date(2023, 1, 2), 10))
+    capped = Limited(date(2023, 1, 1), 15, group)
+    plan = capped.compile()
+    assert plan.schedules == [capped]
+    assert plan.total(date(2023, 1, 1), 3).tolist() == [10, 5, 0]
@@ -0,0 +1,74 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from cashflow import (
+    EndOn,
+    IntervalCashflow,
+    MonthlyCashflow,
+    OneTimeCashflow,
+    Portfolio,
+    StartOn,
+)
+
+
+@pytest.fixture
+def leaves():
+    return [
+        IntervalCashflow("Pay", date(2023, 1, 6), 14, 1000),
+        MonthlyCashflow("Rent", 1, -600),
+        EndOn(date(2023, 3, 31), MonthlyCashflow("Quarterly", 15, -50, [1, 4, 7, 10])),
+        StartOn(date(2023, 2, 1), IntervalCashflow("Weekly", date(2022, 12, 1), 7, 20)),
+    ]
+
+
+def test_portfolio_matrix_matches_flows(leaves):
+    portfolio = Portfolio.from_cashflows(leaves)
+    dates = np.arange("2022-12-01", "2023-06-01", dtype="datetime64[D]")
+    matrix = portfolio.matrix(date(2022, 12, 1), len(dates))
+    assert portfolio.names == ["Pay", "Rent", "Quarterly", "Weekly"]
+    for j, cf in enumerate(leaves):
+        assert matrix[:, j].tolist() == cf.flows(dates).tolist()
+
+
+def test_portfolio_total(leaves):
+    portfolio = Portfolio.from_cashflows(leaves)
+    matrix = portfolio.matrix(date(2023, 1, 1), 365)
+    assert portfolio.total(date(2023, 1, 1), 365) == pytest.approx(matrix.sum(axis=1))
+
+
+def test_portfolio_grouped(leaves):
+    portfolio = Portfolio.from_cashflows(leaves)
+    matrix = portfolio.matrix(date(2023, 1, 1), 90)
+    grouped = portfolio.grouped(date(2023, 1, 1), 90, [1, 0, 0, 1], 2)
+    assert grouped[0] == pytest.approx(matrix[:, 1] + matrix[:, 2])
+    assert grouped[1] == pytest.approx(matrix[:, 0] + matrix[:, 3])
+
+
+def test_portfolio_rejects_other_types():
+    with pytest.raises(ValueError, match="OneTimeCashflow"):
+        Portfolio().add(OneTimeCashflow("O", date(2023, 1, 1), 5))
+
+
+def test_portfolio_many_leaves():
+    leaves = [
+        IntervalCashflow(f"I{i}", date(2020, 1, 1 + i % 28), 7 + i % 30, 1.0)
+        for i in range(1000)
+    ] + [MonthlyCashflow(f"M{i}", 1 + i % 28, -1.0) for i in range(1000)]
+    dates = np.arange("2020-01-01", "2029-12-29", dtype="datetime64[D]")
+    total = Portfolio.from_cashflows(leaves).total(date(2020, 1, 1), len(dates))
+    assert total == pytest.approx(sum(cf.flows(dates) for cf in leaves))
+
+
+def test_portfolio_grouped_many_groups():
+    leaves = [
+        IntervalCashflow(f"I{i}", date(2020, 1, 1 + i % 28), 1 + i % 30, 1.0 + i)
+        for i in range(5000)
+    ]
+    groups = [i % 2500 for i in range(len(leaves))]
+    portfolio = Portfolio.from_cashflows(leaves)
+    matrix = portfolio.matrix(date(2020, 1, 1), 60)
+    grouped = portfolio.grouped(date(2020, 1, 1), 60, groups, 2500)
+    assert grouped.shape == (2500, 60)
+    assert grouped == pytest.approx((matrix[:, :2500] + matrix[:, 2500:]).T)
@@ -0,0 +1,104 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from cashflow import (
+    IntervalCashflow,
+    OneTimeCashflow,
+    Projection,
+    sum_cashflows,
+)
+from cashflow.binary import read_projection, write_projection
+
+
+@pytest.fixture
+def projection(cashflows):
+    return Projection.from_cashflows(cashflows, date(2021, 6, 1), 800, 100)
+
+
+def test_arrays_match_sum_cashflows(cashflows, projection):
+    df = sum_cashflows(cashflows, date(2021, 6, 1), 800, 100)
+    assert projection.dates.dtype == np.dtype("datetime64[D]")
+    assert projection.dates.tolist() == list(df.index)
+    assert projection.columns.flags.c_contiguous
+    for name in projection.names:
+        assert projection[name].tolist() == df[name].tolist()
+    for column in ["total", "balance", "min_forward"]:
+        assert projection[column].tolist() == df[column].tolist()
+    assert projection.labels() == df["labels"].tolist()
+    assert projection.to_frame().equals(df)
+
+
+def test_duplicate_names_keep_the_last_column():
+    flows = [
+        OneTimeCashflow("A", date(2023, 1, 1), 5),
+        OneTimeCashflow("A", date(2023, 1, 2), 7),
+    ]
+    projection = Projection.from_cashflows(flows, date(2023, 1, 1), 2, 0)
+    assert projection.names == ["A"]
+    assert projection["A"].tolist() == [0, 7]
+    assert projection.total.tolist() == [5, 7]
+
+
+def test_unknown_column(projection):
+    with pytest.raises(KeyError):
+        projection["Nothing"]
+
+
+def test_to_pandas_shares_memory(projection):
+    df = projection.to_pandas()
+    assert str(df.index.dtype).startswith("datetime64")
+    assert df.index[0] == np.datetime64("2021-06-01")
+    assert np.shares_memory(df["balance"].to_numpy(), projection.balance)
+    name = projection.names[0]
+    assert np.shares_memory(df[name].to_numpy(), projection.columns)
+    assert "labels" not in df.columns
+    assert "labels" in projection.to_pandas(labels=True).columns
+
+
+def test_window_is_a_view(projection):
+    part = projection[date(2022, 1, 1) : date(2022, 1, 31)]
+    assert len(part) == 31
+    assert part.start_date == date(2022, 1, 1)
+    assert np.shares_memory(part.balance, projection.balance)
+    assert part.balance.tolist() == projection.balance[214:245].tolist()
+    assert part.to_frame()["labels"].tolist() == projection.labels()[214:245]
+
+
+def test_window_clips_to_the_projection(projection):
+    assert len(projection.window(date(2020, 1, 1), date(2021, 6, 3))) == 3
+    assert len(projection.window(start="2023-08-01")) == 9
+    assert len(projection.window(date(2030, 1, 1))) == 0
+    assert len(projection.window(end=date(2021, 5, 31))) == 0
+    assert len(projection.window(date(2022, 1, 2), date(2022, 1, 1))) == 0
+    with pytest.raises(ValueError):
+        projection[date(2022, 1, 1) : date(2022, 2, 1) : 2]
+
+
+def test_save_and_load_memory_maps(tmp_path, projection):
+    path = tmp_path / "projection.cfb"
+    projection.save(path)
+    loaded = Projection.load(path)
+    assert isinstance(loaded.balance, np.memmap)
+    assert loaded.names == projection.names
+    assert loaded.to_frame().equals(projection.to_frame())
+    assert read_projection(path).equals(projection.to_frame())
+    part = loaded.window(date(2022, 1, 1), date(2022, 1, 2))
+    assert part.balance.tolist() == projection.balance[214:216].tolist()
+
+
+def test_load_reads_write_projection_files(tmp_path):
+    flows = [IntervalCashflow("I", date(2023, 1, 1), 3, -2)]
+    df = sum_cashflows(flows, date(2023, 1, 1), 10, 5)
+    path = tmp_path / "projection.cfb"
+    write_projection(path, df)
+    assert Projection.load(path).to_frame().equals(df)
+
+
+def test_empty_projection():
+    projection = Projection.from_cashflows([], date(2023, 1, 1), 0, 0)
+    assert len(projection) == 0
+    assert projection.start_date is None
+    assert len(projection.window(date(2023, 1, 1))) == 0
+    assert projection.to_pandas().empty
@@ -1,8 +1,10 @@
 from datetime import date
 from json import dumps
 
+import numpy as np
 import pytest
-from cashflow import QCMultiYearSalary, QCSalary, Cashflow, CashflowEncoder
+
+from cashflow import Cashflow, CashflowEncoder, QCMultiYearSalary, QCSalary
 
 
 def _make_multi(**overrides):
@@ -179,3 +181,56 @@ def test_multi_year_zero_increases_same_each_year():
         first_2026 = m.flow(d)
         break
     assert first_2025 == pytest.approx(first_2026)
+
+
+def test_multi_year_flows_matches_flow():
+    m = _make_multi()
+    dates = np.arange("2024-12-20", "2028-01-20", dtype="datetime64[D]")
+    expected = [m.flow(d.item()) for d in dates]
+    assert m.flows(dates) == pytest.approx(expected)
+
+
+def test_multi_year_events_span_years():
+    m = _make_multi()
+    events = list(m.events(date(2025, 12, 20), date(2026, 1, 20)))
+    assert [d for d, _ in events] == [date(2025, 12, 26), date(2026, 1, 9)]
+    assert [a for _, a in events] == [m.flow(d) for d, _ in events]
+
+
+# --- Lazy construction tests ---
+
+
+def test_multi_year_builds_no_years_up_front():
+    m = _make_multi(ending_year=2065)
+    assert len(m._salaries._built) == 0
+    assert len(m._schedules) == 0
+
+
+def test_multi_year_only_touches_projected_years():
+    m = _make_multi(ending_year=2065)
+    m.flows(np.arange("2026-01-01", "2027-12-31", dtype="datetime64[D]"))
+    assert list(m._schedules) == [2026, 2027]
+
+
+def test_multi_year_year_cache_is_bounded():
+    m = _make_multi(ending_year=2065, cache_years=3)
+    for y in range(2025, 2035):
+        m._salaries[y]
+    assert list(m._salaries._built) == [2032, 2033, 2034]
+
+
+def test_multi_year_salaries_outside_range():
+    m = _make_multi()
+    assert 2028 not in m._salaries
+    assert m._salaries.get(2028) is None
+    with pytest.raises(KeyError):
+        m._salaries[2024]
+
+
+def test_multi_year_batch_matches_year_objects():
+    m = _make_multi(ending_year=2030)
+    for y in range(2025, 2031):
+        s = m._salaries[y]
+        assert m.flows(np.array(list(s._flows), dtype="datetime64[D]")) == (
+            pytest.approx(list(s._flows.values()))
+        )
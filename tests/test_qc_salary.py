@@ -1,8 +1,10 @@
 from datetime import date
 from json import dumps
 
+import numpy as np
 import pytest
-from cashflow import QCSalary, Cashflow, CashflowEncoder
+
+from cashflow import Cashflow, CashflowEncoder, QCSalary
 
 
 def _make_salary(**overrides):
@@ -160,3 +162,17 @@ def test_qc_salary_no_raise():
     # All paydays should have the same gross (before caps start changing things)
     second = s.flow(date(2025, 1, 24))
     assert first == second
+
+
+def test_qc_salary_flows_matches_flow():
+    s = _make_salary()
+    dates = np.arange("2024-12-20", "2026-01-10", dtype="datetime64[D]")
+    expected = [s.flow(d.item()) for d in dates]
+    assert s.flows(dates) == pytest.approx(expected)
+
+
+def test_qc_salary_events_match_flows():
+    s = _make_salary()
+    events = list(s.events(date(2025, 3, 1), date(2025, 3, 31)))
+    assert [d for d, _ in events] == [date(2025, 3, 7), date(2025, 3, 21)]
+    assert [a for _, a in events] == [s.flow(d) for d, _ in events]
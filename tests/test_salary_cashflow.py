@@ -1,7 +1,10 @@
 from datetime import date, datetime
 from json import dumps
+
+import numpy as np
 import pytest
-from cashflow import SalaryCashflow, Cashflow, CashflowEncoder
+
+from cashflow import Cashflow, CashflowEncoder, SalaryCashflow, _to_day
 
 
 @pytest.mark.parametrize(
@@ -156,3 +159,122 @@ def test_limited_flow_gap():
     # Jan 1 has 10. Jan 2 has 0.
     # This should hit the 'else' branch in Limited.flow
     assert lcf.flow(date(2023, 1, 2)) == 0
+
+
+def test_salary_flows_matches_flow():
+    s = SalaryCashflow(
+        name="Job",
+        starting_date=date(2024, 1, 1),
+        gross_salary=7500,
+        estimated_raise={"Month": 4, "raise": 0.04},
+        constant_deductions=1200,
+        variable_deductions=[{"name": "EI", "amount": 0.0132, "cap": 834.24}],
+    )
+    dates = np.arange("2023-12-01", "2025-02-01", dtype="datetime64[D]")
+    expected = [s.flow(d.item()) for d in dates]
+    assert s.flows(dates) == pytest.approx(expected)
+
+
+def test_salary_events_only_paydays():
+    s = SalaryCashflow(
+        name="Job",
+        starting_date=date(2023, 1, 1),
+        gross_salary=1000,
+        estimated_raise={"Month": 1, "raise": 0.0},
+        constant_deductions=0,
+        variable_deductions=[],
+    )
+    events = list(s.events(date(2022, 12, 1), date(2023, 1, 31)))
+    assert events == [
+        (date(2023, 1, 1), 1000.0),
+        (date(2023, 1, 15), 1000.0),
+        (date(2023, 1, 29), 1000.0),
+    ]
+
+
+def _simple_salary(**overrides):
+    defaults = {
+        "name": "Job",
+        "starting_date": date(2023, 1, 1),
+        "gross_salary": 1000,
+        "estimated_raise": {"Month": 1, "raise": 0.0},
+        "constant_deductions": 0,
+        "variable_deductions": [],
+    }
+    return SalaryCashflow(**(defaults | overrides))
+
+
+def test_salary_schedule_is_array_backed():
+    days, amounts = _simple_salary()._get_cashflows(2023)
+    assert len(days) == len(amounts) == 27
+    assert np.all(np.diff(days) == 14)
+
+
+def test_salary_schedule_evicts_least_recent_year():
+    s = _simple_salary(cache_years=2)
+    first = s._get_cashflows(2023)
+    s._get_cashflows(2024)
+    s._get_cashflows(2023)
+    s._get_cashflows(2025)
+    assert list(s._schedules) == [2023, 2025]
+    assert s._get_cashflows(2023) is first
+
+
+def test_salary_schedule_unbounded_cache():
+    s = _simple_salary(cache_years=None)
+    s.flows(np.arange("2023-01-01", "2043-01-01", dtype="datetime64[D]"))
+    assert len(s._schedules) == 20
+
+
+def test_salary_schedule_not_shared_between_instances():
+    a = _simple_salary()
+    b = _simple_salary(gross_salary=2000)
+    assert a.flow(date(2023, 1, 1)) == 1000
+    assert b.flow(date(2023, 1, 1)) == 2000
+
+
+def test_salary_deductions_with_one_name_share_a_cap():
+    s = SalaryCashflow(
+        name="Job",
+        starting_date=date(2023, 1, 1),
+        gross_salary=1000,
+        estimated_raise={"Month": 7, "raise": 0.0},
+        constant_deductions=0,
+        variable_deductions=[
+            {"name": "Tax", "amount": 0.05, "cap": 500},
+            {"name": "Tax", "amount": 0.05, "cap": 120},
+        ],
+    )
+    # 100 a payday against a shared cap of 120: full, then 20, then nothing.
+    paydays = [date(2023, 1, 1), date(2023, 1, 15), date(2023, 1, 29)]
+    assert [s.flow(d) for d in paydays] == pytest.approx([900, 980, 1000])
+    # The cap is annual.
+    assert s.flow(date(2024, 1, 14)) == pytest.approx(900)
+
+
+def test_salary_rounds_like_a_payday_loop():
+    deductions = [
+        {"name": "EI", "amount": 0.0163, "cap": 1002.45},
+        {"name": "QPP", "amount": 0.064, "cap": 3776.1},
+        {"name": "QPP", "amount": 0.01, "cap": 500},
+    ]
+    s = SalaryCashflow(
+        name="Job",
+        starting_date=date(2023, 1, 6),
+        gross_salary=3123.37,
+        estimated_raise={"Month": 4, "raise": 0.031},
+        constant_deductions=211.13,
+        variable_deductions=deductions,
+    )
+    days, amounts = s._get_cashflows(2023)
+    expected = []
+    left = {"EI": 1002.45, "QPP": 500}
+    for day in days.tolist():
+        gross = 3123.37 * (1 + 0.031) ** (day >= _to_day(date(2023, 4, 1)))
+        net = gross - 211.13
+        for v in deductions:
+            deduction = min(gross * v["amount"], left[v["name"]])
+            net -= deduction
+            left[v["name"]] -= deduction
+        expected.append(net)
+    assert amounts.tolist() == expected
@@ -0,0 +1,143 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from cashflow import Cashflow, Simulation, simulate, sum_cashflows
+
+
+@pytest.fixture
+def definitions(definitions):
+    definitions.append(
+        {
+            "name": "Career",
+            "details": {
+                "type": "qc-multi-year-salary",
+                "year": 2022,
+                "ending_year": 2030,
+                "starting_salary": 3000.0,
+                "annual_raise": 0.03,
+                "raise_month": 4,
+                "first_pay_day": "2022-01-07",
+                "constant_deductions": 200.0,
+                "ei_rate": 0.0132,
+                "ei_cap": 834.24,
+                "qpip_rate": 0.00494,
+                "qpip_cap": 464.36,
+                "qpp_rate": 0.064,
+                "qpp_cap": 4160.0,
+                "annual_ei_cap_increase": 0.02,
+                "annual_qpip_cap_increase": 0.02,
+                "annual_qpp_cap_increase": 0.02,
+                "annual_constant_deductions_increase": 0.02,
+            },
+        }
+    )
+    return definitions
+
+
+def test_fixed_distributions_match_projection(definitions):
+    distributions = {
+        "Career/details/annual_raise": {"type": "normal", "loc": 0.03, "scale": 0.0},
+        "Pay/EI 2023/details/amount": {
+            "type": "uniform",
+            "low": -66.05,
+            "high": -66.05,
+        },
+    }
+    sim = simulate(definitions, distributions, date(2021, 6, 1), 1500, 100, scenarios=4)
+    cashflows = [Cashflow.from_dict(d) for d in definitions]
+    df = sum_cashflows(cashflows, date(2021, 6, 1), 1500, 100)
+    assert sim.balance[1] == pytest.approx(df["balance"].to_numpy())
+    assert sim.min_forward[0] == pytest.approx(df["min_forward"].to_numpy())
+    assert sim.lowest_balance == pytest.approx([df["min_forward"].iloc[0]] * 4)
+
+
+def test_simulation_is_seeded(definitions):
+    distributions = {
+        "Career/details/annual_raise": {"type": "normal", "loc": 0.03, "scale": 0.02}
+    }
+    a = simulate(
+        definitions, distributions, date(2022, 1, 1), 2000, 0, scenarios=50, seed=7
+    )
+    b = simulate(
+        definitions, distributions, date(2022, 1, 1), 2000, 0, scenarios=50, seed=7
+    )
+    assert np.array_equal(a.balance, b.balance)
+    assert np.array_equal(a.lowest_balance, b.lowest_balance)
+
+
+def test_probability_negative():
+    definitions = [
+        {
+            "name": "Bill",
+            "details": {"type": "one-time", "date": "2023-01-02", "amount": 0},
+        }
+    ]
+    distributions = {"Bill/details/amount": {"type": "uniform", "low": -1, "high": 1}}
+    sim = simulate(
+        definitions, distributions, date(2023, 1, 1), 3, 0, scenarios=4000, seed=1
+    )
+    assert sim.probability_negative[0] == 0
+    assert sim.probability_negative[2] == pytest.approx(0.5, abs=0.05)
+    assert sim.balance[:, 2] == pytest.approx([-0.9, 0.0, 0.9], abs=0.05)
+
+
+def test_sampled_amount_respects_limit():
+    definitions = [
+        {
+            "name": "EI",
+            "start": "2023-01-01",
+            "limit": 100,
+            "details": {
+                "type": "interval",
+                "first_date": "2023-01-01",
+                "interval": 7,
+                "amount": -40,
+            },
+        }
+    ]
+    distributions = {"EI/details/amount": {"type": "uniform", "low": -60, "high": -20}}
+    sim = simulate(
+        definitions, distributions, date(2023, 1, 1), 200, 0, scenarios=100, seed=3
+    )
+    assert sim.lowest_balance == pytest.approx(np.full(100, -100))
+
+
+def test_to_frame_columns():
+    definitions = [
+        {
+            "name": "O",
+            "details": {"type": "one-time", "date": "2023-01-01", "amount": 5},
+        }
+    ]
+    sim = simulate(
+        definitions,
+        {"O/details/amount": {"type": "normal", "loc": 5, "scale": 1}},
+        date(2023, 1, 1),
+        10,
+        0,
+        scenarios=10,
+        percentiles=(10, 90),
+    )
+    assert isinstance(sim, Simulation)
+    assert list(sim.to_frame().columns) == [
+        "balance_p10",
+        "balance_p90",
+        "probability_negative",
+        "min_forward_p10",
+        "min_forward_p90",
+    ]
+
+
+@pytest.mark.parametrize(
+    "path, spec, match",
+    [
+        ("Pay/Arup Pay 2022/details/interval", {"type": "normal"}, "can be sampled"),
+        ("Pay/Arup Pay 2022/details/amount", {"type": "nonsense"}, "not a supported"),
+        ("Pay/details/cashflows", {"type": "normal"}, "cannot be simulated"),
+    ],
+)
+def test_simulate_rejects_bad_parameters(definitions, path, spec, match):
+    with pytest.raises(ValueError, match=match):
+        simulate(definitions, {path: spec}, date(2022, 1, 1), 10, 0, scenarios=2)
@@ -1,13 +1,18 @@
 """Tests for the cashflow web editor server."""
 
+import asyncio
 import json
-import tempfile
-from pathlib import Path
+import threading
+import time
+from datetime import date
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 
-from cashflow.ui.server import create_app
+from cashflow import Cashflow, sum_cashflows
+from cashflow.ui import server
+from cashflow.ui.server import FileIO, ProjectionCache, create_app
 
 
 @pytest.fixture()
@@ -141,10 +146,32 @@ class TestUpdateFile:
         on_disk = json.loads((data_dir / "test.json").read_text())
         assert on_disk[0]["name"] == "Updated"
 
+    def test_update_invalid_json(self, client, data_dir):
+        before = (data_dir / "test.json").read_text()
+        resp = client.put("/api/files/test.json", content=b"{not valid json!!")
+        assert resp.status_code == 400
+        assert (data_dir / "test.json").read_text() == before
+
+    def test_update_leaves_no_temporary_files(self, client, data_dir):
+        client.put("/api/files/test.json", json=[])
+        assert sorted(p.name for p in data_dir.iterdir()) == ["test.json"]
+
     def test_update_missing_file(self, client):
         resp = client.put("/api/files/nope.json", json=[])
         assert resp.status_code == 404
 
+    def test_large_update_is_saved_by_a_worker_process(self, data_dir, monkeypatch):
+        monkeypatch.setattr(server, "LARGE_BODY_BYTES", 10)
+        new_data = [{"name": "Large", "details": {"type": "one-time", "date": "2024-06-01", "amount": 42}}]
+        with TestClient(create_app(data_dir=str(data_dir))) as client:
+            resp = client.put("/api/files/test.json", json=new_data)
+            assert resp.status_code == 200
+            assert "save" in client.app.state.files._pools
+            resp = client.put("/api/files/test.json", content=b"{not valid json!!")
+            assert resp.status_code == 400
+        assert (data_dir / "test.json").read_text() == json.dumps(new_data, indent=1) + "\n"
+        assert sorted(p.name for p in data_dir.iterdir()) == ["test.json"]
+
     def test_round_trip(self, client):
         """Read → modify → write → re-read round trip."""
         data = client.get("/api/files/test.json").json()
@@ -167,6 +194,18 @@ class TestDeleteFile:
         resp = client.delete("/api/files/nope.json")
         assert resp.status_code == 404
 
+    def test_delete_file_deleted_meanwhile(self, client, data_dir, monkeypatch):
+        safe_path = server._safe_path
+
+        def racing_safe_path(base, name):
+            filepath = safe_path(base, name)
+            filepath.unlink()
+            return filepath
+
+        monkeypatch.setattr(server, "_safe_path", racing_safe_path)
+        resp = client.delete("/api/files/test.json")
+        assert resp.status_code == 404
+
 
 # ── Duplicate file ──────────────────────────────────────────────────────────
 
@@ -206,6 +245,170 @@ class TestDuplicateFile:
         assert resp.status_code == 404
 
 
+# ── Projection ──────────────────────────────────────────────────────────────
+
+PROJECTION_URL = "/api/files/test.json/projection?start=2022-01-01&days=90&balance=50"
+
+
+class TestProjection:
+    def test_projection_matches_sum_cashflows(self, client, data_dir):
+        resp = client.get(PROJECTION_URL)
+        assert resp.status_code == 200
+        body = resp.json()
+        definitions = json.loads((data_dir / "test.json").read_text())
+        cashflows = [Cashflow.from_dict(d) for d in definitions]
+        df = sum_cashflows(cashflows, date(2022, 1, 1), 90, 50)
+        assert body["dates"] == [d.isoformat() for d in df.index]
+        assert body["columns"]["Test Pay"] == df["Test Pay"].tolist()
+        assert body["labels"] == df["labels"].tolist()
+        for column in ["total", "balance", "min_forward"]:
+            assert body[column] == df[column].tolist()
+
+    def test_defaults_to_a_year_from_today(self, client):
+        body = client.get("/api/files/test.json/projection").json()
+        assert body["dates"][0] == date.today().isoformat()
+        assert len(body["dates"]) == 365
+
+    def test_etag_and_not_modified(self, client):
+        resp = client.get(PROJECTION_URL)
+        etag = resp.headers["etag"]
+        again = client.get(PROJECTION_URL, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.headers["etag"] == etag
+        assert again.content == b""
+        assert client.get(PROJECTION_URL, headers={"If-None-Match": '"x"'}).status_code == 200
+
+    def test_etag_follows_contents_and_parameters(self, client, data_dir):
+        etag = client.get(PROJECTION_URL).headers["etag"]
+        assert client.get(PROJECTION_URL.replace("days=90", "days=91")).headers["etag"] != etag
+        data = json.loads((data_dir / "test.json").read_text())
+        data[0]["details"]["amount"] = 2000
+        client.put("/api/files/test.json", json=data)
+        resp = client.get(PROJECTION_URL, headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != etag
+        assert resp.json()["columns"]["Test Pay"][0] == 2000
+
+    def test_repeated_requests_use_the_cache(self, client):
+        cache = client.app.state.projection_cache
+        first = client.get(PROJECTION_URL).content
+        assert len(cache) == 1
+        assert client.get(PROJECTION_URL).content == first
+        assert len(cache) == 1
+
+    def test_projections_of_one_file_share_its_tree(self, client, monkeypatch):
+        loaded = []
+
+        def load(*args):
+            loaded.append(server_load(*args))
+            return loaded[-1]
+
+        server_load = server.load_cashflows
+        monkeypatch.setattr(server, "load_cashflows", load)
+        client.get(PROJECTION_URL)
+        client.get(PROJECTION_URL.replace("days=90", "days=120"))
+        assert len(loaded) == 2
+        assert loaded[0] is loaded[1]
+
+    def test_invalid_parameters(self, client):
+        url = "/api/files/test.json/projection"
+        assert client.get(url, params={"days": 0}).status_code == 422
+        assert client.get(url, params={"days": 10**6}).status_code == 422
+        assert client.get(url, params={"start": "soon"}).status_code == 422
+
+    def test_missing_file(self, client):
+        assert client.get("/api/files/nope.json/projection").status_code == 404
+
+    def test_invalid_cashflows(self, client, data_dir):
+        (data_dir / "bad.json").write_text("{not valid json!!")
+        (data_dir / "odd.json").write_text('{"name": "not a list"}')
+        (data_dir / "unknown.json").write_text('[{"details": {"type": "weekly"}}]')
+        for name in ["bad.json", "odd.json", "unknown.json"]:
+            assert client.get(f"/api/files/{name}/projection").status_code == 422
+
+    def test_cashflows_that_fail_when_evaluated(self, client, data_dir):
+        pay = json.loads((data_dir / "test.json").read_text())[0]
+        limited = dict(pay, start="2022-01-01", limit="abc")
+        never = dict(pay, details=dict(pay["details"], interval=0))
+        (data_dir / "limited.json").write_text(json.dumps([limited]))
+        (data_dir / "never.json").write_text(json.dumps([never]))
+        for name in ["limited.json", "never.json"]:
+            resp = client.get(f"/api/files/{name}/projection")
+            assert resp.status_code == 422
+            assert "Invalid cashflow" in resp.json()["detail"]
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = ProjectionCache(max_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        assert cache.get("a") == b"1234"
+        cache.put("c", b"1234")
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1234"
+        assert cache.size == 8
+        cache.put("d", b"x" * 11)
+        assert cache.get("d") is None
+
+
+# ── Concurrency ─────────────────────────────────────────────────────────────
+
+class TestConcurrency:
+    def test_listing_is_not_blocked_by_a_slow_write(self, data_dir, monkeypatch):
+        started, release = threading.Event(), threading.Event()
+        write_text = server._write_text
+
+        def slow_write(filepath, text):
+            started.set()
+            release.wait(5)
+            write_text(filepath, text)
+
+        monkeypatch.setattr(server, "_write_text", slow_write)
+        app = create_app(data_dir=str(data_dir))
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                put = asyncio.create_task(client.put("/api/files/test.json", json=[]))
+                await asyncio.to_thread(started.wait, 5)
+                listing = await asyncio.wait_for(client.get("/api/files"), 2)
+                in_flight = not put.done()
+                release.set()
+                return listing, in_flight, await put
+
+        listing, in_flight, put = asyncio.run(scenario())
+        app.state.files.close()
+        assert listing.status_code == 200
+        assert in_flight
+        assert put.status_code == 200
+        assert json.loads((data_dir / "test.json").read_text()) == []
+
+    def test_each_kind_of_operation_is_limited(self):
+        lock = threading.Lock()
+        running = {"write": 0, "read": 0}
+        peak = {"write": 0, "read": 0}
+
+        def work(kind):
+            with lock:
+                running[kind] += 1
+                peak[kind] = max(peak[kind], running[kind])
+            time.sleep(0.02)
+            with lock:
+                running[kind] -= 1
+
+        files = FileIO({"write": 2, "read": 3})
+
+        async def scenario():
+            await asyncio.gather(
+                *(files.run(kind, work, kind) for kind in ["write", "read"] * 6)
+            )
+
+        asyncio.run(scenario())
+        files.close()
+        assert peak == {"write": 2, "read": 3}
+
+
 # ── Frontend ────────────────────────────────────────────────────────────────
 
 class TestFrontend:
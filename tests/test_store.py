@@ -0,0 +1,340 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from cashflow import (
+    IntervalCashflow,
+    OneTimeCashflow,
+    ProjectionStore,
+    diff_projections,
+    get_projection,
+    iter_projection,
+    store_projection,
+    sum_cashflows,
+)
+
+
+@pytest.fixture
+def flows():
+    return [
+        IntervalCashflow("I", date(2023, 1, 1), 3, -2),
+        OneTimeCashflow("O", date(2023, 1, 5), 10),
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProjectionStore(tmp_path / "projections.db")
+    yield store
+    store.close()
+
+
+def test_save_and_get_round_trip(store, flows):
+    df = sum_cashflows(flows, date(2023, 1, 1), 30, 5)
+    store.save(df, "jan")
+    stored = store.get("jan")
+    assert list(stored.index) == [d.isoformat() for d in df.index]
+    for column in ["total", "balance", "min_forward", "labels"]:
+        assert stored[column].tolist() == df[column].tolist()
+    assert store.names() == ["jan"]
+
+
+def test_get_returns_floats(store, flows):
+    df = sum_cashflows(flows, date(2023, 1, 1), 30, 5)
+    assert df["balance"].dtype == "int64"
+    store.save(df, "jan")
+    assert store.get("jan")["balance"].dtype == "float64"
+
+
+def test_open_leaves_callers_transaction_pending(tmp_path):
+    conn = sqlite3.connect(tmp_path / "projections.db")
+    conn.execute("CREATE TABLE notes (text TEXT)")
+    conn.execute("INSERT INTO notes VALUES ('draft')")
+    assert conn.in_transaction
+    ProjectionStore(conn)
+    assert conn.in_transaction
+    conn.rollback()
+    assert conn.execute("SELECT COUNT(*) FROM notes").fetchone() == (0,)
+    conn.close()
+
+
+def test_get_date_range(store, flows):
+    store.save(sum_cashflows(flows, date(2023, 1, 1), 30, 5), "jan")
+    stored = store.get("jan", date(2023, 1, 10), date(2023, 1, 12))
+    assert list(stored.index) == ["2023-01-10", "2023-01-11", "2023-01-12"]
+
+
+def test_get_uses_index(store):
+    plan = store.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM projection_data"
+        " WHERE name = ? AND Date >= ? AND Date <= ?",
+        ("jan", "2023-01-01", "2023-02-01"),
+    ).fetchall()
+    assert "projection_data_name_date" in " ".join(row[-1] for row in plan)
+
+
+def test_working_is_replaced_with_its_rows(store, flows):
+    store.save(sum_cashflows(flows, date(2023, 1, 1), 30, 5))
+    store.save(sum_cashflows(flows, date(2023, 1, 1), 10, 0))
+    count = store.conn.execute("SELECT COUNT(*) FROM projection_data").fetchone()[0]
+    assert count == 10
+    assert store.names() == ["working"]
+
+
+def test_named_projection_cannot_be_replaced(store, flows):
+    df = sum_cashflows(flows, date(2023, 1, 1), 10, 0)
+    store.save(df, "jan")
+    with pytest.raises(ValueError, match="exists"):
+        store.save(df, "jan")
+    assert len(store.get("jan")) == 10
+
+
+def test_failed_save_leaves_working_untouched(store, flows):
+    store.save(sum_cashflows(flows, date(2023, 1, 1), 10, 0))
+
+    def chunks():
+        yield from iter_projection(flows, date(2023, 1, 1), 20, 0, chunk_days=5)
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        store.save(chunks())
+    assert len(store.get()) == 10
+
+
+def test_store_projection_keeps_connection_open(tmp_path, flows):
+    conn = sqlite3.connect(tmp_path / "projections.db")
+    store_projection(sum_cashflows(flows, date(2023, 1, 1), 10, 0), conn, "a")
+    store_projection(sum_cashflows(flows, date(2023, 1, 1), 10, 0), conn, "b")
+    assert len(get_projection(conn, "b", start=date(2023, 1, 6))) == 5
+    conn.close()
+
+
+def test_existing_database_gets_the_index(tmp_path, flows):
+    conn = sqlite3.connect(tmp_path / "projections.db")
+    df = sum_cashflows(flows, date(2023, 1, 1), 3, 0)
+    df["name"] = "old"
+    df[["name", "total", "balance", "min_forward", "labels"]].to_sql(
+        "projection_data", conn, index=True, index_label="Date"
+    )
+    store = ProjectionStore(conn)
+    indexes = [row[1] for row in conn.execute("PRAGMA index_list(projection_data)")]
+    assert "projection_data_name_date" in indexes
+    assert len(store.get("old")) == 3
+    conn.close()
+
+
+# --- Snapshots ---
+
+
+def _count(store, table, name=None):
+    query = f"SELECT COUNT(*) FROM {table}"
+    if name is None:
+        return store.conn.execute(query).fetchone()[0]
+    return store.conn.execute(query + " WHERE name = ?", (name,)).fetchone()[0]
+
+
+def _snapshot(extra=(), duration=365):
+    flows = [IntervalCashflow("Pay", date(2023, 1, 1), 3, 2), *extra]
+    return sum_cashflows(flows, date(2023, 1, 1), duration, 0)
+
+
+def _assert_stored(store, name, df):
+    stored = store.get(name)
+    assert list(stored.index) == [d.isoformat() for d in df.index]
+    for column in ["total", "balance", "min_forward", "labels"]:
+        assert stored[column].tolist() == df[column].tolist()
+
+
+def test_snapshot_stores_only_changed_days(store):
+    base = _snapshot()
+    changed = _snapshot([OneTimeCashflow("Gift", date(2023, 12, 28), 10)])
+    store.save(base, "jan")
+    store.save(changed, "feb")
+    assert _count(store, "snapshot_data", "jan") == 365
+    assert _count(store, "snapshot_data", "feb") == 4
+    _assert_stored(store, "jan", base)
+    _assert_stored(store, "feb", changed)
+    assert len(store.get("feb", date(2023, 12, 27), date(2023, 12, 29))) == 3
+
+
+def test_snapshot_labels_are_interned(store):
+    store.save(_snapshot(), "jan")
+    store.save(_snapshot(), "feb")
+    assert _count(store, "labels") == 2
+    assert _count(store, "snapshot_data", "feb") == 0
+
+
+def test_snapshot_with_a_longer_horizon(store):
+    store.save(_snapshot(duration=100), "jan")
+    longer = _snapshot(duration=120)
+    store.save(longer, "feb")
+    assert _count(store, "snapshot_data", "feb") == 20
+    _assert_stored(store, "feb", longer)
+
+
+def test_snapshot_that_mostly_differs_becomes_a_base(store):
+    store.save(_snapshot(), "jan")
+    moved = _snapshot([OneTimeCashflow("Gift", date(2023, 1, 2), 10)])
+    store.save(moved, "feb")
+    bases = store.conn.execute("SELECT name FROM snapshots WHERE base IS NULL")
+    assert sorted(name for (name,) in bases) == ["feb", "jan"]
+    _assert_stored(store, "feb", moved)
+
+
+def test_deleting_a_base_keeps_its_dependents(store):
+    snapshots = {
+        name: _snapshot([OneTimeCashflow("Gift", date(2023, 12, day), 10)])
+        for name, day in [("feb", 28), ("mar", 29)]
+    }
+    store.save(_snapshot(), "jan")
+    for name, df in snapshots.items():
+        store.save(df, name)
+    store.delete("jan")
+    assert store.names() == ["feb", "mar"]
+    assert _count(store, "snapshot_data", "mar") < 365
+    for name, df in snapshots.items():
+        _assert_stored(store, name, df)
+
+
+def _set_timestamps(store, timestamps):
+    store.conn.executemany(
+        "UPDATE projections SET timestamp = ? WHERE name = ?",
+        [(timestamp, name) for name, timestamp in timestamps.items()],
+    )
+    store.conn.commit()
+
+
+def test_retain_keep_last_and_monthly(store):
+    timestamps = {
+        "a": "2024-01-05T00:00:00",
+        "b": "2024-01-20T00:00:00",
+        "c": "2024-02-03T00:00:00",
+        "d": "2024-02-10T00:00:00",
+        "e": "2024-03-01T00:00:00",
+    }
+    for day, name in enumerate(timestamps, start=1):
+        store.save(_snapshot([OneTimeCashflow("Gift", date(2023, 12, day), 1)]), name)
+    store.save(_snapshot(duration=10))
+    _set_timestamps(store, timestamps)
+
+    assert store.retain(keep_last=1, keep_monthly=True) == ["a", "c"]
+    assert store.names() == ["b", "d", "e", "working"]
+    assert store.retain(keep_last=2) == ["b"]
+    assert len(store.get("d")) == 365
+    with pytest.raises(ValueError):
+        store.retain(keep_last=-1)
+
+
+def test_retain_needs_a_policy(store):
+    store.save(_snapshot(), "a")
+    with pytest.raises(ValueError, match="keep_last or keep_monthly"):
+        store.retain()
+    assert store.names() == ["a"]
+
+
+def test_compact_reencodes_against_the_latest_base(store):
+    snapshots = {
+        "jan": _snapshot(),
+        "feb": _snapshot([OneTimeCashflow("Gift", date(2023, 1, 2), 10)]),
+        "mar": _snapshot([OneTimeCashflow("Bonus", date(2023, 12, 28), 5)]),
+        "apr": _snapshot([OneTimeCashflow("Refund", date(2023, 12, 28), 10)]),
+    }
+    for name, df in snapshots.items():
+        store.save(df, name)
+    # jan and mar differ on too many days from feb, the latest base when they
+    # were saved, so all three are stored in full.
+    bases = store.conn.execute("SELECT name FROM snapshots WHERE base IS NULL")
+    assert sorted(name for (name,) in bases) == ["feb", "jan", "mar"]
+    labels = _count(store, "labels")
+    store.delete("apr")
+
+    store.compact()
+    bases = store.conn.execute("SELECT name FROM snapshots WHERE base IS NULL")
+    assert sorted(name for (name,) in bases) == ["feb", "mar"]
+    assert _count(store, "snapshot_data", "jan") == 4
+    # Only the deleted snapshot used the Refund label.
+    assert _count(store, "labels") == labels - 1
+    for name in ["jan", "feb", "mar"]:
+        _assert_stored(store, name, snapshots[name])
+
+
+def test_main_compacts(tmp_path, capsys):
+    from cashflow.store import main
+
+    path = tmp_path / "projections.db"
+    store = ProjectionStore(path)
+    store.save(_snapshot(), "jan")
+    store.save(_snapshot([OneTimeCashflow("Gift", date(2023, 12, 28), 10)]), "feb")
+    store.close()
+
+    main([str(path), "--keep-last", "1"])
+    assert capsys.readouterr().out == "deleted jan\n"
+    store = ProjectionStore(path)
+    assert store.names() == ["feb"]
+    assert _count(store, "snapshot_data", "feb") == 365
+    store.close()
+
+
+# --- Diffs ---
+
+
+@pytest.fixture
+def diffed(store):
+    a = _snapshot(duration=90)
+    b = _snapshot([OneTimeCashflow("Gift", date(2023, 2, 10), -5)], duration=95)
+    store.save(a, "a")
+    store.save(b, "b")
+    store.save(b)
+    return store, a, b
+
+
+def test_diff_matches_frames(diffed):
+    store, a, b = diffed
+    diff = store.diff("a", "b")
+    joined = a.join(b, lsuffix="_a", rsuffix="_b", how="outer")
+    columns = ["total", "balance", "min_forward"]
+    differs = (
+        joined[[c + "_a" for c in columns]].to_numpy()
+        != joined[[c + "_b" for c in columns]].to_numpy()
+    ).any(axis=1)
+    expected = joined[differs]
+    assert list(diff.index) == [d.isoformat() for d in expected.index]
+    for column in columns:
+        assert diff[column + "_diff"].tolist() == pytest.approx(
+            (expected[column + "_b"] - expected[column + "_a"]).tolist(),
+            nan_ok=True,
+        )
+    assert diff["balance_b"].tolist()[-5:] == b["balance"].tolist()[-5:]
+
+
+def test_diff_date_range(diffed):
+    store, _, _ = diffed
+    diff = store.diff("a", "working", date(2023, 2, 9), date(2023, 2, 11))
+    # The Gift lowers min_forward before it is paid.
+    assert list(diff.index) == ["2023-02-09", "2023-02-10", "2023-02-11"]
+    assert diff["total_diff"].tolist() == [0, -5, 0]
+    assert diff["balance_diff"].tolist() == [0, -5, -5]
+
+
+def test_diff_monthly(diffed):
+    store, a, b = diffed
+    diff = diff_projections(store.conn, "a", "b", monthly=True)
+    assert list(diff.index) == ["2023-02", "2023-03", "2023-04"]
+    feb = diff.loc["2023-02"]
+    assert feb["total_diff"] == -5
+    assert feb["balance_b"] == b.loc[date(2023, 2, 28), "balance"]
+    assert feb["min_forward_a"] == a.loc[date(2023, 2, 1), "min_forward"]
+    assert diff.loc["2023-04", "days"] == 5
+
+
+def test_diff_identical_projections(diffed):
+    store, _, _ = diffed
+    assert store.diff("b", "working").empty
+    assert store.diff("b", "working", monthly=True).empty
+
+
+def test_diff_unknown_projection(diffed):
+    store, _, _ = diffed
+    with pytest.raises(ValueError, match="no projection named c"):
+        store.diff("a", "c")
@@ -0,0 +1,88 @@
+from copy import deepcopy
+from datetime import date
+
+import pytest
+
+from cashflow import Cashflow, sum_cashflows, sweep
+from cashflow.paths import resolve, set_value
+
+START = date(2022, 6, 1)
+DURATION = 400
+
+
+@pytest.fixture
+def definitions(definitions):
+    definitions.append(
+        {
+            "name": "Deductions",
+            "start": "2022-01-01",
+            "limit": 500,
+            "details": {
+                "type": "composite",
+                "cashflows": [
+                    {
+                        "name": "Union",
+                        "details": {
+                            "type": "interval",
+                            "first_date": "2022-01-07",
+                            "interval": 14,
+                            "amount": -30,
+                        },
+                    }
+                ],
+            },
+        }
+    )
+    return definitions
+
+
+def _expected(definitions, overrides, starting_balance=1000):
+    definitions = deepcopy(definitions)
+    for path, value in overrides.items():
+        chain, keys = resolve(definitions, path)
+        set_value(chain[-1], keys, value)
+    cashflows = [Cashflow.from_dict(d) for d in definitions]
+    return sum_cashflows(cashflows, START, DURATION, starting_balance)
+
+
+def test_sweep_matches_full_projection(definitions):
+    variants = [
+        {},
+        {"Pay/Arup Pay 2023/details/amount": 4000.0},
+        {
+            "Pay/Arup Pay 2023/start": "2023-02-01",
+            "Mortgage and Rent/Rent/details/amount": -2500,
+        },
+        {"Deductions/Union/details/amount": -45, "Deductions/limit": 800},
+        {"RESP/details/day": 3},
+    ]
+    df = sweep(definitions, variants, START, DURATION, 1000)
+    assert df.attrs["variants"] == variants
+    for i, overrides in enumerate(variants):
+        expected = _expected(definitions, overrides)
+        got = df.loc[i]
+        for column in ("total", "balance", "min_forward"):
+            assert got[column].to_numpy() == pytest.approx(expected[column].to_numpy())
+
+
+def test_sweep_expands_grid(definitions):
+    grid = {
+        "Pay/Arup Pay 2023/details/amount": [3500.0, 4000.0],
+        "RESP/details/amount": [-100, -200, -300],
+    }
+    df = sweep(definitions, grid, START, DURATION, 0)
+    assert df.index.names == ["variant", "Date"]
+    assert len(df) == 6 * DURATION
+    assert df.attrs["variants"][1] == {
+        "Pay/Arup Pay 2023/details/amount": 3500.0,
+        "RESP/details/amount": -200,
+    }
+    expected = _expected(definitions, df.attrs["variants"][5], 0)
+    assert df.loc[5, "balance"].to_numpy() == pytest.approx(
+        expected["balance"].to_numpy()
+    )
+
+
+def test_sweep_rejects_unknown_path(definitions):
+    with pytest.raises(ValueError):
+        sweep(definitions, [{"Nothing/details/amount": 1}], START, DURATION, 0)